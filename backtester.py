@@ -0,0 +1,241 @@
+"""Offline backtest of the trading strategy over stored one minute bars.
+Run: python backtester.py --bar-cache bar_cache --start 2021-08-02 --end 2021-08-31"""
+# Import necessary modules
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import main
+import profile_class
+import scoring_models
+import trading_cycle
+from bar_store import BarStore
+from streaming_stats import StreamingRegressionEngine
+
+
+class BarReplay:
+    """Class that holds recorded one minute bars as dense arrays, one row per minute & one column per ticker, so the
+    backtest can step through time by index. Missing closes are forward filled so every minute has a price to trade
+    at; opens are left as recorded for the ranking."""
+
+    def __init__(self, timestamps, tickers, opens, closes, forward_fill=True):
+        """
+        :param timestamps: numpy array of int64 UTC epoch nanoseconds, sorted, one per minute
+        :param tickers: list of str, in rank order (the order the reputation tiers are assigned in)
+        :param opens: 2D numpy array (minutes x tickers) of open prices, NaN where a bar is missing
+        :param closes: 2D numpy array (minutes x tickers) of close prices, NaN where a bar is missing
+        :param forward_fill: bool, False when the closes are already forward filled, they are then used as given
+        """
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.tickers = list(tickers)
+        self.opens = opens
+        self.closes = pd.DataFrame(closes).ffill().values if forward_fill else closes  # Last close at every minute
+        self.columns = {ticker: column for column, ticker in enumerate(self.tickers)}  # Ticker -> column
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_panel(cls, panel, tickers=None):
+        """Builds a replay from a long panel dataframe: Date, Ticker, Open, Close
+        :param panel: pandas dataframe
+        :param tickers: optional list of str in rank order, defaults to the order of first appearance
+        :rtype: BarReplay
+        """
+        tickers = list(pd.unique(panel['Ticker'])) if tickers is None else list(tickers)
+        dates = pd.to_datetime(panel['Date'], utc=True)
+        opens = panel.pivot_table(index=dates, columns='Ticker', values='Open', aggfunc='last').reindex(
+            columns=tickers)
+        closes = panel.pivot_table(index=dates, columns='Ticker', values='Close', aggfunc='last').reindex(
+            index=opens.index, columns=tickers)
+        timestamps = opens.index.values.astype('datetime64[ns]').astype(np.int64)
+        return cls(timestamps, tickers, opens.values, closes.values)
+
+    @classmethod
+    def from_bar_store(cls, bar_store, tickers=None, start=None, end=None):
+        """Builds a replay from the bars kept in a BarStore
+        :param bar_store: BarStore
+        :param tickers: optional list of str in rank order, defaults to every stored ticker
+        :param start: optional timestamp
+        :param end: optional timestamp
+        :rtype: BarReplay
+        """
+        tickers = bar_store.tickers() if tickers is None else tickers
+        return cls.from_panel(bar_store.read_panel(tickers, start=start, end=end), tickers)
+
+
+class BacktestResult:
+    """Outcome of a backtest: profit & loss, the fills & the throughput"""
+
+    def __init__(self, starting_cash, final_equity, trades, bars, seconds):
+        self.starting_cash = starting_cash  # Cash the profile started with
+        self.final_equity = final_equity  # Cash plus the value of the open position at the last close
+        self.profit = final_equity - starting_cash  # Profit & loss over the run
+        self.trades = trades  # Trading history dataframe of the run
+        self.bars = bars  # Bars replayed, minutes times tickers
+        self.seconds = seconds  # Wall time of the replay
+        self.bars_per_second = bars / seconds if seconds else float('inf')  # Throughput
+
+    def get_fills(self):
+        """Returns the number of filled buys & filled sells
+        :rtype: tuple
+        """
+        return int(self.trades['Buy Completed Time'].notnull().sum()), \
+            int(self.trades['Sell Completed Time'].notnull().sum())
+
+    def summary(self):
+        """Returns the headline numbers
+        :rtype: dict
+        """
+        buys, sells = self.get_fills()
+        return {'starting_cash': self.starting_cash, 'final_equity': self.final_equity, 'profit': self.profit,
+                'return_percentage': self.profit / self.starting_cash * 100 if self.starting_cash else 0.0,
+                'buy_fills': buys, 'sell_fills': sells, 'bars': self.bars, 'seconds': self.seconds,
+                'bars_per_second': self.bars_per_second}
+
+
+class Backtester:
+    """Class that replays recorded bars through the same Profile & trading cycle the live script runs. The profile's
+    clock & price source are pointed at the replay, so the ten minute fills happen in simulated time without sleeping,
+    and the whole run is one Profile transaction, so nothing is written until it ends."""
+
+    def __init__(self, replay, starting_cash=20.0, take_profit=trading_cycle.TAKE_PROFIT_PERCENTAGE,
+                 stop_loss=trading_cycle.STOP_LOSS_PERCENTAGE, reputation_weights=main.REPUTATION_WEIGHTS,
+                 alpha=0.5, window=pd.Timedelta(minutes=15), scoring_model=None, streaming=False):
+        # Ranks every minute's window, the Ridge slope model with alpha unless another is given
+        self.scoring_model = scoring_models.RidgeSlopeModel(alpha) if scoring_model is None else scoring_model
+        # The replay keeps the opens & the forward filled closes only
+        unavailable = [column for column in self.scoring_model.required_columns if column not in ('Open', 'Close')]
+        if unavailable:
+            raise ValueError('The bar replay has no %s column for %s' % (', '.join(unavailable),
+                                                                       self.scoring_model.name))
+        self.replay = replay  # Recorded bars
+        self.starting_cash = starting_cash  # Cash the profile starts with
+        self.take_profit = take_profit  # Percent gain that triggers a sell
+        self.stop_loss = stop_loss  # Percent loss that triggers a sell
+        self.window = pd.Timedelta(window).value  # Ranking window in ns
+        # Reputation weight of every ticker, by the tier its rank falls in
+        tier_count = len(reputation_weights)
+        self.reputation = main.reputation_weights(replay.tickers[:main.REPUTATION_TIER_SIZE * tier_count],
+                                                  replay.tickers, weights=reputation_weights)
+        self.ranked_columns = len(self.reputation)  # Only the tiered tickers are ranked, like the live universe
+        self.position = 0  # Index of the current minute
+        if streaming and not (isinstance(self.scoring_model, scoring_models.RidgeSlopeModel) and
+                              self.scoring_model.column == 'Open' and self.scoring_model.time_unit == 'ns'):
+            raise ValueError('Streaming ranks with the Ridge slope of the opens over nanoseconds, not %r'
+                             % self.scoring_model)
+        self.streaming = streaming  # Rank through a StreamingRegressionEngine fed one minute at a time
+        self.engine = None  # The streaming engine of the run in progress
+        self.fed_position = -1  # Last minute fed to the engine
+
+    def current_time(self):
+        """Returns the simulated time of the current minute
+        :rtype: pandas timestamp
+        """
+        return pd.Timestamp(self.replay.timestamps[self.position], tz='UTC')
+
+    def current_price(self, stock_symbol):
+        """Returns the last recorded close of a stock at the current minute
+        :param stock_symbol: str
+        :rtype: float
+        """
+        return float(self.replay.closes[self.position, self.replay.columns[stock_symbol]])
+
+    def rank(self):
+        """Ranks the tickers on the window ending at the current minute, through the same functions the live cycle
+        uses
+        :rtype: pandas dataframe
+        """
+        first = np.searchsorted(self.replay.timestamps, self.replay.timestamps[self.position] - self.window, 'left')
+        if self.streaming:
+            return self.rank_streaming(first)
+        minutes = self.position + 1 - first
+        opens = self.replay.opens[first:self.position + 1, :self.ranked_columns]
+        window_df = pd.DataFrame({
+            'Date': pd.to_datetime(np.repeat(self.replay.timestamps[first:self.position + 1], self.ranked_columns),
+                                   utc=True),
+            'Ticker': np.tile(np.array(self.replay.tickers[:self.ranked_columns], dtype=object), minutes),
+            'Open': opens.ravel(),
+            'Reputation Weight': np.tile(self.reputation, minutes)})
+        if 'Close' in self.scoring_model.required_columns:
+            window_df['Close'] = self.replay.closes[first:self.position + 1, :self.ranked_columns].ravel()
+        window_df = window_df[window_df['Open'].notnull()].reset_index(drop=True)  # Missing bars are not in a panel
+        return self.scoring_model.score(window_df)
+
+    def rank_streaming(self, first):
+        """Feeds the streaming engine the minutes it has not seen yet & returns its analysis, the same ranking as the
+        batch path without rebuilding the window every minute
+        :param first: int, first minute of the window
+        :rtype: pandas dataframe
+        """
+        for position in range(max(self.fed_position + 1, first), self.position + 1):
+            timestamp = int(self.replay.timestamps[position])
+            opens = self.replay.opens[position, :self.ranked_columns]
+            for column in np.flatnonzero(~np.isnan(opens)):  # Missing bars are not in a panel either
+                self.engine.update(self.replay.tickers[column], timestamp, opens[column], self.reputation[column])
+        self.fed_position = self.position
+        return self.engine.snapshot(int(self.replay.timestamps[self.position]), self.replay.columns)
+
+    def run(self, start_position=None):
+        """Replays every minute & returns the result. The first minutes only fill the ranking window.
+        :param start_position: optional int, first minute to trade on
+        :rtype: BacktestResult
+        """
+        run_start = time.perf_counter()
+        directory = tempfile.mkdtemp(prefix='backtest_')  # The profile's pickle & ledger live here for the run
+        try:
+            profile = profile_class.Profile(os.path.join(directory, 'backtest'))
+            profile.set_clock(self.current_time)
+            profile.set_price_source(self.current_price)
+            if start_position is None:  # Wait for one full window before the first trade
+                start_position = int(np.searchsorted(self.replay.timestamps,
+                                                     self.replay.timestamps[0] + self.window, 'left'))
+            if self.streaming:  # A fresh engine for every run
+                self.engine = StreamingRegressionEngine(self.window, self.scoring_model.alpha)
+                self.fed_position = -1
+            with profile.transaction():
+                profile.set_cash(self.starting_cash)
+                for self.position in range(min(start_position, len(self.replay) - 1), len(self.replay)):
+                    trading_cycle.run_cycle(profile, self.rank, self.take_profit, self.stop_loss)
+                trades = profile.get_trading_history()
+                final_equity = profile.get_cash()
+                if profile.get_current_stock_holding() is not None:  # Value the open position at the last close
+                    final_equity += profile.get_current_number_of_shares() * self.current_price(
+                        profile.get_current_stock_holding())
+            profile.ledger.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        seconds = time.perf_counter() - run_start
+        return BacktestResult(self.starting_cash, final_equity, trades,
+                              len(self.replay) * len(self.replay.tickers), seconds)
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Backtest the strategy over the bars kept in the bar cache.')
+    parser.add_argument('--bar-cache', default='bar_cache', help='directory of the bar store')
+    parser.add_argument('--start', default=None, help='first timestamp to replay')
+    parser.add_argument('--end', default=None, help='last timestamp to replay')
+    parser.add_argument('--cash', type=float, default=20.0, help='starting cash')
+    parser.add_argument('--take-profit', type=float, default=trading_cycle.TAKE_PROFIT_PERCENTAGE)
+    parser.add_argument('--stop-loss', type=float, default=trading_cycle.STOP_LOSS_PERCENTAGE)
+    parser.add_argument('--scoring-model', choices=list(scoring_models.SCORING_MODELS), default='ridge',
+                        help='model that ranks the stocks, with its default parameters')
+    parser.add_argument('--streaming', action='store_true',
+                        help='rank with the streaming Ridge engine, one minute of bars at a time')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    bar_replay = BarReplay.from_bar_store(BarStore(arguments.bar_cache, retention=pd.Timedelta(days=365 * 100)),
+                                          start=arguments.start, end=arguments.end)
+    result = Backtester(bar_replay, starting_cash=arguments.cash, take_profit=arguments.take_profit,
+                        stop_loss=arguments.stop_loss,
+                        scoring_model=scoring_models.build_scoring_model(arguments.scoring_model),
+                        streaming=arguments.streaming).run()
+    for name, value in result.summary().items():
+        print('%-20s %s' % (name, value))
@@ -0,0 +1,251 @@
+# Import necessary modules
+import os
+import threading
+import numpy as np
+import pandas as pd
+from panel_builder import PanelBuilder, epoch_nanoseconds_array
+
+# One record per bar, timestamps are UTC epoch nanoseconds
+BAR_DTYPE = np.dtype([('timestamp', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                      ('adj_close', '<f8'), ('volume', '<f8')])
+# Panel column for every bar field
+BAR_COLUMNS = {'adj_close': 'Adj Close', 'close': 'Close', 'high': 'High', 'low': 'Low', 'open': 'Open',
+               'volume': 'Volume'}
+
+
+class BarStore:
+    """Class that keeps one minute bars on disk, one memory mapped NumPy file per ticker sorted by timestamp. Reading a
+    ticker maps its file instead of parsing it; writing merges the new bars in by timestamp & swaps the file atomically.
+    Bars older than the retention are dropped by compact."""
+
+    def __init__(self, directory='bar_cache', retention=pd.Timedelta(days=5)):
+        self.directory = directory  # Folder that holds the .npy files
+        self.retention = pd.Timedelta(retention)  # How long bars are kept
+        self.lock = threading.Lock()  # Serializes merges & compaction, reads never block
+
+    def path(self, ticker):
+        """Returns the file that holds a ticker's bars
+        :param ticker: str
+        :rtype: str
+        """
+        return os.path.join(self.directory, ticker.replace('/', '_') + '.npy')
+
+    def read(self, ticker):
+        """Returns a ticker's bars as a read only memory mapped record array, empty if nothing is stored
+        :param ticker: str
+        :rtype: numpy array of BAR_DTYPE
+        """
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.load(path, mmap_mode='r')
+
+    def last_timestamp(self, ticker):
+        """Returns the newest stored timestamp of a ticker in epoch nanoseconds, None if nothing is stored
+        :param ticker: str
+        :rtype: int
+        """
+        bars = self.read(ticker)
+        return int(bars['timestamp'][-1]) if len(bars) else None
+
+    def tickers(self):
+        """Returns every ticker that has bars stored, sorted
+        :rtype: list
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(file_name[:-len('.npy')] for file_name in os.listdir(self.directory)
+                      if file_name.endswith('.npy'))
+
+    def write(self, ticker, bars):
+        """Merges bars into a ticker's file. A bar at a timestamp that is already stored replaces the stored one.
+        :param ticker: str
+        :param bars: numpy array of BAR_DTYPE
+        :rtype: int, the number of stored bars
+        """
+        with self.lock:
+            merged = np.concatenate((bars, self.read(ticker)))  # New bars first so they win the de-duplication
+            _timestamps, first = np.unique(merged['timestamp'], return_index=True)  # Sorted & unique by timestamp
+            merged = np.ascontiguousarray(merged[first])
+            self.save(ticker, merged)
+        return len(merged)
+
+    def save(self, ticker, bars):
+        """Replaces a ticker's file atomically, a crash mid write leaves the old file in place
+        :param ticker: str
+        :param bars: numpy array of BAR_DTYPE
+        """
+        os.makedirs(self.directory, exist_ok=True)  # Created on the first write
+        path = self.path(ticker)
+        temporary_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(temporary_path, 'wb') as file:
+            np.save(file, bars)
+        os.replace(temporary_path, path)  # Atomic swap
+
+    def write_panel(self, panel):
+        """Stores every ticker's bars of a long panel dataframe
+        :param panel: pandas dataframe with Date, Ticker & the bar columns
+        """
+        for ticker, frame in panel.groupby('Ticker', sort=False, observed=True):
+            self.write(ticker, panel_to_bars(frame))
+
+    def read_panel(self, tickers, start=None, end=None, fallback_bars=0):
+        """Returns the stored bars of the tickers as a long panel dataframe: Date, Ticker & the bar columns
+        :param tickers: list of str
+        :param start: optional timestamp, bars before it are left out
+        :param end: optional timestamp, bars after it are left out
+        :param fallback_bars: int, a ticker with no bars in range gets its last fallback_bars bars up to end instead
+        :rtype: pandas dataframe
+        """
+        start = epoch_nanoseconds(start) if start is not None else None
+        end = epoch_nanoseconds(end) if end is not None else None
+        selected = []  # (ticker, bars) of every ticker with data in range
+        for ticker in tickers:
+            bars = self.read(ticker)
+            # Bars are sorted, so the range is found with two binary searches
+            low = np.searchsorted(bars['timestamp'], start, 'left') if start is not None else 0
+            high = np.searchsorted(bars['timestamp'], end, 'right') if end is not None else len(bars)
+            if high == low:
+                low = max(high - fallback_bars, 0)  # Nothing in range, e.g. the market is closed: the latest bars
+            if high > low:
+                selected.append((ticker, bars[low:high]))
+        return bars_to_panel(selected)
+
+    def compact(self, now=None):
+        """Drops bars older than the retention & deletes tickers that have nothing left
+        :param now: optional timestamp, defaults to the current time
+        :rtype: int, the number of bars dropped
+        """
+        now = pd.Timestamp.now(tz='UTC') if now is None else now
+        cutoff = epoch_nanoseconds(now - self.retention)
+        dropped = 0
+        if not os.path.isdir(self.directory):
+            return dropped  # Nothing has been written yet
+        with self.lock:
+            for file_name in os.listdir(self.directory):
+                if not file_name.endswith('.npy'):
+                    continue
+                path = os.path.join(self.directory, file_name)
+                bars = np.load(path, mmap_mode='r')
+                keep = np.searchsorted(bars['timestamp'], cutoff, 'left')  # First bar inside the retention
+                if keep == 0:
+                    continue
+                dropped += keep
+                if keep == len(bars):
+                    del bars
+                    os.remove(path)  # Every bar expired, evict the ticker
+                else:
+                    remaining = np.array(bars[keep:])  # Copy off the map before the file is swapped
+                    del bars
+                    self.save(file_name[:-len('.npy')], remaining)
+        return dropped
+
+
+class CachedDataSource:
+    """Data source that serves bars from a BarStore & only asks the wrapped data source for the bars from the last
+    stored one on. The last stored bar is asked for again because it is usually the minute that was still forming when
+    it was fetched; the fresh copy replaces it. Tickers requesting the same start share a request, so a warm cycle asks
+    for a bar or two per ticker instead of the whole window. When the window holds no bars, outside market hours, a
+    ticker's last window's worth of stored bars is served instead."""
+
+    def __init__(self, data_source, bar_store, window=pd.Timedelta(minutes=15), interval=pd.Timedelta(minutes=1),
+                 compaction_interval=pd.Timedelta(hours=1), clock=None):
+        self.data_source = data_source  # Where missing bars come from
+        self.bar_store = bar_store  # Where bars are kept between runs
+        self.window = pd.Timedelta(window)  # Length of the panel returned by fetch
+        self.interval = pd.Timedelta(interval)  # Bar size; a ticker with a bar this recent is up to date
+        self.fallback_bars = int(self.window / self.interval)  # Bars served per ticker when its window is empty
+        self.compaction_interval = pd.Timedelta(compaction_interval)  # How often old bars are dropped
+        self.clock = clock if clock is not None else (lambda: pd.Timestamp.now(tz='UTC'))
+        self.last_compaction = None  # Time of the last compaction
+        self.requests = 0  # Requests sent to the wrapped data source
+        self.bars_requested = 0  # Bars that came over the wrapped data source
+        self.bars_served = 0  # Bars returned to callers
+        self.lock = threading.Lock()  # Guards the counters, shards call in from several threads
+
+    def fetch(self, tickers, start=None):
+        """Returns a long panel dataframe of the tickers' bars inside the window, refreshing only what is missing
+        :param tickers: list of str
+        :param start: optional timestamp, overrides the start of the window
+        :rtype: pandas dataframe
+        """
+        now = self.clock()
+        window_start = pd.Timestamp(start) if start is not None else now - self.window
+        if window_start.tzinfo is None:
+            window_start = window_start.tz_localize('UTC')
+        self.compact_if_due(now)
+        # Group the stale tickers by the first bar they are missing, cold tickers need the whole window
+        missing_since = {}
+        for ticker in tickers:
+            last_timestamp = self.bar_store.last_timestamp(ticker)
+            if last_timestamp is None or last_timestamp < epoch_nanoseconds(window_start):
+                missing_since.setdefault(window_start.value, []).append(ticker)
+            elif last_timestamp < epoch_nanoseconds(now - self.interval):
+                # From the last stored bar on, inclusive, so the bar that was still forming is completed
+                missing_since.setdefault(last_timestamp, []).append(ticker)
+        for first_missing, stale_tickers in missing_since.items():
+            new_bars = self.data_source.fetch(stale_tickers, start=pd.Timestamp(first_missing, tz='UTC'))
+            self.bar_store.write_panel(new_bars)
+            with self.lock:
+                self.requests += 1
+                self.bars_requested += len(new_bars)
+        # An explicit start is honored as is, the clock's window falls back to the latest stored bars when it is empty
+        panel = self.bar_store.read_panel(tickers, start=window_start,
+                                          fallback_bars=self.fallback_bars if start is None else 0)
+        with self.lock:
+            self.bars_served += len(panel)
+        return panel
+
+    def compact_if_due(self, now):
+        """Compacts the bar store when the last compaction is older than the compaction interval
+        :param now: timestamp
+        """
+        with self.lock:
+            if self.last_compaction is not None and now - self.last_compaction < self.compaction_interval:
+                return
+            self.last_compaction = now
+        self.bar_store.compact(now)
+
+    def get_stats(self):
+        """Returns the request & bar counters
+        :rtype: dict
+        """
+        with self.lock:
+            return {'requests': self.requests, 'bars_requested': self.bars_requested,
+                    'bars_served': self.bars_served}
+
+
+def epoch_nanoseconds(timestamp):
+    """Returns a timestamp as UTC epoch nanoseconds, naive timestamps are taken as UTC
+    :param timestamp: datetime like
+    :rtype: int
+    """
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.value
+
+
+def panel_to_bars(frame):
+    """Converts one ticker's rows of a long panel dataframe to a bar record array
+    :param frame: pandas dataframe
+    :rtype: numpy array of BAR_DTYPE
+    """
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars['timestamp'] = epoch_nanoseconds_array(frame['Date'])
+    for field, column in BAR_COLUMNS.items():
+        bars[field] = frame[column].values
+    return bars
+
+
+def bars_to_panel(ticker_bars, price_dtype=np.float64):
+    """Converts (ticker, bar record array) pairs to a long panel dataframe: Date, Ticker & the bar columns. The
+    records, often straight off the memory maps, are copied once into the panel's columns.
+    :param ticker_bars: list of (str, numpy array of BAR_DTYPE) tuples
+    :param price_dtype: numpy dtype of the panel's price & volume columns
+    :rtype: pandas dataframe
+    """
+    builder = PanelBuilder(sum(len(bars) for _ticker, bars in ticker_bars), price_dtype)
+    for ticker, bars in ticker_bars:
+        builder.append_bars(ticker, bars, BAR_COLUMNS)
+    return builder.build()
@@ -0,0 +1,41 @@
+"""Times the old three serial 100 ticker batches against the concurrent sharded fetcher on the offline stub source. The
+stub charges one round trip per ticker, like yahoo, so only shards running at the same time save wall time.
+Run from the repository root: python benchmarks/bench_fetcher.py"""
+# Import necessary modules
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+from market_data_fetcher import ShardedFetcher, StubDataSource  # noqa: E402
+
+TICKERS = ['T%03d' % number for number in range(300)]  # Same universe size as build_complete_stock_data
+LATENCY_PER_TICKER = 0.02  # Seconds the stub blocks for every ticker, one yahoo round trip
+
+
+def run(label, fetcher):
+    """Fetches the universe & prints the wall time with the shard stats summary
+    :param label: str
+    :param fetcher: ShardedFetcher
+    """
+    result = fetcher.fetch(TICKERS)
+    stats = result.get_stats_dataframe()
+    print('%-36s %7.2fs  shards=%-3d attempts=%-3d rows=%-5d failed=%d' % (
+        label, result.seconds, len(stats), stats['Attempts'].sum(), len(result.panel),
+        len(result.get_failed_tickers())))
+
+
+def main():
+    """Compares the serial layout with concurrent layouts, with & without partial failures"""
+    run('serial, 3 x 100', ShardedFetcher(StubDataSource(latency=LATENCY_PER_TICKER), shard_size=100,
+                                          max_concurrency=1))
+    run('concurrent, 3 x 100', ShardedFetcher(StubDataSource(latency=LATENCY_PER_TICKER), shard_size=100,
+                                              max_concurrency=3))
+    run('concurrent, 12 x 25', ShardedFetcher(StubDataSource(latency=LATENCY_PER_TICKER), shard_size=25,
+                                              max_concurrency=8))
+    run('concurrent, 12 x 25, 2% tickers lost', ShardedFetcher(
+        StubDataSource(latency=LATENCY_PER_TICKER, missing_rate=0.02, seed=1), shard_size=25, max_concurrency=8,
+        backoff_seconds=0.1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compares the batched closed form Ridge engine against the per ticker sklearn Ridge loop.
+Run from the repository root: python benchmarks/bench_regression.py"""
+# Import necessary modules
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn import linear_model
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+import regression_engine  # noqa: E402
+from panel_index import PanelIndex  # noqa: E402
+
+TICKER_COUNTS = [300, 3000, 30000]  # Universe sizes to compare
+BARS_PER_TICKER = 15  # 15 one minute bars, the same window query_yahoo requests
+
+
+def build_synthetic_panel(ticker_count, bars_per_ticker=BARS_PER_TICKER, seed=0):
+    """Returns a panel dataframe shaped like calculate_percent_change_df output with random walk open prices
+    :param ticker_count: int
+    :param bars_per_ticker: int
+    :param seed: int
+    :rtype: pandas dataframe
+    """
+    random_state = np.random.RandomState(seed)  # Reproducible numbers between runs
+    dates = pd.date_range('2021-08-02 09:30', periods=bars_per_ticker, freq='1min')  # One minute bars
+    tickers = np.array(['T%05d' % number for number in range(ticker_count)])
+    # Date major like stack(level=0) produces, every ticker interleaved per timestamp
+    panel = pd.DataFrame({'Date': np.repeat(dates.values, ticker_count),
+                          'Ticker': np.tile(tickers, bars_per_ticker),
+                          'Open Percent Change': random_state.normal(0, 0.1, ticker_count * bars_per_ticker),
+                          'Reputation Weight': np.tile(3 - np.arange(ticker_count) // 100 % 3, bars_per_ticker)})
+    return panel
+
+
+def sklearn_ridge_analysis(panel, alpha=0.5):
+    """Reference implementation: one sklearn Ridge fit per ticker, the same math the old loop ran. Rows are grouped
+    with groupby rather than the old quadratic de-duplication & boolean masks, so only the fitting cost is compared.
+    :param panel: pandas dataframe
+    :param alpha: float
+    :rtype: pandas dataframe
+    """
+    correlation_list = []  # A staged list for dataframe (ticker, median of Percent Change, R Squared, Coefficient)
+    for ticker, instance_df in panel.groupby('Ticker', sort=False):
+        reputation = instance_df['Reputation Weight'].mean()  # Obtain reputation weight
+        ridge_x = instance_df['Date'].values.astype(float).reshape(-1, 1)  # Reshape x for the ridge model
+        ridge_y = instance_df['Open Percent Change'].values  # Obtain the percent changes
+        reg = linear_model.Ridge(alpha=alpha).fit(ridge_x, ridge_y)  # Fit the model
+        correlation_list.append((ticker, reputation, np.median(ridge_y), reg.score(ridge_x, ridge_y),
+                                 float(reg.coef_[0])))
+    return pd.DataFrame(correlation_list, columns=['Ticker', 'Reputation Weight', 'Average Growth',
+                                                   'R Squared', 'Growth Percentage Coefficient'])
+
+
+def batched_ridge_analysis(panel, alpha=0.5):
+    """Batched engine on the same panel, the panel index build is part of the timing
+    :param panel: pandas dataframe
+    :param alpha: float
+    :rtype: pandas dataframe
+    """
+    panel_index = PanelIndex.from_dataframe(panel)  # Group the rows by ticker once
+    return regression_engine.batched_ridge_analysis(panel_index, panel['Date'].values.astype(float),
+                                                    panel['Open Percent Change'].values,
+                                                    panel['Reputation Weight'].values, alpha=alpha)
+
+
+def time_call(function, *args):
+    """Returns the result & the elapsed seconds of a function call"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Runs both implementations for every universe size, checks they agree & prints the timings"""
+    print('%10s %14s %14s %10s' % ('tickers', 'sklearn (s)', 'batched (s)', 'speedup'))
+    for ticker_count in TICKER_COUNTS:
+        panel = build_synthetic_panel(ticker_count)
+        expected, sklearn_seconds = time_call(sklearn_ridge_analysis, panel)
+        actual, batched_seconds = time_call(batched_ridge_analysis, panel)
+        # Both must give the same numbers, ticker for ticker
+        assert (expected['Ticker'].values == actual['Ticker'].values).all()
+        for column in ['Reputation Weight', 'Average Growth', 'R Squared', 'Growth Percentage Coefficient']:
+            np.testing.assert_allclose(actual[column].values, expected[column].values, rtol=1e-7, atol=1e-12,
+                                       err_msg=column)
+        print('%10d %14.4f %14.4f %9.1fx' % (ticker_count, sklearn_seconds, batched_seconds,
+                                             sklearn_seconds / batched_seconds))
+
+
+if __name__ == '__main__':
+    main()
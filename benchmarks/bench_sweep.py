@@ -0,0 +1,67 @@
+"""Measures how the parameter sweep scales with worker processes: the same grid is swept with 1, 2, 4 ... workers up to
+the core count on a stub replay, & the speedup & parallel efficiency against one worker are printed.
+Run from the repository root: python benchmarks/bench_sweep.py [--tickers 300] [--minutes 390]"""
+# Import necessary modules
+import argparse
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+from backtester import BarReplay  # noqa: E402
+from market_data_fetcher import stub_bars  # noqa: E402
+from panel_builder import concat_panels  # noqa: E402
+from parameter_sweep import ParameterSweep, parameter_grid  # noqa: E402
+
+
+def stub_replay(tickers, minutes):
+    """Returns a replay of random walk bars with 2% of them missing
+    :param tickers: int
+    :param minutes: int
+    :rtype: BarReplay
+    """
+    symbols = ['T%03d' % number for number in range(tickers)]
+    dates = pd.date_range('2021-08-02 13:30', periods=minutes, freq='min', tz='UTC')
+    panel = concat_panels([stub_bars(symbol, dates) for symbol in symbols]).sample(frac=0.98, random_state=1)
+    return BarReplay.from_panel(panel, symbols)
+
+
+def worker_counts(cores):
+    """Returns 1, 2, 4 ... up to & including the core count
+    :param cores: int
+    :rtype: list of ints
+    """
+    counts = [1]
+    while counts[-1] * 2 < cores:
+        counts.append(counts[-1] * 2)
+    return counts + [cores] if cores > 1 else counts
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Measure the parameter sweep speedup per worker process.')
+    parser.add_argument('--tickers', type=int, default=300)
+    parser.add_argument('--minutes', type=int, default=390, help='one trading day by default')
+    parser.add_argument('--cores', type=int, default=os.cpu_count(), help='most workers to try')
+    return parser.parse_args()
+
+
+def main():
+    """Sweeps the default grid with every worker count & prints the scaling table"""
+    arguments = parse_arguments()
+    replay = stub_replay(arguments.tickers, arguments.minutes)
+    grid = parameter_grid()
+    print('%d backtests of %d tickers x %d minutes, %d cores' % (len(grid), arguments.tickers, arguments.minutes,
+                                                               os.cpu_count()))
+    single_seconds = None
+    for workers in worker_counts(arguments.cores):
+        sweep = ParameterSweep(replay, workers=workers)
+        sweep.run(grid)
+        single_seconds = single_seconds or sweep.seconds
+        speedup = single_seconds / sweep.seconds
+        print('%3d workers %8.2fs  speedup x%5.2f  efficiency %5.1f%%' % (workers, sweep.seconds, speedup,
+                                                                        speedup / workers * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compares the grouped rolling z score model against a pandas groupby rolling loop, on random walk prices with a share
+of flat windows, which must score 0 however large the price.
+Run from the repository root: python benchmarks/bench_zscore.py"""
+# Import necessary modules
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+from scoring_models import FLAT_WINDOW_TOLERANCE, RollingZScoreModel  # noqa: E402
+
+TICKER_COUNTS = [300, 2000, 20000]  # Universe sizes to compare
+BARS_PER_TICKER = 15  # 15 one minute bars, the same window query_yahoo requests
+FLAT_SHARE = 0.5  # Share of the tickers whose price never moves
+
+
+def build_price_panel(ticker_count, bars_per_ticker=BARS_PER_TICKER, seed=0):
+    """Returns a panel of random walk open prices between 1 & 5000, FLAT_SHARE of the tickers constant
+    :param ticker_count: int
+    :param bars_per_ticker: int
+    :param seed: int
+    :rtype: pandas dataframe
+    """
+    random_state = np.random.RandomState(seed)  # Reproducible numbers between runs
+    dates = pd.date_range('2021-08-02 13:30', periods=bars_per_ticker, freq='1min', tz='UTC')  # One minute bars
+    tickers = np.array(['T%05d' % number for number in range(ticker_count)])
+    steps = random_state.normal(0, 0.001, (ticker_count, bars_per_ticker))
+    steps[:int(ticker_count * FLAT_SHARE)] = 0  # Flat tickers
+    prices = random_state.uniform(1, 5000, (ticker_count, 1)) * np.cumprod(1 + steps, axis=1)
+    return pd.DataFrame({'Date': np.tile(dates, ticker_count),
+                         'Ticker': np.repeat(tickers, bars_per_ticker),
+                         'Open': prices.ravel(),
+                         'Reputation Weight': 1.0})
+
+
+def pandas_zscore(panel, window):
+    """Reference implementation: groupby rolling mean & standard deviation, read at each ticker's last row
+    :param panel: pandas dataframe
+    :param window: int
+    :rtype: pandas series, z score per ticker
+    """
+    rolling = panel.groupby('Ticker', sort=False)['Open'].rolling(window, min_periods=2)
+    mean = rolling.mean().groupby(level=0, sort=False).last()
+    deviation = rolling.std().groupby(level=0, sort=False).last()
+    latest = panel.groupby('Ticker', sort=False)['Open'].last()
+    return ((latest - mean) / deviation).where(deviation > FLAT_WINDOW_TOLERANCE * mean.abs(), 0.0)
+
+
+def time_call(function, *args):
+    """Returns the result & the elapsed seconds of a function call"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """Runs both implementations for every universe size, checks they agree & prints the timings"""
+    model = RollingZScoreModel()
+    print('%10s %14s %14s %10s' % ('tickers', 'pandas (s)', 'grouped (s)', 'speedup'))
+    for ticker_count in TICKER_COUNTS:
+        panel = build_price_panel(ticker_count)
+        expected, pandas_seconds = time_call(pandas_zscore, panel, model.window)
+        actual, grouped_seconds = time_call(model.score, panel)
+        # Both must give the same scores ticker for ticker, & every flat ticker exactly 0
+        assert (expected.index.values == actual['Ticker'].values).all()
+        np.testing.assert_allclose(actual['Score'].values, expected.values, rtol=1e-6, atol=1e-9)
+        assert (actual['Score'].values[:int(ticker_count * FLAT_SHARE)] == 0).all(), 'a flat window scored'
+        print('%10d %14.4f %14.4f %9.1fx' % (ticker_count, pandas_seconds, grouped_seconds,
+                                             pandas_seconds / grouped_seconds))
+
+
+if __name__ == '__main__':
+    main()
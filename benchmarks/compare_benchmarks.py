@@ -0,0 +1,64 @@
+"""Compares two saved benchmark runs stage by stage & flags the stages that got slower.
+Run from the repository root: python benchmarks/compare_benchmarks.py results/base.json results/new.json"""
+# Import necessary modules
+import argparse
+import json
+import sys
+
+REGRESSION_THRESHOLD = 0.10  # A stage more than 10% slower than the base is a regression
+
+
+def load_results(path):
+    """Returns a saved run
+    :param path: str
+    :rtype: dict
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(base, new, threshold=REGRESSION_THRESHOLD):
+    """Returns one row per stage present in both runs: group, stage, base & new median seconds, ratio, peak memory of
+    both & whether it regressed
+    :param base: dict, saved run
+    :param new: dict, saved run
+    :param threshold: float, relative slowdown that counts as a regression
+    :rtype: list of dicts
+    """
+    rows = []
+    for group, stages in new['benchmarks'].items():
+        for stage, measurement in stages.items():
+            base_measurement = base['benchmarks'].get(group, {}).get(stage)
+            if base_measurement is None:
+                continue
+            ratio = measurement['median'] / base_measurement['median'] if base_measurement['median'] else float('inf')
+            rows.append({'group': group, 'stage': stage, 'base': base_measurement['median'],
+                         'new': measurement['median'], 'ratio': ratio,
+                         'base_peak_bytes': base_measurement['peak_bytes'], 'new_peak_bytes': measurement['peak_bytes'],
+                         'regressed': ratio > 1 + threshold})
+    return rows
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Compare two benchmark runs.')
+    parser.add_argument('base', help='results file of the base commit')
+    parser.add_argument('new', help='results file of the new commit')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    base_results, new_results = load_results(arguments.base), load_results(arguments.new)
+    for fixture_name in set(base_results['fixtures']) & set(new_results['fixtures']):
+        if base_results['fixtures'][fixture_name] != new_results['fixtures'][fixture_name]:
+            print('warning: fixture %s changed between the runs' % fixture_name)
+    print('%s -> %s' % (base_results.get('commit'), new_results.get('commit')))
+    comparison = compare(base_results, new_results, arguments.threshold)
+    for row in comparison:
+        print('%-12s %-32s %10.2f ms %10.2f ms  x%5.2f  peak %7.1f -> %7.1f MB%s' % (
+            row['group'], row['stage'], row['base'] * 1000, row['new'] * 1000, row['ratio'],
+            row['base_peak_bytes'] / 2 ** 20, row['new_peak_bytes'] / 2 ** 20,
+            '  REGRESSION' if row['regressed'] else ''))
+    sys.exit(1 if any(row['regressed'] for row in comparison) else 0)
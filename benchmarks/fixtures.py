@@ -0,0 +1,189 @@
+"""Market data fixtures for the benchmarks: one minute bars of a ticker universe stored as .npz arrays & described by
+manifest.json with a checksum of their contents. Synthetic fixtures are regenerated from their seed when the file is
+missing, recorded ones are captured once from yahoo & committed, they are what the benchmarks run on by default;
+either way the checksum has to match before a fixture is used.
+Run from the repository root:
+    python benchmarks/fixtures.py generate
+    python benchmarks/fixtures.py verify
+    python benchmarks/fixtures.py record --name live_300 --tickers 300"""
+# Import necessary modules
+import argparse
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MANIFEST_PATH = os.path.join(FIXTURE_DIRECTORY, 'manifest.json')
+HISTORY_FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']  # Columns of a yahoo Ticker.history frame
+SYNTHETIC_FIXTURES = {'panel_300': 300, 'panel_500': 500, 'panel_5000': 5000}  # Name -> tickers
+BARS = 15  # One minute bars per ticker, the window query_yahoo requests
+MISSING_RATE = 0.01  # Share of bars yahoo leaves out of a synthetic fixture
+END_TIME = '2021-08-02 19:59'  # UTC timestamp of the last synthetic bar
+
+
+def generate_fixture(ticker_count, bars=BARS, seed=0):
+    """Returns the arrays of a synthetic fixture: random walk bars with a few missing, reproducible from the seed
+    :param ticker_count: int
+    :param bars: int
+    :param seed: int
+    :rtype: dict of numpy arrays
+    """
+    random_state = np.random.RandomState(seed)
+    timestamps = pd.date_range(end=END_TIME, periods=bars, freq='1min', tz='UTC').asi8
+    close = 100 * np.exp(np.cumsum(random_state.normal(0, 0.001, (bars, ticker_count)), axis=0))
+    open_price = close * (1 + random_state.normal(0, 0.0005, (bars, ticker_count)))
+    values = np.empty((bars, ticker_count, len(HISTORY_FIELDS)))
+    values[:, :, 0] = open_price
+    values[:, :, 1] = np.maximum(open_price, close) * 1.0002
+    values[:, :, 2] = np.minimum(open_price, close) * 0.9998
+    values[:, :, 3] = close
+    values[:, :, 4] = close
+    values[:, :, 5] = random_state.randint(1000, 100000, (bars, ticker_count))
+    values[random_state.random_sample((bars, ticker_count)) < MISSING_RATE] = np.nan  # Bars yahoo did not return
+    return {'tickers': np.array(['T%05d' % number for number in range(ticker_count)]), 'timestamps': timestamps,
+            'values': values}
+
+
+def fixture_checksum(arrays):
+    """Returns the sha256 of a fixture's contents
+    :param arrays: dict of numpy arrays
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for name in ('tickers', 'timestamps', 'values'):
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+def read_manifest():
+    """Returns the manifest, empty when there is none
+    :rtype: dict
+    """
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as file:
+        return json.load(file)
+
+
+def write_manifest(manifest):
+    """Writes the manifest
+    :param manifest: dict
+    """
+    os.makedirs(FIXTURE_DIRECTORY, exist_ok=True)
+    with open(MANIFEST_PATH, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def default_fixture_names():
+    """Returns the recorded fixtures of the manifest, or the synthetic ones while nothing was recorded
+    :rtype: list of str
+    """
+    manifest = read_manifest()
+    recorded = sorted(name for name, entry in manifest.items() if entry['source'] == 'recorded')
+    return recorded or [name for name in SYNTHETIC_FIXTURES if name in manifest]
+
+
+def fixture_path(name):
+    """Returns the file of a fixture
+    :param name: str
+    :rtype: str
+    """
+    return os.path.join(FIXTURE_DIRECTORY, name + '.npz')
+
+
+def save_fixture(name, arrays, description):
+    """Stores a fixture & records it in the manifest
+    :param name: str
+    :param arrays: dict of numpy arrays
+    :param description: dict, how the fixture was made
+    """
+    os.makedirs(FIXTURE_DIRECTORY, exist_ok=True)
+    np.savez(fixture_path(name), **arrays)
+    manifest = read_manifest()
+    manifest[name] = dict(description, tickers=len(arrays['tickers']), bars=len(arrays['timestamps']),
+                          sha256=fixture_checksum(arrays))
+    write_manifest(manifest)
+
+
+def load_fixture(name):
+    """Returns a fixture's arrays after checking them against the manifest. A synthetic fixture whose file is missing
+    is regenerated from its seed first.
+    :param name: str
+    :rtype: dict of numpy arrays
+    """
+    entry = read_manifest()[name]
+    if not os.path.exists(fixture_path(name)):
+        if entry['source'] != 'synthetic':
+            raise FileNotFoundError('Recorded fixture %s is missing, record it again' % name)
+        arrays = generate_fixture(entry['tickers'], entry['bars'], entry['seed'])
+        np.savez(fixture_path(name), **arrays)
+    else:
+        with np.load(fixture_path(name)) as stored:
+            arrays = {key: stored[key] for key in stored.files}
+    if fixture_checksum(arrays) != entry['sha256']:
+        raise ValueError('Fixture %s does not match its manifest checksum' % name)
+    return arrays
+
+
+def fixture_histories(arrays):
+    """Returns the fixture as yahoo Ticker.history dataframes, the raw input of query_yahoo's reshaping. Missing bars
+    are left out of their ticker's frame, like yahoo does.
+    :param arrays: dict of numpy arrays
+    :rtype: dict ticker -> pandas dataframe
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(arrays['timestamps'], utc=True).tz_convert('America/New_York'),
+                             name='Datetime')
+    histories = {}
+    for column, ticker in enumerate(arrays['tickers']):
+        values = arrays['values'][:, column, :]
+        present = ~np.isnan(values[:, 0])
+        histories[str(ticker)] = pd.DataFrame(values[present], index=index[present], columns=HISTORY_FIELDS)
+    return histories
+
+
+def record_fixture(name, ticker_count):
+    """Records the last 15 minutes of the top S&P tickers from yahoo as a fixture
+    :param name: str
+    :param ticker_count: int
+    """
+    import main  # Only recording needs the network modules
+    from market_data_fetcher import YahooDataSource
+    tickers = main.query_sp_500_tickers()[:ticker_count]
+    panel = YahooDataSource().fetch(tickers)
+    dates = pd.to_datetime(panel['Date'], utc=True)
+    timestamps = np.unique(dates.values.astype('datetime64[ns]').astype(np.int64))
+    values = np.full((len(timestamps), len(tickers), len(HISTORY_FIELDS)), np.nan)
+    rows = np.searchsorted(timestamps, dates.values.astype('datetime64[ns]').astype(np.int64))
+    columns = pd.Index(tickers).get_indexer(panel['Ticker'])
+    values[rows, columns] = panel[HISTORY_FIELDS].values
+    save_fixture(name, {'tickers': np.array(tickers), 'timestamps': timestamps, 'values': values},
+                 {'source': 'recorded', 'recorded_at': pd.Timestamp.now(tz='UTC').isoformat()})
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Create, check or record the benchmark fixtures.')
+    parser.add_argument('command', choices=['generate', 'verify', 'record'])
+    parser.add_argument('--name', default=None, help='fixture name, for record')
+    parser.add_argument('--tickers', type=int, default=300, help='tickers to record')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    if arguments.command == 'generate':
+        for fixture_name, count in SYNTHETIC_FIXTURES.items():
+            save_fixture(fixture_name, generate_fixture(count, seed=count), {'source': 'synthetic', 'seed': count})
+            print('generated %s' % fixture_name)
+    elif arguments.command == 'verify':
+        for fixture_name in sorted(read_manifest()):
+            load_fixture(fixture_name)
+            print('%s ok' % fixture_name)
+    else:
+        record_fixture(arguments.name or 'recorded_%d' % arguments.tickers, arguments.tickers)
@@ -0,0 +1,172 @@
+"""Times the trading cycle stages & the Profile buy to sell lifecycle on the recorded fixtures, with no network, & saves
+the run as JSON so two commits can be compared with compare_benchmarks.py.
+Run from the repository root: python benchmarks/run_benchmarks.py [--fixtures panel_300 panel_500] [--repeat 5]"""
+# Import necessary modules
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+import fixtures  # noqa: E402
+import main  # noqa: E402
+import profile_class  # noqa: E402
+import scoring_models  # noqa: E402
+from market_data_fetcher import histories_to_panel  # noqa: E402
+from panel_index import PanelIndex  # noqa: E402
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def measure(function, repeat):
+    """Runs a function repeat times & returns its timings & the peak memory of one extra traced run. The timed runs
+    are not traced, tracemalloc slows allocations down.
+    :param function: function without arguments returning the stage output
+    :param repeat: int
+    :rtype: dict
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'min': min(seconds), 'median': float(np.median(seconds)), 'max': max(seconds), 'repeat': repeat,
+            'peak_bytes': peak_bytes}
+
+
+def prepare_panel(histories, ticker_list):
+    """Runs the reshaping & tier weighting of build_complete_stock_data on fixture histories
+    :param histories: dict ticker -> dataframe
+    :param ticker_list: list of str in rank order
+    :rtype: tuple, (panel dataframe, PanelIndex)
+    """
+    panel = histories_to_panel(histories)
+    panel_index = PanelIndex.from_dataframe(panel)
+    tier_count = len(main.REPUTATION_WEIGHTS)
+    # Past the weighted tiers every ticker gets the last weight, so big fixtures still rank
+    ranks = np.minimum(pd.Index(ticker_list).get_indexer(panel_index.tickers) // main.REPUTATION_TIER_SIZE,
+                       tier_count - 1)
+    panel['Reputation Weight'] = np.asarray(main.REPUTATION_WEIGHTS, dtype=float)[ranks][panel_index.codes]
+    return panel, panel_index
+
+
+def benchmark_fixture(name, repeat):
+    """Times every stage on one fixture
+    :param name: str
+    :param repeat: int
+    :rtype: dict stage -> measurement
+    """
+    arrays = fixtures.load_fixture(name)
+    histories = fixtures.fixture_histories(arrays)
+    ticker_list = [str(ticker) for ticker in arrays['tickers']]
+    panel, panel_index = prepare_panel(histories, ticker_list)
+    percent_change_df = main.calculate_percent_change_df(panel.copy(), panel_index)
+    ridge_df = main.build_ridge_analysis_dataframe(percent_change_df, panel_index)
+
+    def full_cycle():
+        cycle_panel, cycle_index = prepare_panel(histories, ticker_list)
+        cycle_panel = main.calculate_percent_change_df(cycle_panel, cycle_index)
+        return main.recommend_top_stock(main.build_ridge_analysis_dataframe(cycle_panel, cycle_index))
+
+    stages = {'query_yahoo_reshape': measure(lambda: histories_to_panel(histories), repeat),
+              'calculate_percent_change_df': measure(
+                  lambda: main.calculate_percent_change_df(panel.copy(), panel_index), repeat),
+              'build_ridge_analysis_dataframe': measure(
+                  lambda: main.build_ridge_analysis_dataframe(percent_change_df, panel_index), repeat),
+              'recommend_top_stock': measure(lambda: main.recommend_top_stock(ridge_df), repeat),
+              'full_cycle': measure(full_cycle, repeat)}
+    for model_name in scoring_models.SCORING_MODELS:  # Every scoring model with its default parameters
+        model = scoring_models.build_scoring_model(model_name)
+        stages['score_' + model_name] = measure(lambda: model.score(panel, panel_index), repeat)
+    return stages
+
+
+def profile_lifecycle(directory, trades=10):
+    """Runs a profile through buy, fill, mark to market, sell & fill trades times, in simulated time
+    :param directory: str, where the profile's files go
+    :param trades: int
+    """
+    clock = [pd.Timestamp('2021-08-02 14:00')]
+    profile = profile_class.Profile(os.path.join(directory, 'benchmark'))
+    profile.set_clock(lambda: clock[0])
+    profile.set_price_source(lambda stock_symbol: 100.0 + clock[0].minute / 100)
+    profile.set_cash(20)
+    for _ in range(trades):
+        profile.submit_order('T00000', profile.get_cash())
+        clock[0] += pd.Timedelta(minutes=11)
+        profile.complete_trade()
+        profile.calculate_current_percentage()
+        profile.submit_sell()
+        clock[0] += pd.Timedelta(minutes=11)
+        profile.complete_sell()
+    profile.ledger.close()
+
+
+def benchmark_lifecycle(repeat):
+    """Times the Profile buy to sell lifecycle with its real snapshot & ledger writes
+    :param repeat: int
+    :rtype: dict
+    """
+    def run():
+        with tempfile.TemporaryDirectory() as directory:
+            profile_lifecycle(directory)
+    return {'profile_lifecycle_10_trades': measure(run, repeat)}
+
+
+def git_commit():
+    """Returns the current commit, or None outside a git checkout
+    :rtype: str
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark the trading cycle on the recorded fixtures.')
+    parser.add_argument('--fixtures', nargs='+', default=fixtures.default_fixture_names(),
+                        help='recorded fixtures by default, the synthetic ones while none was recorded')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage')
+    parser.add_argument('--output', default=None, help='results file, defaults to results/<commit>_<time>.json')
+    return parser.parse_args()
+
+
+def main_benchmarks():
+    """Runs the benchmarks, prints a table & saves the results"""
+    arguments = parse_arguments()
+    manifest = fixtures.read_manifest()
+    results = {'commit': git_commit(), 'created_at': pd.Timestamp.now(tz='UTC').isoformat(),
+               'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+               'fixtures': {name: manifest[name]['sha256'] for name in arguments.fixtures}, 'benchmarks': {}}
+    for name in arguments.fixtures:
+        results['benchmarks'][name] = benchmark_fixture(name, arguments.repeat)
+    results['benchmarks']['profile'] = benchmark_lifecycle(arguments.repeat)
+    for group, stages in results['benchmarks'].items():
+        for stage, measurement in stages.items():
+            print('%-12s %-32s %10.2f ms  peak %8.1f MB' % (group, stage, measurement['median'] * 1000,
+                                                           measurement['peak_bytes'] / 2 ** 20))
+    output = arguments.output or os.path.join(
+        RESULTS_DIRECTORY, '%s_%s.json' % (results['commit'] or 'unknown', time.strftime('%Y%m%d_%H%M%S')))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+    print('saved %s' % output)
+
+
+if __name__ == '__main__':
+    main_benchmarks()
@@ -0,0 +1,142 @@
+"""Times the startup of the trading entry points with python -X importtime, & a whole "nothing to do" run of the
+derek_simulation cycle: a profile whose buy is still inside its ten minute wait is loaded, checked & left alone. Every
+run is a fresh interpreter, so nothing is already imported. Results are saved in the run_benchmarks.py format, so
+compare_benchmarks.py compares them too.
+Run from the repository root: python benchmarks/startup_benchmarks.py [--repeat 5]"""
+# Import necessary modules
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)  # Make the repo modules importable
+import profile_class  # noqa: E402
+import run_benchmarks  # noqa: E402
+
+# Entry point -> the modules it imports before doing any work
+ENTRY_POINTS = {'derek_simulation': ['profile_class', 'trading_cycle'],
+                'trading_daemon': ['trading_daemon'],
+                'portfolio_manager': ['portfolio_manager'],
+                'backtester': ['backtester']}
+HEAVY_MODULES = ['pandas', 'yfinance', 'requests', 'robin_stocks', 'sklearn', 'scipy']  # Costly to import
+# Loads a profile in the working directory & runs one cycle, then reports its own wall time, the heavy modules it
+# ended up importing & its peak memory as JSON
+NOTHING_TO_DO_SCRIPT = '''
+import time
+start = time.perf_counter()
+import json, resource, sys
+sys.path.insert(0, %(repository)r)
+import profile_class, trading_cycle
+trading_cycle.run_cycle(profile_class.load_profile_from_pickle('startup'))
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'imported': [name for name in %(heavy)r if name in sys.modules],
+                  'peak_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}))
+'''
+
+
+def import_times(modules):
+    """Imports modules in a fresh interpreter under -X importtime & returns the cumulative microseconds of every
+    module it imported, & the child's peak memory
+    :param modules: list of str
+    :rtype: tuple, (dict module -> microseconds, int bytes)
+    """
+    code = ('import json, resource, sys; sys.path.insert(0, %r); import %s; '
+            'print(json.dumps(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024))'
+            % (REPOSITORY, ', '.join(modules)))
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                               check=True, cwd=tempfile.gettempdir())
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_time, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)  # Indentation shows nesting, a top level import lists its whole tree
+    return times, json.loads(completed.stdout)
+
+
+def benchmark_imports(modules, repeat):
+    """Times importing an entry point's modules repeat times
+    :param modules: list of str
+    :param repeat: int
+    :rtype: tuple, (measurement dict, dict module -> microseconds of the last run)
+    """
+    seconds = []
+    for _ in range(repeat):
+        times, peak_bytes = import_times(modules)
+        seconds.append(sum(times[module] for module in modules if module in times) / 1e6)
+    return {'min': min(seconds), 'median': float(np.median(seconds)), 'max': max(seconds), 'repeat': repeat,
+            'peak_bytes': peak_bytes}, times
+
+
+def prepare_pending_profile(directory):
+    """Creates a profile whose buy was just submitted, so a cycle has nothing to do for ten minutes
+    :param directory: str
+    """
+    profile = profile_class.Profile(os.path.join(directory, 'startup'))
+    profile.set_cash(20)
+    profile.submit_order('T00000', 20)
+    profile.ledger.close()
+
+
+def benchmark_nothing_to_do(repeat):
+    """Times whole runs of the nothing to do cycle, interpreter start included
+    :param repeat: int
+    :rtype: tuple, (measurement dict, list of heavy modules the cycle imported)
+    """
+    seconds = []
+    with tempfile.TemporaryDirectory() as directory:
+        prepare_pending_profile(directory)
+        script = NOTHING_TO_DO_SCRIPT % {'repository': REPOSITORY, 'heavy': HEAVY_MODULES}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                       cwd=directory)
+            seconds.append(time.perf_counter() - start)
+            report = json.loads(completed.stdout.splitlines()[-1])
+    return {'min': min(seconds), 'median': float(np.median(seconds)), 'max': max(seconds), 'repeat': repeat,
+            'peak_bytes': report['peak_bytes'], 'in_process_seconds': report['seconds']}, report['imported']
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark the startup of the trading entry points.')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per measurement')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports listed per entry point')
+    parser.add_argument('--output', default=None, help='results file, defaults to results/startup_<commit>_<time>.json')
+    return parser.parse_args()
+
+
+def main_benchmarks():
+    """Runs the benchmarks, prints a table & saves the results"""
+    arguments = parse_arguments()
+    results = {'commit': run_benchmarks.git_commit(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(), 'fixtures': {}, 'benchmarks': {'startup': {}}}
+    stages = results['benchmarks']['startup']
+    for entry_point, modules in ENTRY_POINTS.items():
+        stages['import_' + entry_point], times = benchmark_imports(modules, arguments.repeat)
+        slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:arguments.top]
+        print('%s imports: %s' % (entry_point, ', '.join('%s %.0f ms' % (name, microseconds / 1000)
+                                                          for name, microseconds in slowest)))
+    stages['nothing_to_do_cycle'], imported = benchmark_nothing_to_do(arguments.repeat)
+    print('nothing to do cycle imported: %s' % (', '.join(imported) or 'no heavy modules'))
+    for stage, measurement in stages.items():
+        print('%-12s %-32s %10.2f ms  peak %8.1f MB' % ('startup', stage, measurement['median'] * 1000,
+                                                       measurement['peak_bytes'] / 2 ** 20))
+    output = arguments.output or os.path.join(
+        run_benchmarks.RESULTS_DIRECTORY, 'startup_%s_%s.json' % (results['commit'] or 'unknown',
+                                                                  time.strftime('%Y%m%d_%H%M%S')))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+    print('saved %s' % output)
+
+
+if __name__ == '__main__':
+    main_benchmarks()
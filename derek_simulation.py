@@ -1,6 +1,6 @@
 # Import necessary modules
 import profile_class
-import main
+import trading_cycle
 
 # # This is commented out because we will be Derek object once, later we load the profile
 # derek = profile_class.Profile('derek')
@@ -8,25 +8,7 @@ import main
 
 derek = profile_class.load_profile_from_pickle('Derek')  # Load Derek object
 
-if derek.get_pending_purchase():  # If I have a pending purchase
-    derek.complete_trade()  # Attempt to complete the purchase
-
-if derek.get_pending_sells():  # If I have a pending sell
-    derek.complete_sell()  # Attempt to complete the sell
-
-# If we are holding a stock & not currently selling the stock
-if derek.get_current_stock_holding() is not None and not derek.get_pending_sells():
-    derek.calculate_current_percentage()  # Update current percentage change
-
-# If Derek is holding a stock and the percentage change is greater than 0.3% or less than -0.2%, sell the stock
-if derek.get_current_stock_holding() is not None and (
-        derek.get_current_percentage_change() > 0.3 or derek.get_current_percentage_change() < -0.2):
-    derek.submit_sell()  # Initiates sell
-
-# If Derek is not holding a stock & there are no pending purchases
-if derek.get_current_stock_holding() is None and not derek.get_pending_purchase():
-    instance_model_performance_stocks = main.build_complete_stock_data()  # Get Ridged first derivative stock data
-    # Receive sorted solution
-    instance_top_performing_ticker = main.recommend_top_stock(instance_model_performance_stocks)
-    cash_balance = derek.get_cash()  # Get current cash balance
-    derek.submit_order(instance_top_performing_ticker, cash_balance)  # Initiates purchase
+# Complete pending orders, sell if the holding is up more than 0.3% or down more than 0.2%, otherwise buy the top
+# ranked stock when Derek is free. trading_daemon.py runs the same cycle continuously with everything kept warm, &
+# with --monitor-interval it also watches the holding between cycles to sell as soon as a threshold is crossed.
+trading_cycle.run_cycle(derek)
@@ -0,0 +1,475 @@
+# Import necessary modules
+import asyncio
+import inspect
+import itertools
+import math
+from collections import namedtuple
+from lazy_import import LazyModule
+
+pd = LazyModule('pandas')  # Only the event time stamps need it
+robinhood = LazyModule('robin_stocks.robinhood')  # Only live trading needs robin_stocks
+
+ORDER_STATES = ['submitted', 'partially_filled', 'filled', 'cancelled', 'rejected']  # Life cycle of an order
+DONE_STATES = {'filled', 'cancelled', 'rejected'}  # States an order never leaves
+# Robinhood order states -> ours; queued, unconfirmed & confirmed orders are still working
+ROBINHOOD_STATES = {'queued': 'submitted', 'unconfirmed': 'submitted', 'confirmed': 'submitted',
+                    'partially_filled': 'partially_filled', 'filled': 'filled', 'cancelled': 'cancelled',
+                    'rejected': 'rejected', 'failed': 'rejected'}
+
+# One change of an order: its new state &, for a fill, the shares & price of that fill alone next to the order's
+# running totals
+OrderEvent = namedtuple('OrderEvent', ['order_id', 'symbol', 'side', 'state', 'fill_quantity', 'fill_price',
+                                       'filled_quantity', 'filled_amount', 'average_price', 'timestamp', 'reason'])
+
+
+class Order:
+    """Class that holds one order & its fills. A buy spends a dollar amount, a sell sells a number of shares, the way
+    the trading cycle trades: the whole cash balance in, the whole position out."""
+    ids = itertools.count(1)  # Local order ids
+
+    def __init__(self, symbol, side, amount=None, quantity=None, submitted_time=None):
+        """
+        :param symbol: str
+        :param side: str, buy or sell
+        :param amount: float, dollars to spend, for a buy
+        :param quantity: float, shares to sell, for a sell
+        :param submitted_time: optional datetime
+        """
+        if side not in ('buy', 'sell'):
+            raise ValueError('Unknown order side %r, expected buy or sell' % side)
+        if (amount if side == 'buy' else quantity) is None:
+            raise ValueError('A buy needs an amount & a sell needs a quantity')
+        self.order_id = next(Order.ids)  # Local id, events refer to it
+        self.broker_order_id = None  # Id at the broker, for adapters of a remote broker
+        self.symbol = symbol  # Stock ticker
+        self.side = side  # buy or sell
+        self.amount = amount  # Dollars to spend, buys only
+        self.quantity = quantity  # Shares to sell, sells only
+        self.state = 'submitted'  # One of ORDER_STATES
+        self.filled_quantity = 0.0  # Shares filled so far
+        self.filled_amount = 0.0  # Dollars filled so far
+        self.submitted_time = submitted_time  # When the order was sent
+        self.updated_time = submitted_time  # When the order last changed
+
+    def __repr__(self):
+        return 'Order(%d, %s %s, %s, %.6g filled)' % (self.order_id, self.side, self.symbol, self.state,
+                                                      self.filled_quantity)
+
+    def is_done(self):
+        """Returns true once the order can not change anymore
+        :rtype: bool
+        """
+        return self.state in DONE_STATES
+
+    def get_average_price(self):
+        """Returns the average fill price, None before the first fill
+        :rtype: float
+        """
+        return self.filled_amount / self.filled_quantity if self.filled_quantity else None
+
+    def get_remaining(self):
+        """Returns what is left to fill: dollars for a buy, shares for a sell
+        :rtype: float
+        """
+        if self.side == 'buy':
+            return max(self.amount - self.filled_amount, 0.0)
+        return max(self.quantity - self.filled_quantity, 0.0)
+
+
+class Broker:
+    """Base class of the brokers. Orders are sent with submit & every change of an order, from submission to its last
+    fill or cancellation, is pushed to the listeners as an OrderEvent the moment the broker reports it, so nothing has
+    to poll the order. Subclasses implement send & cancel_order; they call record_fill & set_state as the order moves,
+    which emit the events. Listeners run on the event loop & must not block."""
+
+    def __init__(self, clock=None):
+        """
+        :param clock: optional function returning the current time, e.g. a backtest's, the wall clock otherwise
+        """
+        self.clock = clock  # Time stamps of the events
+        self.orders = {}  # Order id -> order
+        self.listeners = []  # Functions called with every OrderEvent
+        self.waiters = {}  # Order id -> futures resolved when the order is done
+
+    def get_current_time(self):
+        """Returns the current time from the clock, or the wall clock
+        :rtype: pandas timestamp
+        """
+        return pd.Timestamp.now() if self.clock is None else pd.Timestamp(self.clock())
+
+    def add_listener(self, listener):
+        """Subscribes a function to every order event
+        :param listener: function OrderEvent -> None
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unsubscribes a function
+        :param listener: function
+        """
+        self.listeners.remove(listener)
+
+    async def submit(self, order):
+        """Sends an order to the broker & returns it; its fills arrive as events. An order the broker refuses is
+        rejected with an event rather than raising.
+        :param order: Order
+        :rtype: Order
+        """
+        order.submitted_time = order.updated_time = self.get_current_time()
+        self.orders[order.order_id] = order
+        self.emit(order)  # Submitted
+        try:
+            await self.send(order)
+        except Exception as error:  # Refused by the broker or could not reach it
+            self.set_state(order, 'rejected', reason=str(error))
+        return order
+
+    async def cancel(self, order_id):
+        """Asks the broker to cancel what is left of an order. The cancellation arrives as an event, fills that beat
+        it still count.
+        :param order_id: int
+        """
+        order = self.orders[order_id]
+        if not order.is_done():
+            await self.cancel_order(order)
+
+    async def wait(self, order_id, timeout=None):
+        """Waits until an order is done & returns it
+        :param order_id: int
+        :param timeout: optional float, seconds
+        :rtype: Order
+        """
+        order = self.orders[order_id]
+        if not order.is_done():
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(order_id, []).append(future)
+            await asyncio.wait_for(future, timeout)
+        return order
+
+    async def send(self, order):
+        """Sends a new order to the broker
+        :param order: Order
+        """
+        raise NotImplementedError
+
+    async def cancel_order(self, order):
+        """Sends a cancellation to the broker
+        :param order: Order
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Stops the broker's background work"""
+
+    def record_fill(self, order, quantity, price, timestamp=None):
+        """Adds a fill to an order & emits it; the order is filled once nothing is left
+        :param order: Order
+        :param quantity: float, shares
+        :param price: float
+        :param timestamp: optional datetime, now by default
+        """
+        order.filled_quantity += quantity
+        order.filled_amount += quantity * price
+        # Within a millionth of the order is filled, so float rounding never leaves a dust order working
+        done = order.get_remaining() <= 1e-6 * (order.amount if order.side == 'buy' else order.quantity)
+        order.state = 'filled' if done else 'partially_filled'
+        order.updated_time = self.get_current_time() if timestamp is None else timestamp
+        self.emit(order, quantity, price)
+
+    def set_state(self, order, state, timestamp=None, reason=None):
+        """Moves an order to a state without a fill & emits it, e.g. cancelled or rejected
+        :param order: Order
+        :param state: str, one of ORDER_STATES
+        :param timestamp: optional datetime, now by default
+        :param reason: optional str, why the broker did it
+        """
+        order.state = state
+        order.updated_time = self.get_current_time() if timestamp is None else timestamp
+        self.emit(order, reason=reason)
+
+    def emit(self, order, fill_quantity=0.0, fill_price=None, reason=None):
+        """Pushes the order's change to the listeners & wakes whoever waits for it to be done
+        :param order: Order
+        :param fill_quantity: float, shares of this fill
+        :param fill_price: float, price of this fill
+        :param reason: optional str
+        """
+        event = OrderEvent(order.order_id, order.symbol, order.side, order.state, fill_quantity, fill_price,
+                           order.filled_quantity, order.filled_amount, order.get_average_price(), order.updated_time,
+                           reason)
+        for listener in list(self.listeners):
+            listener(event)
+        if order.is_done():
+            for future in self.waiters.pop(order.order_id, []):
+                if not future.done():
+                    future.set_result(order)
+
+
+class SimulatedBroker(Broker):
+    """Class that matches orders locally against a price source, fully offline. An order waits the latency, then
+    fills in partial_fills equal pieces fill_interval seconds apart, each at the price source's price moved against
+    the order by the slippage. A symbol without a price is rejected. With no latency & no interval every fill happens
+    on the next turn of the event loop. The matching runs on the event loop, so a price source that blocks, like a
+    quote request, should be awaitable, see threaded_price_source."""
+
+    def __init__(self, price_source, latency=0.5, slippage=0.0005, partial_fills=1, fill_interval=1.0, clock=None):
+        """
+        :param price_source: function stock symbol -> price or awaitable price, e.g. recorded bars or
+            threaded_price_source(Profile.get_current_price)
+        :param latency: float, seconds from submission to the first fill
+        :param slippage: float, fraction of the price a fill loses, 0.0005 is 5 basis points
+        :param partial_fills: int, pieces each order fills in
+        :param fill_interval: float, seconds between two pieces
+        :param clock: optional function returning the current time
+        """
+        super().__init__(clock)
+        self.price_source = price_source  # Prices the orders fill at
+        self.latency = latency  # Seconds before the first fill
+        self.slippage = slippage  # Fraction of the price lost per fill
+        self.partial_fills = max(int(partial_fills), 1)  # Pieces per order
+        self.fill_interval = fill_interval  # Seconds between pieces
+        self.tasks = set()  # Matching tasks of the working orders
+
+    async def send(self, order):
+        """Starts matching the order in the background"""
+        task = asyncio.ensure_future(self.match(order))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def cancel_order(self, order):
+        """Cancels the rest of the order, the matching task stops at its next piece"""
+        self.set_state(order, 'cancelled')
+
+    async def match(self, order):
+        """Fills an order piece by piece
+        :param order: Order
+        """
+        await asyncio.sleep(self.latency)
+        for piece in range(self.partial_fills):
+            if order.is_done():  # Cancelled while waiting
+                return
+            price = self.price_source(order.symbol)
+            if inspect.isawaitable(price):  # Fetched off the event loop
+                price = await price
+            if order.is_done():  # Cancelled while the price was fetched
+                return
+            if price is None or not math.isfinite(price) or price <= 0:
+                self.set_state(order, 'rejected', reason='no price for %s' % order.symbol)
+                return
+            # Buys pay more & sells get less
+            fill_price = price * (1 + self.slippage) if order.side == 'buy' else price * (1 - self.slippage)
+            pieces_left = self.partial_fills - piece
+            if order.side == 'buy':
+                quantity = order.get_remaining() / pieces_left / fill_price
+            else:
+                quantity = order.get_remaining() / pieces_left
+            self.record_fill(order, quantity, fill_price)
+            if pieces_left > 1:
+                await asyncio.sleep(self.fill_interval)
+
+    async def close(self):
+        """Cancels the matching of every working order"""
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+def threaded_price_source(price_source):
+    """Returns an awaitable price source that calls a blocking one in a worker thread, so a quote request never stalls
+    the event loop the broker matches on
+    :param price_source: function stock symbol -> price
+    :rtype: coroutine function stock symbol -> price
+    """
+    async def price(stock_symbol):
+        return await asyncio.get_running_loop().run_in_executor(None, price_source, stock_symbol)
+    return price
+
+
+class RobinhoodBroker(Broker):
+    """Class that sends orders to Robinhood through robin_stocks as fractional orders: buys by dollar amount, sells by
+    share quantity. Robinhood has no push channel for order updates, so the adapter watches each working order in the
+    background & turns every change it sees into events, the rest of the program only ever sees events. Log in first
+    with robin_stocks, or pass the credentials."""
+
+    def __init__(self, username=None, password=None, poll_interval=1.0, time_in_force='gfd', extended_hours=False):
+        """
+        :param username: optional str, logs in when given
+        :param password: optional str
+        :param poll_interval: float, seconds between two looks at a working order
+        :param time_in_force: str, gfd (good for the day) or gtc
+        :param extended_hours: bool, allow fills outside regular hours
+        """
+        super().__init__()
+        self.poll_interval = poll_interval  # Seconds between looks at a working order
+        self.time_in_force = time_in_force  # Lifetime of the orders
+        self.extended_hours = extended_hours  # Trade outside regular hours
+        self.tasks = set()  # Watch tasks of the working orders
+        if username is not None:
+            robinhood.login(username, password)
+
+    async def call(self, function, *args, **kwargs):
+        """Runs a blocking robin_stocks call in a worker thread
+        :param function: function
+        :rtype: object
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: function(*args, **kwargs))
+
+    async def send(self, order):
+        """Places the order & starts watching it"""
+        orders = robinhood.orders
+        if order.side == 'buy':
+            response = await self.call(orders.order_buy_fractional_by_price, order.symbol, round(order.amount, 2),
+                                       timeInForce=self.time_in_force, extendedHours=self.extended_hours)
+        else:
+            response = await self.call(orders.order_sell_fractional_by_quantity, order.symbol, order.quantity,
+                                       timeInForce=self.time_in_force, extendedHours=self.extended_hours)
+        if not response or 'id' not in response:  # robin_stocks hands back the error body instead of raising
+            raise ValueError('Robinhood refused the order: %s' % response)
+        order.broker_order_id = response['id']
+        task = asyncio.ensure_future(self.watch(order))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def cancel_order(self, order):
+        """Asks Robinhood to cancel the order, the watch reports the cancellation once Robinhood confirms it"""
+        await self.call(robinhood.orders.cancel_stock_order, order.broker_order_id)
+
+    async def watch(self, order):
+        """Follows an order until it is done, emitting each new fill & state change
+        :param order: Order
+        """
+        while not order.is_done():
+            await asyncio.sleep(self.poll_interval)
+            try:
+                info = await self.call(robinhood.orders.get_stock_order_info, order.broker_order_id)
+            except Exception as error:  # A failed look is retried on the next one
+                print('Could not check order %s: %s' % (order.broker_order_id, error))
+                continue
+            self.apply_order_info(order, info)
+
+    def apply_order_info(self, order, info):
+        """Emits what changed between the order & Robinhood's view of it
+        :param order: Order
+        :param info: dict from robin_stocks.orders.get_stock_order_info
+        """
+        timestamp = pd.Timestamp(info['updated_at']) if info.get('updated_at') else None
+        cumulative_quantity = float(info.get('cumulative_quantity') or 0)
+        if cumulative_quantity > order.filled_quantity + 1e-9:  # New shares were filled
+            average_price = float(info['average_price'])
+            new_quantity = cumulative_quantity - order.filled_quantity
+            # Price of the new shares alone, so the order's average matches Robinhood's
+            fill_price = (average_price * cumulative_quantity - order.filled_amount) / new_quantity
+            self.record_fill(order, new_quantity, fill_price, timestamp)
+        state = ROBINHOOD_STATES.get(info.get('state'), order.state)
+        if state != order.state and (state in DONE_STATES or order.state == 'submitted'):
+            self.set_state(order, state, timestamp, reason=info.get('reject_reason'))
+
+    async def close(self):
+        """Stops watching the working orders, they keep working at Robinhood"""
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class ExecutionManager:
+    """Class that trades profiles through a broker. buy & sell record the order on the profile like submit_order &
+    submit_sell do, then send it; the broker's events then update the profile the moment the order is done, in place
+    of the ten minute wait of complete_trade & complete_sell. Partial fills are reported to the listeners as they
+    come & applied to the profile in one go, at their average price, when the order is done: a buy cancelled part way
+    holds what was bought, a sell cancelled part way keeps the rest of the shares. Given the lock that guards the
+    profiles from worker threads, a done order is applied in a worker thread under it, so the ledger & snapshot writes
+    never block the event loop; the order counts as working until it is applied."""
+
+    def __init__(self, broker, profile_lock=None):
+        """
+        :param broker: Broker
+        :param profile_lock: optional threading.Lock, apply done orders in a worker thread holding it
+        """
+        self.broker = broker  # Where the orders go
+        self.profile_lock = profile_lock  # Held while a done order is applied off the event loop
+        self.profiles = {}  # Order id -> profile of every working order, until the done order is applied
+        self.updates = set()  # Futures of the done orders being applied in worker threads
+        broker.add_listener(self.on_event)
+
+    def has_working_order(self, profile):
+        """Returns true while one of the profile's orders is at the broker
+        :param profile: Profile
+        :rtype: bool
+        """
+        return any(owner is profile for owner in self.profiles.values())
+
+    async def buy(self, profile, stock_symbol, invested_capital):
+        """Submits a buy of a dollar amount for a profile. Returns the order, or None when the profile refused it.
+        :param profile: Profile
+        :param stock_symbol: str
+        :param invested_capital: float
+        :rtype: Order
+        """
+        if not profile.submit_order(stock_symbol, invested_capital):  # Not enough cash
+            return None
+        return await self.send(profile, Order(stock_symbol, 'buy', amount=invested_capital))
+
+    async def sell(self, profile):
+        """Submits a sell of the profile's whole position. Returns the order, or None when there is nothing to sell or
+        a sell is already working.
+        :param profile: Profile
+        :rtype: Order
+        """
+        if not profile.submit_sell():
+            return None
+        return await self.send(profile, Order(profile.get_current_stock_holding(), 'sell',
+                                              quantity=profile.get_current_number_of_shares()))
+
+    async def send(self, profile, order):
+        """Sends an order of a profile to the broker
+        :param profile: Profile
+        :param order: Order
+        :rtype: Order
+        """
+        self.profiles[order.order_id] = profile
+        return await self.broker.submit(order)
+
+    def on_event(self, event):
+        """Applies a done order to its profile, in a worker thread when there is a profile lock
+        :param event: OrderEvent
+        """
+        if event.state not in DONE_STATES or event.order_id not in self.profiles:
+            return
+        if self.profile_lock is None:
+            self.apply(event)
+            return
+        update = asyncio.get_running_loop().run_in_executor(None, self.apply_locked, event)
+        self.updates.add(update)
+        update.add_done_callback(self.updates.discard)
+
+    async def wait_for_updates(self):
+        """Waits until every done order handed to a worker thread is applied"""
+        await asyncio.gather(*self.updates)
+
+    def apply_locked(self, event):
+        """Applies a done order holding the profile lock
+        :param event: OrderEvent
+        """
+        with self.profile_lock:
+            self.apply(event)
+
+    def apply(self, event):
+        """Records a done order's fills, or its cancellation, on its profile
+        :param event: OrderEvent
+        """
+        profile = self.profiles[event.order_id]
+        try:
+            if event.side == 'buy':
+                if event.filled_quantity:  # Filled, or cancelled part way
+                    profile.fill_buy(event.average_price, event.filled_quantity, event.timestamp,
+                                     event.filled_amount)
+                else:
+                    profile.cancel_buy(event.timestamp)
+            elif event.filled_quantity:
+                profile.fill_sell(event.average_price, event.filled_quantity, event.timestamp)
+            else:
+                profile.cancel_sell()
+        finally:
+            self.profiles.pop(event.order_id, None)  # No longer working, whether or not the profile took it
+        if event.state == 'rejected':
+            print('%s order for %s was rejected: %s' % (event.side, event.symbol, event.reason))
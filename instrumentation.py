@@ -0,0 +1,305 @@
+"""Stage timers, counters & an optional profiler for the trading cycle. Everything is off until enabled, either with
+the TRADING_INSTRUMENTATION=1 environment variable or instrumentation.enable(); while off, a timed stage costs one
+attribute check.
+    with instrumentation.stage('fetch'):
+        ...
+    instrumentation.default_registry.to_prometheus()"""
+# Import necessary modules
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+import numpy as np
+
+SAMPLE_WINDOW = 2048  # Recent durations kept per stage for the percentiles
+PROFILE_INTERVAL = 0.005  # Seconds between two stack samples of the profiler
+QUANTILES = [0.5, 0.95, 0.99]  # Percentiles reported for every stage
+
+
+class StageStats:
+    """Class that accumulates the durations of one stage: count, total & max over its lifetime, & the most recent
+    SAMPLE_WINDOW durations for the percentiles"""
+
+    def __init__(self):
+        self.count = 0  # Times the stage ran
+        self.total = 0.0  # Seconds spent in the stage
+        self.max = 0.0  # Slowest run in seconds
+        self.samples = deque(maxlen=SAMPLE_WINDOW)  # Recent durations in seconds
+
+    def add(self, seconds):
+        """Records one run of the stage
+        :param seconds: float
+        """
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        """Returns the count, total, mean, max & percentiles in seconds
+        :rtype: dict
+        """
+        quantiles = np.quantile(np.fromiter(self.samples, dtype=float), QUANTILES) if self.samples else \
+            [np.nan] * len(QUANTILES)
+        summary = {'count': self.count, 'total': self.total, 'mean': self.total / self.count if self.count else 0.0,
+                   'max': self.max}
+        for quantile, value in zip(QUANTILES, quantiles):
+            summary['p%d' % round(quantile * 100)] = float(value)
+        return summary
+
+
+class NullStage:
+    """Context manager that does nothing, handed out while instrumentation is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    """Context manager that times one run of a stage into a registry"""
+
+    def __init__(self, registry, name):
+        self.registry = registry  # Registry the duration is recorded in
+        self.name = name  # Stage name
+        self.start = None  # perf_counter at entry
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.registry.record(self.name, time.perf_counter() - self.start)
+        if exception_type is not None:
+            self.registry.increment(self.name + '.errors')
+        return False
+
+
+class SamplingProfiler:
+    """Class that samples the stack of every thread at a fixed interval from a thread of its own. The trading cycle runs
+    in long lived executor threads, which cProfile never sees, it only profiles the thread that enabled it, &
+    threading.setprofile only reaches threads started after it is set. Times are estimated from the sample counts."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        """
+        :param interval: float, seconds between two samples
+        """
+        self.interval = interval  # Seconds between two samples
+        self.stacks = Counter()  # (thread name, outermost function, ..., innermost function) -> samples
+        self.samples = 0  # Sampling rounds taken
+        self.seconds = 0.0  # Wall time the profiler ran
+        self.stop_event = threading.Event()  # Set to end the sampling thread
+        self.thread = None  # Sampling thread while running
+
+    def start(self):
+        """Starts sampling"""
+        self.thread = threading.Thread(target=self.run, name='instrumentation-profiler', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Samples every other thread's stack until stopped"""
+        start = time.perf_counter()
+        own_ident = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:  # Innermost frame first
+                    code = frame.f_code
+                    stack.append('%s:%d(%s)' % (os.path.basename(code.co_filename), code.co_firstlineno,
+                                                code.co_name))
+                    frame = frame.f_back
+                self.stacks[(names.get(ident, str(ident)),) + tuple(reversed(stack))] += 1
+            self.samples += 1
+        self.seconds = time.perf_counter() - start
+
+    def stop(self):
+        """Stops sampling & waits for the sampling thread"""
+        self.stop_event.set()
+        self.thread.join()
+
+    def report(self, limit=30):
+        """Returns the sampled time per thread & the top functions by cumulative time, like pstats
+        :param limit: int, functions in the report
+        :rtype: str
+        """
+        period = self.seconds / self.samples if self.samples else self.interval  # Seconds one sample stands for
+        threads, cumulative, own = Counter(), Counter(), Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+            for function in set(stack[1:]):  # A recursive function counts once per sample
+                cumulative[function] += count
+            own[stack[-1]] += count
+        lines = ['%d samples over %.2fs in %d threads' % (self.samples, self.seconds, len(threads))]
+        lines += ['%10.3fs  thread %s' % (count * period, name) for name, count in threads.most_common()]
+        lines.append('%11s %11s  %s' % ('cumtime', 'tottime', 'function'))
+        lines += ['%10.3fs %10.3fs  %s' % (count * period, own[function] * period, function)
+                  for function, count in cumulative.most_common(limit)]
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Writes the samples as folded stacks, one 'thread;outer;...;inner count' line each, the input of
+        flamegraph.pl & speedscope
+        :param path: str
+        """
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.items():
+                file.write('%s %d\n' % (';'.join(stack), count))
+
+
+class Registry:
+    """Class that collects stage timings & counters for the process & exports them as JSON or Prometheus text. A
+    sampling profiler covering every thread can be switched on & off while the process runs."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled  # Stages & counters are only recorded while enabled
+        self.stages = {}  # Name -> StageStats
+        self.counters = {}  # Name -> count
+        self.lock = threading.Lock()  # Stages run on worker threads too
+        self.profiler = None  # SamplingProfiler while profiling
+
+    def stage(self, name):
+        """Returns a context manager that times a stage, a shared no-op one while disabled
+        :param name: str
+        :rtype: context manager
+        """
+        return Stage(self, name) if self.enabled else NULL_STAGE
+
+    def timed(self, name):
+        """Decorator that times every call of a function as a stage
+        :param name: str
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Stage(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        """Records one run of a stage
+        :param name: str
+        :param seconds: float
+        """
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(seconds)
+
+    def increment(self, name, value=1):
+        """Adds to a counter, while enabled
+        :param name: str
+        :param value: int
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """Forgets every stage & counter"""
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+
+    def snapshot(self):
+        """Returns every stage summary & counter
+        :rtype: dict
+        """
+        with self.lock:
+            return {'stages': {name: stats.summary() for name, stats in self.stages.items()},
+                    'counters': dict(self.counters)}
+
+    def to_json(self):
+        """Returns the snapshot as JSON text
+        :rtype: str
+        """
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='trading'):
+        """Returns the snapshot in the Prometheus text exposition format: a summary per stage & a counter per counter
+        :param prefix: str, metric name prefix
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        lines = ['# HELP %s_stage_seconds Wall time of each trading cycle stage' % prefix,
+                 '# TYPE %s_stage_seconds summary' % prefix]
+        for name, summary in sorted(snapshot['stages'].items()):
+            for quantile in QUANTILES:
+                lines.append('%s_stage_seconds{stage="%s",quantile="%s"} %r'
+                             % (prefix, name, quantile, summary['p%d' % round(quantile * 100)]))
+            lines.append('%s_stage_seconds_sum{stage="%s"} %r' % (prefix, name, summary['total']))
+            lines.append('%s_stage_seconds_count{stage="%s"} %d' % (prefix, name, summary['count']))
+        if snapshot['counters']:
+            lines.append('# HELP %s_events_total Trading cycle event counts' % prefix)
+            lines.append('# TYPE %s_events_total counter' % prefix)
+            for name, count in sorted(snapshot['counters'].items()):
+                lines.append('%s_events_total{event="%s"} %d' % (prefix, name, count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Writes the snapshot to a file, Prometheus text for a .prom file & JSON otherwise
+        :param path: str
+        """
+        with open(path, 'w') as file:
+            file.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+    def start_profiling(self):
+        """Starts sampling the stacks of all threads, the executor workers included, if not already running"""
+        if self.profiler is None:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+
+    def stop_profiling(self, path=None, limit=30):
+        """Stops the profiler & returns the time per thread & the top functions by cumulative time
+        :param path: optional str, also dump the samples there as folded stacks for flamegraph.pl or speedscope
+        :param limit: int, functions in the report
+        :rtype: str
+        """
+        if self.profiler is None:
+            return ''
+        self.profiler.stop()
+        if path is not None:
+            self.profiler.dump(path)
+        report = self.profiler.report(limit)
+        self.profiler = None
+        return report
+
+    def toggle_profiling(self, path=None):
+        """Starts the profiler when it is off, stops it & prints its report when it is on, e.g. from a signal handler
+        :param path: optional str, where stop dumps the raw stats
+        """
+        if self.profiler is None:
+            self.start_profiling()
+        else:
+            print(self.stop_profiling(path))
+
+
+default_registry = Registry(enabled=os.environ.get('TRADING_INSTRUMENTATION') == '1')  # Shared by the process
+stage = default_registry.stage
+timed = default_registry.timed
+increment = default_registry.increment
+
+
+def enable():
+    """Starts recording stages & counters"""
+    default_registry.enabled = True
+
+
+def disable():
+    """Stops recording, what was recorded is kept"""
+    default_registry.enabled = False
@@ -0,0 +1,44 @@
+# Import necessary modules
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Class that stands in for a module until one of its attributes is used, the module is only imported then. Heavy
+    libraries (pandas, yfinance, requests, robin_stocks) cost hundreds of milliseconds to import, & a cycle that only
+    checks a pending order never touches them; with
+        pd = LazyModule('pandas')
+    at the top of a module the import happens on the first pd.<name> of the code path that needs it. Once imported,
+    the module's attributes are copied onto the stand in, so later lookups cost what a normal module's do. Names used
+    at import time, in default arguments or class bodies, import the module right away & gain nothing."""
+
+    def __init__(self, name):
+        """
+        :param name: str, dotted module name, e.g. robin_stocks.robinhood
+        """
+        super().__init__(name)
+        self.__dict__['lazy_module'] = None  # The real module once imported
+
+    def __getattr__(self, attribute):
+        """Imports the module on first use & returns its attribute; only called for names not copied over yet"""
+        return getattr(self.load(), attribute)
+
+    def __dir__(self):
+        return dir(self.load())
+
+    def __repr__(self):
+        state = 'imported' if self.__dict__['lazy_module'] is not None else 'not imported'
+        return '<lazy module %r, %s>' % (self.__name__, state)
+
+    def load(self):
+        """Imports the module, once, & returns it
+        :rtype: module
+        """
+        module = self.__dict__['lazy_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update({key: value for key, value in module.__dict__.items()
+                                  if key not in ('__name__', '__spec__', '__loader__')})
+            self.__dict__['lazy_module'] = module
+        return module
+
@@ -1,92 +1,171 @@
 # Import necessary modules
-import robin_stocks.robinhood as r
-import requests
-import pandas as pd
-import yfinance as yf
-from sklearn import linear_model
 import numpy as np
+import instrumentation
+import ranking
+import regression_engine
+import scoring_models
+import universe
+from bar_store import BarStore, CachedDataSource
+from market_data_fetcher import ShardedFetcher, YahooDataSource
+from panel_builder import epoch_nanoseconds_array
+from panel_index import PanelIndex
+
+UNIVERSE = 'sp500'  # Universe ranked every cycle: sp500, nasdaq100 or a list added with universe register_custom
+SHARD_SIZE = 25  # Tickers per market data shard
+MAX_CONCURRENT_SHARDS = 8  # Shards downloading at the same time
+REPUTATION_TIER_SIZE = 100  # Every block of 100 tickers shares a reputation weight
+REPUTATION_WEIGHTS = [3, 2, 1]  # Heaviest for the top 100 S&P companies, lightest for 200 - 299
+PANEL_PRICE_DTYPE = np.float64  # dtype of the panel's price columns, np.float32 halves them for very large universes
+SCORING_MODEL = 'ridge'  # Model that ranks the stocks, one of scoring_models.SCORING_MODELS
+SCORING_MODEL_PARAMETERS = {'alpha': 0.5}  # Keyword arguments of the scoring model, e.g. {'span': 5} for ewma_momentum
+bar_store = BarStore('bar_cache')  # One minute bars kept on disk between runs
+cached_yahoo_source = CachedDataSource(YahooDataSource(), bar_store)  # Only bars missing from the store go to yahoo
+market_data_fetcher = ShardedFetcher(cached_yahoo_source, shard_size=SHARD_SIZE, max_concurrency=MAX_CONCURRENT_SHARDS,
+                                     price_dtype=PANEL_PRICE_DTYPE)
+scoring_model = scoring_models.build_scoring_model(SCORING_MODEL, **SCORING_MODEL_PARAMETERS)  # Ranks every cycle
 
 
 def query_sp_500_tickers():
     """Call function with no parameters to obtain list of stock symbols"""
-    # Mimic a search engine
-    header = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
-                            'Chrome/75.0.3770.100 Safari/537.36'}
-    url = 'https://www.slickcharts.com/sp500'  # Website that holds S&P tickers
-    content = requests.get(url, headers=header)  # Retrieve data from website
-    dfs = pd.read_html(content.text)  # Parse the data to pandas dataframe
-    tickers = dfs[0]['Symbol'].to_list()  # Convert the first column to a list
-    return tickers  # Return the list
+    return query_universe_tickers('sp500')  # Return the list
+
+
+def query_universe_tickers(universe_name=None):
+    """Returns the tickers of a universe in rank order
+    :param universe_name: optional str, a name registered with universe.default_universe_manager, UNIVERSE by default
+    :rtype: list of str
+    """
+    # The constituent list is stored on disk & kept in memory, its source is only asked again once a day
+    return universe.default_universe_manager.get_tickers(UNIVERSE if universe_name is None else universe_name)
 
 
 def query_yahoo(stock_list):
     """Queries yahoo finance that returns Date, Ticker, Adjusted Close, High, Low, Open, & Volume panel dataframe"""
-    # Get stock data by ticker every 15 minutes on a 1 minute interval, the threads increase efficiency
-    df = yf.download(stock_list, group_by='Ticker', period='15m', interval='1m', threads=4)
-    df = df.stack(level=0).rename_axis(['Date', 'Ticker']).reset_index()  # Reshape the the dataframe for panel data
+    # Get stock data by ticker for the last 15 minutes on a 1 minute interval. The local bar cache is read first, only
+    # the bars it is missing are requested from yahoo
+    df = cached_yahoo_source.fetch(stock_list)
     return df  # return the dataframe
 
 
-def calculate_percent_change_df(dataframe):
+def calculate_percent_change_df(dataframe, panel_index=None):
     """Returns dataframe with open percent change column
     :param dataframe: pandas dataframe
+    :param panel_index: PanelIndex over the dataframe rows, built here if not given
     """
+    if panel_index is None:
+        panel_index = PanelIndex.from_dataframe(dataframe)  # Group the rows by ticker once
     # Grouping by ticker, calculate the percentage change
-    dataframe['Open Percent Change'] = (dataframe.groupby('Ticker')['Open'].pct_change() * 100)
+    dataframe['Open Percent Change'] = panel_index.group_pct_change(dataframe['Open'].values) * 100
     dataframe.fillna(0, inplace=True)  # Fill na to calculate ridge model
     return dataframe  # Return dataframe
 
 
-def build_ridge_analysis_dataframe(percent_change_dataframe):
+def build_ridge_analysis_dataframe(percent_change_dataframe, panel_index=None, alpha=0.5):
     """Returns a dataframe: Ticker Average Growth, R Squared, Growth Percentage Coefficient
     :param percent_change_dataframe: pandas dataframe with percent change built into the df
+    :param panel_index: PanelIndex over the dataframe rows, built here if not given
+    :param alpha: float, Ridge regularization strength
     """
-    correlation_list = []  # A staged list for dataframe (ticker, median of Percent Change, R Squared, Coefficient)
-    retrieved_tickers = percent_change_dataframe['Ticker'].values.tolist()  # Convert ticker column to list for looping
-    # Remove duplicates with enumerate
-    retrieved_tickers = [ticker for _index, ticker in enumerate(retrieved_tickers)
-                         if ticker not in retrieved_tickers[:_index]]
-    for ticker in retrieved_tickers:
-        # Retrieve respective ticker's percent change values & timestamp
-        instance_df = percent_change_dataframe[percent_change_dataframe['Ticker'] == ticker]  # Filter by ticker
-        reputation = instance_df['Reputation Weight'].mean()  # Obtain reputation weight
-        ridge_x = instance_df['Date'].values.astype(float).reshape(-1, 1)  # Reshape x for the ridge model
-        ridge_y = instance_df['Open Percent Change'].values  # Obtain the percent changes
-        reg = linear_model.Ridge(alpha=0.5).fit(ridge_x, ridge_y)  # Fit the model
-        # Append values to the correlation list
-        correlation_list.append((ticker, reputation, np.median(ridge_y), reg.score(ridge_x, ridge_y), float(reg.coef_)))
-    # After all ticker data has been obtained convert correlation list to a dataframe
-    correlation_df = pd.DataFrame(correlation_list,
-                                  columns=['Ticker', 'Reputation Weight', 'Average Growth',
-                                           'R Squared', 'Growth Percentage Coefficient'])
+    if panel_index is None:
+        panel_index = PanelIndex.from_dataframe(percent_change_dataframe)  # Group the rows by ticker once
+    # Every ticker is fit in one grouped pass instead of a Ridge model per ticker
+    correlation_df = regression_engine.batched_ridge_analysis(
+        panel_index,  # Ticker grouping of the rows
+        # Timestamps as float nanoseconds, the Ridge x; the unit is pinned so the slope scale never depends on it
+        percent_change_dataframe['Date'].values.astype('datetime64[ns]').astype(float),
+        percent_change_dataframe['Open Percent Change'].values,  # Percent changes, the Ridge y
+        percent_change_dataframe['Reputation Weight'].values,  # Reputation weight, averaged per ticker
+        alpha=alpha)
     return correlation_df
 
-def build_complete_stock_data():
-    """From stock symbol acquisition to ridge modeling, this will sort return a complete dataframe of the top 300'
-    S&P companies"""
-    ticker_list = query_sp_500_tickers()  # Requests GET to retrieve S&P 300 tickers
-    # Obtain top 100 stock tickers. We split it up because batch GET does not reliably work
-    stock_data_1 = query_yahoo(ticker_list[:100])  # Obtain top 99 stock tickers
-    stock_data_2 = query_yahoo(ticker_list[100:200])  # Obtain 100 - 199 stock tickers
-    stock_data_3 = query_yahoo(ticker_list[200:300])  # Obtain top 200 - 299 stock tickers
-    stock_data_1['Reputation Weight'] = 3  # Set reputation weight to heaviest
-    stock_data_2['Reputation Weight'] = 2  # Set reputation weight to medium
-    stock_data_3['Reputation Weight'] = 1  # Set reputation weight to lightest
-    total_stock_df = pd.concat([stock_data_1, stock_data_2, stock_data_3])  # Stack dataframes
-    total_stock_df = calculate_percent_change_df(total_stock_df)  # Calculate the percent change
-    total_stock_df = build_ridge_analysis_dataframe(total_stock_df)  # Obtain ridge regression analysis
-    # Sort for purchase analysis
-    total_stock_df.sort_values(by=['Reputation Weight', 'R Squared', 'Average Growth', 'Growth Percentage Coefficient'], ascending=False)
+def fetch_universe_panel(columns, universe_name=None):
+    """Fetches the bars of a universe's top 300 companies & sets their reputation weights
+    :param columns: list of the value columns to keep, e.g. a scoring model's required columns
+    :param universe_name: optional str, UNIVERSE by default
+    :rtype: tuple, (panel dataframe, PanelIndex)
+    """
+    with instrumentation.stage('build.universe'):
+        ticker_list = query_universe_tickers(universe_name)  # Tickers in rank order, S&P 500 by default
+        ticker_list = ticker_list[:REPUTATION_TIER_SIZE * len(REPUTATION_WEIGHTS)]  # Keep the top 300 tickers
+    with instrumentation.stage('build.fetch'):
+        # Shards download concurrently, shards that raise are retried in halves; only the requested columns are kept
+        total_stock_df = market_data_fetcher.fetch(ticker_list, columns=columns).panel
+    with instrumentation.stage('build.index'):
+        panel_index = PanelIndex.from_dataframe(total_stock_df)  # Index the tickers once for the whole cycle
+        # Set the reputation weight by the tier of 100 the ticker ranks in, heaviest first
+        ticker_weights = reputation_weights(panel_index.tickers, ticker_list)
+        total_stock_df['Reputation Weight'] = ticker_weights[panel_index.codes]
+    return total_stock_df, panel_index
+
+
+@instrumentation.timed('build')
+def build_complete_stock_data(model=None, universe_name=None):
+    """From stock symbol acquisition to scoring, this will return a complete dataframe of the top 300 companies of the
+    universe, the S&P 500 by default
+    :param model: optional scoring_models.ScoringModel, the configured scoring_model by default
+    :param universe_name: optional str, UNIVERSE by default
+    """
+    model = scoring_model if model is None else model
+    total_stock_df, panel_index = fetch_universe_panel(model.required_columns, universe_name)
+    with instrumentation.stage('build.score'):
+        total_stock_df = model.score(total_stock_df, panel_index)  # Score every ticker in one batched pass
+    # No full sort for purchase analysis, recommend_top_stock picks the best rows by partial selection
     return total_stock_df  # Return data frame
 
 
+@instrumentation.timed('build')
+def build_streaming_stock_data(engine, universe_name=None):
+    """Same analysis as build_complete_stock_data with the Ridge slope model, kept in a streaming engine: only the bars
+    it has not seen yet are added, each in O(log n), instead of refitting the whole window. Use it with
+    functools.partial as a stock data provider.
+    :param engine: streaming_stats.StreamingRegressionEngine
+    :param universe_name: optional str, UNIVERSE by default
+    :rtype: pandas dataframe
+    """
+    total_stock_df, _panel_index = fetch_universe_panel(['Open'], universe_name)
+    with instrumentation.stage('build.stream'):
+        engine.ingest_panel(total_stock_df)  # Bars at or before a ticker's newest one are skipped
+        if not len(total_stock_df):
+            return engine.snapshot()
+        # The window the engine analyzes starts where the fetched one does, so it holds the same bars; tickers whose
+        # bars stopped coming expire here
+        window_start = int(epoch_nanoseconds_array(total_stock_df['Date']).min())
+        return engine.snapshot(window_start + engine.window)
+
+
+def reputation_weights(tickers, ranked_ticker_list, tier_size=REPUTATION_TIER_SIZE, weights=REPUTATION_WEIGHTS):
+    """Returns the reputation weight of every ticker: the top tier of the ranked list gets the first weight, the next
+    tier the second weight & so on
+    :param tickers: array like of str
+    :param ranked_ticker_list: list of str, the universe in rank order
+    :param tier_size: int
+    :param weights: list of floats, one per tier
+    :rtype: numpy array
+    """
+    ranks = {ticker: rank for rank, ticker in enumerate(ranked_ticker_list)}  # Position of every ticker
+    return np.array([weights[ranks[ticker] // tier_size] for ticker in tickers], dtype=float)
+
+
 def recommend_top_stock(complete_stock_performance_dataframe):
     """Function to recommend the top performance stock: the top reputation with this highest fitting model with the best
     growth. We will need the build_complete_stock_data function to input our parameter
     :param complete_stock_performance_dataframe: dataframe
     """
-    # Use  sorted complete stock performance dataframe, return top ticker from sorted, get the values, index 0 for value
-    return complete_stock_performance_dataframe['Ticker'].head(1).values[0]
+    # Select the best row by the scoring model's key, for the Ridge model reputation, R squared, average growth & growth
+    # coefficient, without sorting every row
+    return recommend_top_stocks(complete_stock_performance_dataframe, 1)[0]
+
+
+def recommend_top_stocks(complete_stock_performance_dataframe, k, filters=None):
+    """Function to recommend the k best stocks, best first, by the same composite key as recommend_top_stock
+    :param complete_stock_performance_dataframe: dataframe
+    :param k: int
+    :param filters: optional dict column -> (minimum, maximum), e.g. {'R Squared': (0.2, None)}
+    :rtype: list of str
+    """
+    # Ranked by the key of the scoring model that built the dataframe
+    return ranking.top_k(complete_stock_performance_dataframe, k, scoring_models.ranking_keys(
+        complete_stock_performance_dataframe), filters=filters)['Ticker'].to_list()
 
 # login = r.login(settings.username, settings.password)
 # profile_dictionary = r.build_user_profile()
@@ -0,0 +1,214 @@
+# Import necessary modules
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from lazy_import import LazyModule
+from panel_builder import VALUE_COLUMNS, PanelBuilder, concat_panels
+
+yf = LazyModule('yfinance')  # Imported by the first yahoo download
+
+
+# Timing & outcome of one shard: which tickers it asked for, how many attempts it took, & what never arrived
+ShardStats = namedtuple('ShardStats', ['shard_number', 'tickers', 'attempts', 'seconds', 'rows', 'failed_tickers'])
+
+
+class YahooDataSource:
+    """Data source that retrieves one minute bars from yahoo finance. Yahoo has no multi symbol chart request: even
+    yf.download loops over Ticker.history, one round trip per symbol, & keeps its results in a module global, so two
+    downloads running at once overwrite each other. This source asks Ticker.history for each symbol itself, which is
+    safe to run from several shards at the same time; the shards running concurrently are what overlaps the round
+    trips."""
+
+    def __init__(self, period='15m', interval='1m'):
+        self.period = period  # How far back to look
+        self.interval = interval  # Bar size
+
+    def fetch(self, tickers, start=None):
+        """Returns a long panel dataframe: Date, Ticker, Adj Close, Close, High, Low, Open, Volume. Tickers that yahoo
+        does not return are simply absent from the panel.
+        :param tickers: list of str
+        :param start: optional datetime, only bars at or after it are requested
+        :rtype: pandas dataframe
+        """
+        if start is not None:
+            # Old yfinance reads a datetime start as local wall time, so hand it a naive local datetime
+            start = datetime.fromtimestamp(pd.Timestamp(start).timestamp())
+        histories = {}  # Ticker -> history dataframe
+        for ticker in tickers:
+            if start is None:
+                histories[ticker] = yf.Ticker(ticker).history(period=self.period, interval=self.interval,
+                                                              auto_adjust=False, actions=False)
+            else:
+                histories[ticker] = yf.Ticker(ticker).history(start=start, interval=self.interval,
+                                                              auto_adjust=False, actions=False)
+        return histories_to_panel(histories)
+
+
+class StubDataSource:
+    """Offline data source for tests & benchmarks. Every ticker gets a reproducible random walk of one minute bars; a
+    latency, a chance of the whole request failing & a chance of individual tickers going missing can be configured.
+    The latency is charged per ticker, like the one round trip per symbol of YahooDataSource, so a request for a
+    bigger shard takes proportionally longer."""
+
+    def __init__(self, bars=15, latency=0.0, failure_rate=0.0, missing_rate=0.0, seed=0,
+                 end_time='2021-08-02 19:59'):
+        self.bars = bars  # Bars per ticker
+        self.latency = latency  # Seconds every ticker of a request blocks for, like a yahoo round trip
+        self.failure_rate = failure_rate  # Chance a request raises
+        self.missing_rate = missing_rate  # Chance each ticker is left out of a response
+        self.random_state = np.random.RandomState(seed)  # Drives the failures, not the prices
+        self.end_time = pd.Timestamp(end_time)  # Timestamp of the last bar, UTC
+        self.requests = 0  # Number of fetch calls, handy to count round trips
+        self.lock = threading.Lock()  # Guards the counter & the random state
+
+    def fetch(self, tickers, start=None):
+        """Returns a long panel dataframe shaped like YahooDataSource.fetch
+        :param tickers: list of str
+        :param start: optional datetime, only bars at or after it are returned
+        :rtype: pandas dataframe
+        """
+        with self.lock:  # Shards call in from several threads
+            self.requests += 1
+            failed = self.random_state.random_sample() < self.failure_rate
+            missing = self.random_state.random_sample(len(tickers)) < self.missing_rate
+        if self.latency:
+            time.sleep(self.latency * len(tickers))  # Simulate one round trip per ticker
+        if failed:
+            raise ConnectionError('Stub data source failed the request')
+        dates = pd.date_range(end=self.end_time, periods=self.bars, freq='1min', tz='UTC')
+        # A ticker that goes missing is left out, like a partial yahoo failure
+        panel = concat_panels([stub_bars(ticker, dates) for ticker, dropped in zip(tickers, missing) if not dropped])
+        if start is not None:
+            start = pd.Timestamp(start)
+            start = start.tz_localize('UTC') if start.tzinfo is None else start
+            panel = panel[panel['Date'].values >= start.value].reset_index(drop=True)  # Only the missing bars
+        return panel
+
+
+class FetchResult:
+    """Merged panel of a sharded fetch with the per shard timing stats"""
+
+    def __init__(self, panel, shard_stats, seconds):
+        self.panel = panel  # Long panel dataframe of every shard
+        self.shard_stats = shard_stats  # List of ShardStats in shard order
+        self.seconds = seconds  # Wall time of the whole fetch
+
+    def get_failed_tickers(self):
+        """Returns the tickers that never arrived after every retry
+        :rtype: list
+        """
+        return [ticker for stats in self.shard_stats for ticker in stats.failed_tickers]
+
+    def get_stats_dataframe(self):
+        """Returns the shard stats as a dataframe, one row per shard
+        :rtype: pandas dataframe
+        """
+        return pd.DataFrame([{'Shard': stats.shard_number, 'Tickers': len(stats.tickers),
+                              'Attempts': stats.attempts, 'Seconds': stats.seconds, 'Rows': stats.rows,
+                              'Failed Tickers': len(stats.failed_tickers)} for stats in self.shard_stats])
+
+
+class ShardedFetcher:
+    """Class that splits a ticker list into shards & fetches them concurrently from a data source. A shard that raises
+    is retried in halves with exponential backoff, so one symbol that breaks the request can not sink the rest of its
+    shard. Tickers missing from a response that came back are reported as failed right away: yahoo answers a symbol it
+    does not know, e.g. a delisted one, with nothing, & asking again every cycle would only add the backoff."""
+
+    def __init__(self, data_source=None, shard_size=100, max_concurrency=3, max_attempts=3, backoff_seconds=1.0,
+                 price_dtype=np.float64):
+        self.data_source = data_source if data_source is not None else YahooDataSource()
+        self.shard_size = shard_size  # Tickers per shard
+        self.max_concurrency = max_concurrency  # Shards in flight at once
+        self.max_attempts = max_attempts  # Attempts per shard before its leftovers are reported as failed
+        self.backoff_seconds = backoff_seconds  # First retry delay, doubled on every attempt
+        self.price_dtype = np.dtype(price_dtype)  # dtype of the merged panel's price & volume columns
+
+    def fetch(self, tickers, start=None, columns=VALUE_COLUMNS):
+        """Fetches every ticker & returns the merged panel with per shard stats
+        :param tickers: list of str
+        :param start: optional datetime, passed to the data source
+        :param columns: list of the value columns the merged panel keeps, e.g. a scoring model's required columns
+        :rtype: FetchResult
+        """
+        fetch_start = time.perf_counter()
+        shards = [list(tickers[position:position + self.shard_size])
+                  for position in range(0, len(tickers), self.shard_size)]
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as executor:
+            outcomes = list(executor.map(lambda numbered: self.fetch_shard(numbered[0], numbered[1], start),
+                                         enumerate(shards)))
+        panel = concat_panels([frame for frames, _stats in outcomes for frame in frames], self.price_dtype, columns)
+        return FetchResult(panel, [stats for _frames, stats in outcomes], time.perf_counter() - fetch_start)
+
+    def fetch_shard(self, shard_number, shard, start=None):
+        """Fetches one shard, retrying the requests that raised in halves until they answer or the attempts run out
+        :param shard_number: int
+        :param shard: list of str
+        :param start: optional datetime
+        :rtype: tuple (list of dataframes, ShardStats)
+        """
+        shard_start = time.perf_counter()
+        frames = []  # Every partial response that came back
+        missing = []  # Tickers absent from a response, not retried
+        pending = [shard]  # Chunks still to request
+        attempts = 0
+        while pending and attempts < self.max_attempts:
+            if attempts:
+                time.sleep(self.backoff_seconds * 2 ** (attempts - 1))  # Back off before every retry
+            attempts += 1
+            retry = []  # Chunks for the next attempt
+            for chunk in pending:
+                try:
+                    frame = self.data_source.fetch(chunk, start=start)
+                except Exception:  # Network errors, rate limits & symbols that break the request, retry in two halves
+                    retry.extend(split_in_half(chunk))
+                    continue
+                frames.append(frame)
+                returned = set(frame['Ticker'].unique())
+                missing.extend(ticker for ticker in chunk if ticker not in returned)
+            pending = retry
+        failed_tickers = missing + [ticker for chunk in pending for ticker in chunk]
+        stats = ShardStats(shard_number, shard, attempts, time.perf_counter() - shard_start,
+                           sum(len(frame) for frame in frames), failed_tickers)
+        return frames, stats
+
+
+def split_in_half(tickers):
+    """Returns a list of one or two non empty halves of a ticker list
+    :param tickers: list of str
+    :rtype: list
+    """
+    middle = (len(tickers) + 1) // 2
+    return [half for half in (tickers[:middle], tickers[middle:]) if half]
+
+
+def histories_to_panel(histories):
+    """Reshapes yahoo Ticker.history dataframes into one long panel, each bar written once into its final place
+    :param histories: dict ticker -> dataframe indexed by time with Open, High, Low, Close, Adj Close & Volume
+    :rtype: pandas dataframe
+    """
+    builder = PanelBuilder(sum(len(data) for data in histories.values()))
+    for ticker, data in histories.items():
+        if data.empty:  # Yahoo prints the error & hands back nothing for this ticker
+            continue
+        builder.append_history(ticker, data)
+    return builder.build()
+
+
+def stub_bars(ticker, dates):
+    """Returns a reproducible random walk of bars for a ticker
+    :param ticker: str
+    :param dates: pandas DatetimeIndex
+    :rtype: pandas dataframe
+    """
+    # Seed by ticker so the same ticker always walks the same way, whatever shard it lands in
+    random_state = np.random.RandomState(zlib.crc32(ticker.encode()))
+    close = 100 + np.cumsum(random_state.normal(0, 0.1, len(dates)))
+    open_price = close + random_state.normal(0, 0.05, len(dates))
+    return pd.DataFrame({'Date': dates, 'Ticker': ticker, 'Adj Close': close, 'Close': close,
+                         'High': np.maximum(open_price, close) + 0.02, 'Low': np.minimum(open_price, close) - 0.02,
+                         'Open': open_price, 'Volume': random_state.randint(1000, 100000, len(dates)).astype(float)})
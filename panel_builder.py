@@ -0,0 +1,152 @@
+# Import necessary modules
+import numpy as np
+import pandas as pd
+
+VALUE_COLUMNS = ['Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']  # Columns after Date & Ticker
+
+
+class PanelBuilder:
+    """Class that builds a long panel dataframe (Date, Ticker, Adj Close, Close, High, Low, Open, Volume) by writing
+    every ticker's bars straight into pre-sized column arrays. Dates are int64 UTC epoch nanoseconds, tickers are
+    categorical codes & prices can be float32, so a panel costs 8 + 1-4 + 6 x 4-8 bytes a row instead of the object
+    strings, timestamps & float64 columns that stack & concat produce; each bar is copied once, into its final
+    place. Arrays grow by doubling when a capacity was not given or turns out too small, & value columns nobody reads
+    can be left out altogether."""
+
+    def __init__(self, capacity=0, price_dtype=np.float64, columns=VALUE_COLUMNS):
+        """
+        :param capacity: int, rows to reserve up front
+        :param price_dtype: numpy dtype of the value columns, np.float32 halves their memory
+        :param columns: list of the value columns to keep, the bars' other columns are dropped
+        """
+        self.price_dtype = np.dtype(price_dtype)  # dtype of the value columns
+        self.size = 0  # Rows written
+        self.dates = np.empty(capacity, dtype=np.int64)  # UTC epoch nanoseconds
+        self.codes = np.empty(capacity, dtype=np.int32)  # Ticker code per row
+        self.values = {column: np.empty(capacity, dtype=self.price_dtype) for column in columns}
+        self.tickers = []  # Ticker of every code, in order of first appearance
+        self.ticker_codes = {}  # Ticker -> code
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, rows):
+        """Makes room for rows more rows
+        :param rows: int
+        """
+        needed = self.size + rows
+        if needed <= len(self.dates):
+            return
+        capacity = max(needed, 2 * len(self.dates))
+        self.dates = self.grow(self.dates, capacity)
+        self.codes = self.grow(self.codes, capacity)
+        self.values = {column: self.grow(values, capacity) for column, values in self.values.items()}
+
+    def grow(self, array, capacity):
+        """Returns array moved into a bigger array, the written rows kept
+        :param array: numpy array
+        :param capacity: int
+        :rtype: numpy array
+        """
+        grown = np.empty(capacity, dtype=array.dtype)
+        grown[:self.size] = array[:self.size]
+        return grown
+
+    def ticker_code(self, ticker):
+        """Returns a ticker's code, adding the ticker on first sight
+        :param ticker: str
+        :rtype: int
+        """
+        code = self.ticker_codes.get(ticker)
+        if code is None:
+            code = self.ticker_codes[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+        return code
+
+    def append(self, ticker, dates, columns):
+        """Writes one ticker's bars
+        :param ticker: str
+        :param dates: numpy array of int64 UTC epoch nanoseconds
+        :param columns: dict column -> array like of values, one per date; missing columns are NaN
+        """
+        rows = len(dates)
+        self.reserve(rows)
+        end = self.size + rows
+        self.dates[self.size:end] = dates
+        self.codes[self.size:end] = self.ticker_code(ticker)
+        for column, values in self.values.items():
+            values[self.size:end] = columns[column] if column in columns else np.nan
+        self.size = end
+
+    def append_bars(self, ticker, bars, field_columns):
+        """Writes one ticker's bar record array, e.g. a BarStore memory map
+        :param ticker: str
+        :param bars: numpy structured array with a timestamp field
+        :param field_columns: dict record field -> panel column
+        """
+        self.append(ticker, bars['timestamp'], {column: bars[field] for field, column in field_columns.items()})
+
+    def append_history(self, ticker, history):
+        """Writes a yahoo Ticker.history dataframe, indexed by time
+        :param ticker: str
+        :param history: pandas dataframe
+        """
+        names = list(history.columns)
+        values = history.to_numpy(dtype=self.price_dtype)  # One block copy, not a Series per column
+        self.append(ticker, epoch_nanoseconds_array(history.index),
+                    {column: values[:, names.index(column)] for column in self.values if column in names})
+
+    def append_panel(self, panel):
+        """Writes every row of another long panel, ticker codes are remapped to this builder's
+        :param panel: pandas dataframe with Date, Ticker & the value columns
+        """
+        rows = len(panel)
+        if not rows:
+            return
+        self.reserve(rows)
+        end = self.size + rows
+        codes, tickers = pd.factorize(panel['Ticker'], sort=False)
+        remap = np.array([self.ticker_code(ticker) for ticker in tickers], dtype=np.int32)
+        self.dates[self.size:end] = epoch_nanoseconds_array(panel['Date'])
+        self.codes[self.size:end] = remap[codes]
+        for column, values in self.values.items():
+            values[self.size:end] = panel[column].values if column in panel else np.nan
+        self.size = end
+
+    def build(self):
+        """Returns the panel dataframe over the written rows
+        :rtype: pandas dataframe
+        """
+        data = {'Date': self.dates[:self.size],
+                'Ticker': pd.Categorical.from_codes(self.codes[:self.size], categories=pd.Index(self.tickers,
+                                                                                                   dtype=object))}
+        for column, values in self.values.items():
+            data[column] = values[:self.size]
+        return pd.DataFrame(data, copy=False)
+
+
+def epoch_nanoseconds_array(dates):
+    """Returns dates as int64 UTC epoch nanoseconds; naive dates are taken as UTC, integers are passed through
+    :param dates: array like of datetimes or int64 nanoseconds, Series or DatetimeIndex
+    :rtype: numpy array
+    """
+    if isinstance(dates, (pd.Series, pd.Index)) and dates.dtype.kind in 'iu':
+        return dates.values.astype(np.int64, copy=False)
+    if not isinstance(dates, pd.DatetimeIndex):
+        dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_convert(None)  # UTC wall time
+    return dates.values.astype('datetime64[ns]', copy=False).view(np.int64)
+
+
+def concat_panels(frames, price_dtype=np.float64, columns=VALUE_COLUMNS):
+    """Stacks long panels into one, copying every row once into pre-sized arrays
+    :param frames: list of pandas dataframes
+    :param price_dtype: numpy dtype of the value columns
+    :param columns: list of the value columns to keep
+    :rtype: pandas dataframe
+    """
+    builder = PanelBuilder(sum(len(frame) for frame in frames), price_dtype, columns)
+    for frame in frames:
+        builder.append_panel(frame)
+    return builder.build()
@@ -0,0 +1,142 @@
+# Import necessary modules
+import numpy as np
+import pandas as pd
+
+
+class PanelIndex:
+    """Class that indexes a long format panel dataframe by ticker. It is built once per cycle in linear time; every
+    ticker then maps to a contiguous slice of the rows sorted by ticker, so grouped work never rescans the frame.
+    Tickers keep their order of first appearance & rows keep their original order inside each ticker."""
+
+    def __init__(self, tickers):
+        """
+        :param tickers: array like or Categorical of ticker symbols, one per panel row
+        """
+        if isinstance(tickers, pd.Categorical):  # Factorize the small integer codes, not the strings
+            self.codes, used = pd.factorize(tickers.codes, sort=False)
+            self.tickers = tickers.categories[used]
+        else:
+            # Group code per row & the unique tickers in order of first appearance, one hash pass
+            self.codes, self.tickers = pd.factorize(np.asarray(tickers), sort=False)
+        self.codes = self.codes.astype(np.int64)
+        self.order = np.argsort(self.codes, kind='stable')  # Row positions grouped by ticker, stable keeps time order
+        self.counts = np.bincount(self.codes, minlength=len(self.tickers))  # Rows per ticker
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)))  # Slice boundaries in the sorted order
+        self.starts = self.offsets[:-1]  # First sorted position of each ticker
+        self.positions = {ticker: code for code, ticker in enumerate(self.tickers)}  # Ticker to group code
+
+    @classmethod
+    def from_dataframe(cls, dataframe, ticker_column='Ticker'):
+        """Builds the index from a panel dataframe
+        :param dataframe: pandas dataframe
+        :param ticker_column: str
+        :rtype: PanelIndex
+        """
+        return cls(dataframe[ticker_column].values)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __iter__(self):
+        """Yields (ticker, slice) pairs, the slice addresses the sorted order"""
+        for code, ticker in enumerate(self.tickers):
+            yield ticker, self.slice_for_code(code)
+
+    def __contains__(self, ticker):
+        return ticker in self.positions
+
+    def slice_for_code(self, code):
+        """Returns the slice of the sorted order that holds a group code's rows
+        :param code: int
+        :rtype: slice
+        """
+        return slice(self.offsets[code], self.offsets[code + 1])
+
+    def slice(self, ticker):
+        """Returns the slice of the sorted order that holds a ticker's rows
+        :param ticker: str
+        :rtype: slice
+        """
+        return self.slice_for_code(self.positions[ticker])
+
+    def rows(self, ticker):
+        """Returns the original row positions of a ticker
+        :param ticker: str
+        :rtype: numpy array
+        """
+        return self.order[self.slice(ticker)]
+
+    def take(self, values):
+        """Returns a column's values rearranged into the sorted order, so slices address each ticker
+        :param values: array like, one value per panel row
+        :rtype: numpy array
+        """
+        return np.asarray(values)[self.order]
+
+    def scatter(self, sorted_values):
+        """Inverse of take: returns values in the sorted order put back into the original row order
+        :param sorted_values: numpy array
+        :rtype: numpy array
+        """
+        values = np.empty_like(sorted_values)
+        values[self.order] = sorted_values
+        return values
+
+    def sorted_codes(self):
+        """Returns the group code of every position in the sorted order
+        :rtype: numpy array
+        """
+        return np.repeat(np.arange(len(self.tickers)), self.counts)
+
+    def group_sum(self, values):
+        """Returns the per ticker sum of a column given in original row order
+        :param values: array like of floats
+        :rtype: numpy array
+        """
+        return np.bincount(self.codes, weights=np.asarray(values, dtype=float), minlength=len(self.tickers))
+
+    def group_mean(self, values):
+        """Returns the per ticker mean of a column given in original row order
+        :param values: array like of floats
+        :rtype: numpy array
+        """
+        return self.group_sum(values) / self.counts
+
+    def group_forward_fill(self, sorted_values):
+        """Returns sorted order values with NaNs filled from the previous row of the same ticker
+        :param sorted_values: numpy array of floats in the sorted order
+        :rtype: numpy array
+        """
+        positions = np.arange(len(sorted_values))
+        # Index of the last valid value at or before each position
+        last_valid = np.maximum.accumulate(np.where(np.isnan(sorted_values), 0, positions))
+        filled = sorted_values[last_valid]
+        # A ticker can not borrow a value from the ticker before it
+        borrowed = last_valid < np.repeat(self.starts, self.counts)
+        filled[borrowed] = np.nan
+        return filled
+
+    def group_pct_change(self, values):
+        """Returns the per ticker percent change (as a fraction) of a column, in original row order. Matches
+        groupby(...).pct_change(): values are forward filled within the ticker & each ticker's first row is NaN.
+        :param values: array like of floats, one per panel row
+        :rtype: numpy array
+        """
+        filled = self.group_forward_fill(self.take(values).astype(float))
+        change = np.full(len(filled), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change[1:] = filled[1:] / filled[:-1] - 1
+        change[self.starts[self.counts > 0]] = np.nan  # First row of every ticker has no previous value
+        return self.scatter(change)
+
+    def group_median(self, values):
+        """Returns the per ticker median of a column given in original row order, one sort for all tickers
+        :param values: array like of floats
+        :rtype: numpy array
+        """
+        sorted_values = self.take(values).astype(float)
+        # Sort by ticker, then by value inside the ticker
+        sorted_values = sorted_values[np.lexsort((sorted_values, self.sorted_codes()))]
+        lower = self.starts + (self.counts - 1) // 2  # Lower middle element
+        upper = self.starts + self.counts // 2  # Upper middle element, equal to lower for odd counts
+        return (sorted_values[lower] + sorted_values[upper]) / 2
@@ -0,0 +1,188 @@
+"""Sweeps the backtest over a grid of exit thresholds, reputation weights & Ridge alphas on a process pool.
+Run: python parameter_sweep.py --bar-cache bar_cache --workers 8"""
+# Import necessary modules
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from backtester import Backtester, BarReplay
+from bar_store import BarStore
+from scoring_models import RidgeSlopeModel
+
+DEFAULT_TAKE_PROFITS = [0.2, 0.3, 0.5]  # Percent gains that trigger a sell
+DEFAULT_STOP_LOSSES = [-0.1, -0.2, -0.3]  # Percent losses that trigger a sell
+# Weights of the top, middle & bottom ticker tiers. Reputation is the first ranking key, so only the order of the
+# weights matters: favor the top tier, favor the top tier over the other two alike, or no preference
+DEFAULT_REPUTATION_WEIGHTS = [(3, 2, 1), (2, 1, 1), (1, 1, 1)]
+SWEEP_TIME_UNIT = 'min'  # Unit of the sweep's Ridge x, a full 15 bar window then has a centered sum of squares of 280
+# Ridge regularization strengths on the minute scale: none, slopes shrunk by 10% & by about half on a full window. On
+# the live model's nanosecond scale the sum of squares is about 1e24 & no alpha of this size changes anything.
+DEFAULT_ALPHAS = [0.0, 30.0, 300.0]
+REPLAY_ARRAYS = ['timestamps', 'opens', 'closes']  # Arrays of a BarReplay written for the workers
+
+worker_replay = None  # The bars a worker process replays, memory mapped once by init_worker
+
+
+def parameter_grid(take_profits=DEFAULT_TAKE_PROFITS, stop_losses=DEFAULT_STOP_LOSSES,
+                   reputation_weights=DEFAULT_REPUTATION_WEIGHTS, alphas=DEFAULT_ALPHAS):
+    """Returns every combination of the parameters. Reputation weight tuples that order the tiers the same way rank
+    the stocks the same way, so only the first of them is kept, & repeated values are dropped.
+    :param take_profits: list of floats, percent
+    :param stop_losses: list of floats, percent
+    :param reputation_weights: list of tuples of floats, one weight per tier
+    :param alphas: list of floats, on the SWEEP_TIME_UNIT scale
+    :rtype: list of dicts
+    """
+    distinct_weights = {}  # Tier order -> first weights with that order
+    for weights in reputation_weights:
+        distinct_weights.setdefault(tier_order(weights), tuple(weights))
+    return [{'take_profit': take_profit, 'stop_loss': stop_loss, 'reputation_weights': weights, 'alpha': alpha}
+            for take_profit, stop_loss, weights, alpha in itertools.product(
+                unique(take_profits), unique(stop_losses), list(distinct_weights.values()), unique(alphas))]
+
+
+def tier_order(weights):
+    """Returns the dense rank of every tier weight, e.g. (5, 2, 1) -> (2, 1, 0). Reputation is compared before any
+    other ranking key, so weights with the same dense ranks pick the same stocks.
+    :param weights: tuple of floats
+    :rtype: tuple of ints
+    """
+    levels = sorted(set(weights))
+    return tuple(levels.index(weight) for weight in weights)
+
+
+def unique(values):
+    """Returns the values without repeats, in their first order
+    :param values: list
+    :rtype: list
+    """
+    return list(dict.fromkeys(values))
+
+
+def write_replay(replay, directory):
+    """Writes a replay's arrays as .npy files the workers can memory map, the closes already forward filled
+    :param replay: BarReplay
+    :param directory: str
+    """
+    for name in REPLAY_ARRAYS:
+        np.save(os.path.join(directory, name + '.npy'), getattr(replay, name))
+
+
+def read_replay(directory, tickers):
+    """Returns a replay whose arrays are read only memory maps of the files written by write_replay. Every process
+    that maps them shares the same pages, nothing is copied or pickled per worker.
+    :param directory: str
+    :param tickers: list of str
+    :rtype: BarReplay
+    """
+    arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in REPLAY_ARRAYS}
+    return BarReplay(arrays['timestamps'], tickers, arrays['opens'], arrays['closes'], forward_fill=False)
+
+
+def init_worker(directory, tickers):
+    """Process pool initializer, maps the shared bars once per worker
+    :param directory: str
+    :param tickers: list of str
+    """
+    global worker_replay
+    worker_replay = read_replay(directory, tickers)
+
+
+def run_parameters(parameters, starting_cash=20.0):
+    """Backtests one parameter combination on the worker's bars
+    :param parameters: dict from parameter_grid
+    :param starting_cash: float
+    :rtype: dict, the parameters & the backtest summary
+    """
+    result = Backtester(worker_replay, starting_cash=starting_cash, take_profit=parameters['take_profit'],
+                        stop_loss=parameters['stop_loss'], reputation_weights=list(parameters['reputation_weights']),
+                        scoring_model=RidgeSlopeModel(parameters['alpha'], time_unit=SWEEP_TIME_UNIT)).run()
+    return dict(parameters, **result.summary())
+
+
+class ParameterSweep:
+    """Class that runs a backtest for every parameter combination on a process pool. The bars are written once as
+    .npy files & memory mapped by every worker, so a worker's start up costs the same whatever the size of the bars,
+    and the combinations are independent, so the sweep can spread over every core; benchmarks/bench_sweep.py measures
+    the speedup per worker count."""
+
+    def __init__(self, replay, workers=None, starting_cash=20.0):
+        self.replay = replay  # Recorded bars
+        self.workers = workers or os.cpu_count()  # Worker processes
+        self.starting_cash = starting_cash  # Cash every backtest starts with
+        self.seconds = None  # Wall time of the last run
+
+    def run(self, grid):
+        """Backtests every combination & returns them ranked by profit
+        :param grid: list of dicts from parameter_grid
+        :rtype: pandas dataframe
+        """
+        run_start = time.perf_counter()
+        directory = tempfile.mkdtemp(prefix='sweep_')  # Shared bars of the run
+        try:
+            write_replay(self.replay, directory)
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                     initargs=(directory, self.replay.tickers)) as executor:
+                # Hand out a few combinations per task so short backtests do not drown in scheduling
+                chunk_size = max(1, len(grid) // (self.workers * 4))
+                results = list(executor.map(run_parameters, grid, [self.starting_cash] * len(grid),
+                                            chunksize=chunk_size))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.seconds = time.perf_counter() - run_start
+        return rank_results(results)
+
+
+def rank_results(results):
+    """Returns the sweep results best first: highest profit, then fewest fills for the same profit
+    :param results: list of dicts from run_parameters
+    :rtype: pandas dataframe
+    """
+    results_df = pd.DataFrame(results)
+    if results_df.empty:
+        return results_df
+    results_df = results_df.sort_values(['profit', 'buy_fills'], ascending=[False, True], kind='stable')
+    results_df.insert(0, 'Rank', np.arange(1, len(results_df) + 1))
+    return results_df.reset_index(drop=True)
+
+
+def parse_floats(text):
+    """Returns the floats of a comma separated string
+    :param text: str
+    :rtype: list of floats
+    """
+    return [float(value) for value in text.split(',')]
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Backtest a grid of strategy parameters on a process pool.')
+    parser.add_argument('--bar-cache', default='bar_cache', help='directory of the bar store')
+    parser.add_argument('--start', default=None, help='first timestamp to replay')
+    parser.add_argument('--end', default=None, help='last timestamp to replay')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to the core count')
+    parser.add_argument('--cash', type=float, default=20.0, help='starting cash')
+    parser.add_argument('--take-profits', type=parse_floats, default=DEFAULT_TAKE_PROFITS)
+    parser.add_argument('--stop-losses', type=parse_floats, default=DEFAULT_STOP_LOSSES)
+    parser.add_argument('--reputation-weights', type=parse_floats, nargs='+', default=DEFAULT_REPUTATION_WEIGHTS,
+                        help='one comma separated tier list per option, e.g. 3,2,1 1,1,1')
+    parser.add_argument('--alphas', type=parse_floats, default=DEFAULT_ALPHAS,
+                        help='Ridge alphas with the bar times in minutes')
+    parser.add_argument('--top', type=int, default=10, help='number of ranked results to print')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    bar_replay = BarReplay.from_bar_store(BarStore(arguments.bar_cache, retention=pd.Timedelta(days=365 * 100)),
+                                          start=arguments.start, end=arguments.end)
+    sweep = ParameterSweep(bar_replay, workers=arguments.workers, starting_cash=arguments.cash)
+    ranked = sweep.run(parameter_grid(arguments.take_profits, arguments.stop_losses, arguments.reputation_weights,
+                                      arguments.alphas))
+    print(ranked.head(arguments.top).to_string(index=False))
+    print('%d backtests on %d workers in %.2fs' % (len(ranked), sweep.workers, sweep.seconds))
@@ -0,0 +1,189 @@
+"""Runs many trading accounts in one process on one shared market data fetch per tick.
+Run: python portfolio_manager.py --account Derek --account Alice:3 --tick 60"""
+# Import necessary modules
+import argparse
+import time
+import traceback
+import main
+import profile_class
+import trading_cycle
+from quote_service import default_quote_service
+
+
+class Account:
+    """Class for one strategy account. An account holds one Profile per position it may hold at once, its sleeves;
+    each sleeve is a normal single position Profile with its own share of the cash, pickle & ledger, so the buy/sell
+    state machine is unchanged. The sleeves of an account never hold the same stock."""
+
+    def __init__(self, name, profiles, take_profit=trading_cycle.TAKE_PROFIT_PERCENTAGE,
+                 stop_loss=trading_cycle.STOP_LOSS_PERCENTAGE):
+        self.name = name  # Name of the account
+        self.profiles = list(profiles)  # One Profile per position
+        self.take_profit = take_profit  # Percent gain that triggers a sell
+        self.stop_loss = stop_loss  # Percent loss that triggers a sell
+
+    @staticmethod
+    def sleeve_names(name, positions):
+        """Returns the profile names of an account's sleeves, the account name alone for a single position
+        :param name: str
+        :param positions: int
+        :rtype: list of str
+        """
+        return [name] if positions == 1 else ['%s_%d' % (name, number) for number in range(1, positions + 1)]
+
+    @classmethod
+    def create(cls, name, cash, positions=1, **thresholds):
+        """Creates the profiles of a new account, the cash split evenly between its sleeves
+        :param name: str
+        :param cash: float
+        :param positions: int, positions held at once
+        :rtype: Account
+        """
+        profiles = []
+        for sleeve_name in cls.sleeve_names(name, positions):
+            profile = profile_class.Profile(sleeve_name)
+            profile.set_cash(cash / positions)
+            profiles.append(profile)
+        return cls(name, profiles, **thresholds)
+
+    @classmethod
+    def load(cls, name, positions=1, **thresholds):
+        """Loads the pickled profiles of an account
+        :param name: str
+        :param positions: int, positions held at once
+        :rtype: Account
+        """
+        return cls(name, [profile_class.load_profile_from_pickle(sleeve_name)
+                          for sleeve_name in cls.sleeve_names(name, positions)], **thresholds)
+
+    def get_tickers(self):
+        """Returns the stocks the account holds or has a pending purchase of
+        :rtype: set of str
+        """
+        return {get_profile_ticker(profile) for profile in self.profiles} - {None}
+
+    def get_cash(self):
+        """Returns the cash of every sleeve together
+        :rtype: float
+        """
+        return sum(profile.get_cash() for profile in self.profiles)
+
+
+class PortfolioManager:
+    """Class that runs the buy/sell state machine of every account on one tick. Per tick the market data fetch &
+    ranking run at most once, only when some sleeve may be buying, & the prices of every held or pending stock are
+    fetched in one bulk quote request that warms the quote cache the profiles read from. Each sleeve's cycle is one
+    Profile transaction, so it is written once. An extra account costs its own decisions & writes, not another fetch."""
+
+    def __init__(self, accounts, stock_data_provider=main.build_complete_stock_data,
+                 quote_service=default_quote_service):
+        self.accounts = list(accounts)  # Accounts traded on every tick
+        self.stock_data_provider = stock_data_provider  # Function returning the ranked stock performance dataframe
+        self.quote_service = quote_service  # Cache the profiles' prices come from
+        self.ticks = 0  # Ticks completed
+        self.rankings = 0  # Ticks that needed the market data fetch & ranking
+        self.last_tick_seconds = None  # Wall time of the last tick
+
+    def prefetch_quotes(self):
+        """Fetches the prices of every held or pending stock of every account in one request. Profiles with their own
+        price source are left out. A failed prefetch only costs the cache, the profiles fetch their own prices.
+        :rtype: dict
+        """
+        tickers = {get_profile_ticker(profile) for account in self.accounts for profile in account.profiles
+                   if profile.price_source is None} - {None}
+        if not tickers:
+            return {}
+        try:
+            return self.quote_service.get_stock_prices(sorted(tickers))
+        except Exception:
+            traceback.print_exc()
+            return {}
+
+    def tick(self):
+        """Runs one pass of the state machine for every sleeve of every account. A failing sleeve is rolled back by
+        its transaction & reported, the other sleeves still trade. A failed ranking is not retried until the next
+        tick, so an outage costs one failing fetch per tick, not one per free sleeve."""
+        tick_start = time.perf_counter()
+        self.prefetch_quotes()
+        stock_performance_dataframe = None  # Ranked once, the first time a sleeve is free to buy
+        ranking_failed = False  # Set when the ranking raised, the other sleeves then wait for the next tick
+        for account in self.accounts:
+            for profile in account.profiles:
+                try:
+                    with profile.transaction():  # One write per sleeve per tick
+                        trading_cycle.complete_pending_orders(profile)
+                        trading_cycle.check_exit(profile, account.take_profit, account.stop_loss)
+                        if trading_cycle.needs_new_position(profile) and not ranking_failed:
+                            if stock_performance_dataframe is None:
+                                # A failing fetch is not retried by every free sleeve of the tick
+                                ranking_failed = True
+                                stock_performance_dataframe = self.stock_data_provider()
+                                ranking_failed = False
+                                self.rankings += 1
+                            # Skip the stocks the account's other sleeves already hold or are buying
+                            available = stock_performance_dataframe[
+                                ~stock_performance_dataframe['Ticker'].isin(account.get_tickers())]
+                            if len(available):
+                                trading_cycle.open_position(profile, available)
+                except Exception:
+                    traceback.print_exc()  # Report & carry on with the next sleeve
+        self.ticks += 1
+        self.last_tick_seconds = time.perf_counter() - tick_start
+
+    def run(self, tick_seconds=60.0, max_ticks=None):
+        """Runs ticks on a fixed schedule, a tick that overruns the schedule starts the next one right away
+        :param tick_seconds: float, seconds between the starts of two ticks
+        :param max_ticks: optional int, stop after this many ticks
+        """
+        next_tick = time.monotonic()
+        while max_ticks is None or self.ticks < max_ticks:
+            self.tick()
+            next_tick = max(next_tick + tick_seconds, time.monotonic())
+            if max_ticks is None or self.ticks < max_ticks:
+                time.sleep(next_tick - time.monotonic())
+
+
+def get_profile_ticker(profile):
+    """Returns the stock a profile holds or has a pending purchase of, None when it is free
+    :param profile: Profile
+    :rtype: str
+    """
+    if profile.get_current_stock_holding() is not None:
+        return profile.get_current_stock_holding()
+    if profile.get_pending_purchase():
+        pending_trade = profile.ledger.pending_trade('Buy Completed Time')
+        if pending_trade is not None:
+            return pending_trade['Stock Ticker']
+    return None
+
+
+def parse_account(text):
+    """Returns (name, positions) from NAME or NAME:POSITIONS
+    :param text: str
+    :rtype: tuple
+    """
+    name, _separator, positions = text.partition(':')
+    return name, int(positions) if positions else 1
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Run several pickled trading accounts on one shared data feed.')
+    parser.add_argument('--account', type=parse_account, action='append', required=True,
+                        help='NAME or NAME:POSITIONS of a pickled account, repeat for every account')
+    parser.add_argument('--tick', type=float, default=60.0, help='seconds between ticks')
+    parser.add_argument('--max-ticks', type=int, default=None, help='stop after this many ticks')
+    parser.add_argument('--take-profit', type=float, default=trading_cycle.TAKE_PROFIT_PERCENTAGE)
+    parser.add_argument('--stop-loss', type=float, default=trading_cycle.STOP_LOSS_PERCENTAGE)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    manager = PortfolioManager([Account.load(name, positions, take_profit=arguments.take_profit,
+                                             stop_loss=arguments.stop_loss)
+                                for name, positions in arguments.account])
+    try:
+        manager.run(arguments.tick, arguments.max_ticks)
+    except KeyboardInterrupt:
+        pass
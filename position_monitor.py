@@ -0,0 +1,219 @@
+"""Streaming exit monitor: watches the held stock's price tick by tick & submits the sell the moment the take profit or
+stop loss is crossed. The trading daemon runs it next to its ticks: python trading_daemon.py --monitor-interval 1"""
+# Import necessary modules
+import asyncio
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import instrumentation
+import trading_cycle
+from quote_service import yahoo_quotes
+
+# One price of one stock; received is the perf_counter time the feed got it, the trigger latency counts from there
+Tick = namedtuple('Tick', ['symbol', 'timestamp', 'price', 'received'])
+
+
+class PollingFeed:
+    """Class that turns a quote source into ticks by asking it for the watched symbols every interval seconds. The
+    request runs in a worker thread, so the event loop stays free while it waits."""
+
+    def __init__(self, fetch_quotes=yahoo_quotes, interval=1.0):
+        """
+        :param fetch_quotes: function list of symbols -> {symbol: price}, uncached so every poll is fresh
+        :param interval: float, seconds between the starts of two polls
+        """
+        self.fetch_quotes = fetch_quotes  # Quote source
+        self.interval = interval  # Seconds between polls
+
+    async def ticks(self, symbols):
+        """Yields a tick per watched symbol & poll, forever. A failed poll is reported & retried on the next one.
+        :param symbols: function returning the symbols to watch right now
+        :rtype: async generator of Ticks
+        """
+        loop = asyncio.get_running_loop()
+        next_poll = time.monotonic()
+        while True:
+            watched = list(symbols())
+            if watched:
+                try:
+                    quotes = await loop.run_in_executor(None, self.fetch_quotes, watched)
+                except Exception as error:
+                    print('Quote poll failed: %s' % error)
+                    quotes = {}
+                received = time.perf_counter()
+                timestamp = pd.Timestamp.now()
+                for symbol, price in quotes.items():
+                    yield Tick(symbol, timestamp, price, received)
+            next_poll = max(next_poll + self.interval, time.monotonic())
+            await asyncio.sleep(next_poll - time.monotonic())
+
+
+class ReplayFeed:
+    """Class that replays recorded closes as ticks, one minute after the other, as fast as possible or scaled to real
+    time. current_time is the replay's clock, for Profile.set_clock."""
+
+    def __init__(self, replay, speed=None):
+        """
+        :param replay: backtester.BarReplay, or anything with timestamps, tickers, columns & closes
+        :param speed: optional float, replayed seconds per real second, None for as fast as possible
+        """
+        self.replay = replay  # Recorded bars
+        self.speed = speed  # Real time factor
+        self.position = 0  # Minute being replayed
+
+    def current_time(self):
+        """Returns the time of the minute being replayed
+        :rtype: pandas timestamp
+        """
+        return pd.Timestamp(int(self.replay.timestamps[self.position]), tz='UTC')
+
+    async def ticks(self, symbols):
+        """Yields a tick per watched symbol with a price & minute, until the recording ends
+        :param symbols: function returning the symbols to watch right now
+        :rtype: async generator of Ticks
+        """
+        for self.position in range(len(self.replay)):
+            if self.speed is not None and self.position:
+                step = (self.replay.timestamps[self.position] - self.replay.timestamps[self.position - 1]) / 1e9
+                await asyncio.sleep(step / self.speed)
+            else:
+                await asyncio.sleep(0)  # Let the rest of the loop run between minutes
+            timestamp = self.current_time()
+            for symbol in symbols():
+                column = self.replay.columns.get(symbol)
+                if column is None:
+                    continue
+                price = self.replay.closes[self.position, column]
+                if price == price:  # Not NaN
+                    yield Tick(symbol, timestamp, float(price), time.perf_counter())
+
+
+class QueueFeed:
+    """Class that takes ticks pushed by something else, e.g. a WebSocket client, & hands them to the monitor. Only the
+    latest price of each symbol is kept until it is read, so a fast producer can never make the feed grow: memory is
+    one slot per symbol & the monitor always sees the newest price."""
+
+    def __init__(self):
+        self.latest = {}  # Symbol -> newest unread Tick
+        self.ready = asyncio.Event()  # Set while there are unread ticks
+        self.closed = False  # No more ticks will come
+
+    def put(self, symbol, price, timestamp=None):
+        """Pushes a price, replacing the symbol's unread one. Call from the event loop's thread, or through
+        loop.call_soon_threadsafe.
+        :param symbol: str
+        :param price: float
+        :param timestamp: optional datetime, now by default
+        """
+        self.latest[symbol] = Tick(symbol, pd.Timestamp.now() if timestamp is None else timestamp, float(price),
+                                   time.perf_counter())
+        self.ready.set()
+
+    def close(self):
+        """Ends the feed once the unread ticks are read"""
+        self.closed = True
+        self.ready.set()
+
+    async def ticks(self, symbols):
+        """Yields the pushed ticks of the watched symbols until the feed is closed
+        :param symbols: function returning the symbols to watch right now
+        :rtype: async generator of Ticks
+        """
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            pending, self.latest = self.latest, {}
+            watched = set(symbols())
+            for symbol, tick in pending.items():
+                if symbol in watched:
+                    yield tick
+            if self.closed and not self.latest:
+                return
+
+
+class PositionMonitor:
+    """Class that watches a profile's held stock on a feed & submits its sell within a tick of a threshold crossing.
+    Each tick costs a few float operations: the percentage change is computed from the cached purchase price, kept in
+    memory & only written to the profile together with the sell, so nothing is saved or allocated per tick. Memory
+    stays fixed however long it runs: the last values & counters, plus the instrumentation's bounded latency samples.
+    A lock shared with code that changes the profile from another thread keeps the two apart; a crossing seen while
+    the lock is busy fires on the next tick."""
+
+    def __init__(self, profile, feed, take_profit=trading_cycle.TAKE_PROFIT_PERCENTAGE,
+                 stop_loss=trading_cycle.STOP_LOSS_PERCENTAGE, execution_manager=None, lock=None):
+        """
+        :param profile: Profile
+        :param feed: PollingFeed, ReplayFeed or QueueFeed
+        :param take_profit: float, percent
+        :param stop_loss: float, percent
+        :param execution_manager: optional execution.ExecutionManager, sells go to its broker, else to submit_sell
+        :param lock: optional threading.Lock guarding the profile
+        """
+        self.profile = profile  # Profile whose holding is watched
+        self.feed = feed  # Where the ticks come from
+        self.take_profit = take_profit  # Percent gain that triggers a sell
+        self.stop_loss = stop_loss  # Percent loss that triggers a sell
+        self.execution_manager = execution_manager  # Broker route for the sells
+        self.lock = lock  # Guards the profile against other threads
+        self.ticks = 0  # Ticks seen
+        self.triggers = 0  # Sells submitted
+        self.deferred = 0  # Crossings put off because the profile was busy
+        self.last_percentage_change = np.nan  # Percentage change at the last tick of the holding
+        self.last_trigger_seconds = None  # Seconds from the crossing tick's arrival to the submitted sell
+        self.max_trigger_seconds = 0.0  # Slowest trigger so far
+
+    def watched_symbols(self):
+        """Returns the symbols to watch: the held stock, unless its sell is already pending
+        :rtype: list of str
+        """
+        holding = self.profile.get_current_stock_holding()
+        return [] if holding is None or self.profile.get_pending_sells() else [holding]
+
+    async def run(self):
+        """Follows the feed until it ends or the task is cancelled"""
+        async for tick in self.feed.ticks(self.watched_symbols):
+            await self.on_tick(tick)
+
+    async def on_tick(self, tick):
+        """Updates the percentage change & submits the sell on a threshold crossing
+        :param tick: Tick
+        :rtype: bool, True if a sell was submitted
+        """
+        self.ticks += 1
+        profile = self.profile
+        if tick.symbol != profile.get_current_stock_holding() or profile.get_pending_sells():
+            return False  # Sold or switched since the tick was asked for
+        purchase_price = profile.get_current_stock_purchase_price()
+        if not purchase_price:  # A buy is being filled by another thread
+            return False
+        percentage_change = (tick.price - purchase_price) / purchase_price * 100
+        self.last_percentage_change = percentage_change
+        if self.stop_loss <= percentage_change <= self.take_profit:
+            return False
+        if self.lock is not None and not self.lock.acquire(blocking=False):
+            self.deferred += 1  # Another thread is changing the profile, the next tick tries again
+            return False
+        try:
+            # The holding may have been sold by another thread before the lock was taken
+            if tick.symbol != profile.get_current_stock_holding() or profile.get_pending_sells():
+                return False
+            with profile.transaction():
+                profile.set_current_percentage_change(percentage_change)  # Saved with the sell, not every tick
+                if self.execution_manager is None:
+                    submitted = profile.submit_sell()
+            if self.execution_manager is not None:
+                submitted = await self.execution_manager.sell(profile) is not None
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+        if submitted:
+            self.triggers += 1
+            self.last_trigger_seconds = time.perf_counter() - tick.received
+            self.max_trigger_seconds = max(self.max_trigger_seconds, self.last_trigger_seconds)
+            if instrumentation.default_registry.enabled:
+                instrumentation.default_registry.record('monitor.trigger', self.last_trigger_seconds)
+            print('Sell of %s submitted at %.3f%% (%s), %.2f ms after the tick' % (
+                tick.symbol, percentage_change, tick.timestamp, self.last_trigger_seconds * 1000))
+        return submitted
+
@@ -1,16 +1,41 @@
 # Import necessary modules
+import functools
+import os
 import pickle
+from contextlib import contextmanager
 from datetime import datetime
-import pandas as pd
-import yfinance as yf
-from numpy import nan
+import instrumentation
+import profile_snapshot
+from lazy_import import LazyModule
+from quote_service import default_quote_service
+from trade_ledger import TradeLedger
+
+pd = LazyModule('pandas')  # Imported by the paths that need it, a pending order check does not
+
+# Fields a profile saves, the trading history lives in its ledger
+STATE_FIELDS = ('first_name', 'cash', 'invested_capital', 'capital_gains', 'pending_purchase', 'pending_sells',
+                'current_stock_holding', 'current_stock_purchase_price', 'current_percentage_change',
+                'current_number_of_shares', 'ledger')
+# Fields that only live in memory: the transaction bookkeeping & the injected clock & price source
+TRANSIENT_FIELDS = ('transaction_depth', 'transaction_dirty', 'clock', 'price_source')
+
+
+def transactional(method):
+    """Decorator that runs a Profile method inside one transaction, so all of its saves become a single write"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.transaction():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class Profile:
     """Class that creates investing profiles. Each object will have cash, invested capital, capital gains, pending
     trades, & pending sells. The cash is liquid cash available for investing. Invested capital is capital illiquid
     assets tied up in stocks. Capital gains is a running tracking that tracks total gains. Pending trades & sells
-    records a boolean value that logs if a trade/sell is initiated."""
+    records a boolean value that logs if a trade/sell is initiated. The fields are slots, & the profile is saved as a
+    small fixed size snapshot (see profile_snapshot) instead of a pickle of the whole object."""
+    __slots__ = STATE_FIELDS + TRANSIENT_FIELDS
 
     def __init__(self, first_name):
         self.first_name = first_name
@@ -23,16 +48,34 @@ class Profile:
         self.current_stock_purchase_price = None
         self.current_percentage_change = None
         self.current_number_of_shares = None
-        self.trading_history = pd.DataFrame({'Stock Ticker': [],
-                                             'Buy Invested Amount': [],
-                                             'Buy Submission Time': [],
-                                             'Buy Completed Time': [],
-                                             'Completed Order Price': [],
-                                             'Shares Holding': [],
-                                             'Sell Order Time': [],
-                                             'Sell Completed Time': [],
-                                             'Profit': []})
+        self.ledger = TradeLedger(first_name + '_ledger.sqlite')  # Append only trade journal, replaces the dataframe
+        self.transaction_depth = 0  # Number of open transaction blocks, saves wait until the outermost one ends
+        self.transaction_dirty = False  # A save was requested inside the transaction
+        self.clock = None  # Function returning the current time, None for the wall clock
+        self.price_source = None  # Function returning a stock's current price, None for the quote service
         self.dump_profile_to_pickle()  # Save changes to profile
+
+    def __getstate__(self):
+        """Returns the saved fields, everything except the transaction bookkeeping & the injected clock & price
+        source"""
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+    def __setstate__(self, state):
+        """Restores a saved profile outside of any transaction. Older pickles have no bookkeeping fields, & pickles
+        from before the ledger carry their trading history dataframe, it is moved into a new ledger."""
+        state = dict(state)
+        trading_history = state.pop('trading_history', None)
+        for field in STATE_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
+        self.transaction_depth = 0
+        self.transaction_dirty = False
+        self.clock = None
+        self.price_source = None
+        if 'ledger' not in state:
+            self.ledger = TradeLedger(self.first_name + '_ledger.sqlite')
+            if trading_history is not None and self.ledger.trade_count() == 0:
+                self.ledger.import_dataframe(trading_history)  # Migrate the old history once
         
     def __str__(self):
         cash = self.get_cash()
@@ -235,10 +278,10 @@ class Profile:
 
     def get_trading_history(self):
         """
-        Returns the attribute self.trading_history
+        Returns the trading history, read from the ledger when asked for
         :rtype: pandas dataframe
         """
-        return self.trading_history
+        return self.ledger.history_dataframe()
 
     def get_current_number_of_shares(self):
         """
@@ -247,21 +290,46 @@ class Profile:
         """
         return self.current_number_of_shares
 
+    def set_clock(self, clock):
+        """
+        Method that replaces the wall clock the order methods read, e.g. with a backtest's simulated time
+        :param clock: function returning the current time, None for the wall clock
+        """
+        self.clock = clock
+
+    def set_price_source(self, price_source):
+        """
+        Method that replaces where the order methods get stock prices, e.g. with a backtest's recorded bars
+        :param price_source: function stock symbol -> price, None for the quote service
+        """
+        self.price_source = price_source
+
+    def get_current_time(self):
+        """
+        Returns the current time from the injected clock, or the wall clock
+        :rtype: datetime, a pandas timestamp for an injected clock
+        """
+        return datetime.now() if self.clock is None else pd.Timestamp(self.clock())
+
+    def get_current_price(self, stock_symbol):
+        """
+        Returns the current price of a stock from the injected price source, or the quote service
+        :param stock_symbol: str
+        :rtype: float
+        """
+        return get_stock_price(stock_symbol) if self.price_source is None else self.price_source(stock_symbol)
+
+    @instrumentation.timed('profile.submit_order')
+    @transactional
     def submit_order(self, stock_symbol, invested_capital):
         """Method that submits order for a stock. The trade is not completed instantly to simulate a brokerage
-        execution rate. The method will use the global trading frame & add a record with the stock symbol,
-        invested capital, & purchase time stamp."""
-        purchase_timestamp = datetime.now()  # Obtain currant time that trade was initiated
+        execution rate. The method will append a trade to the ledger with the stock symbol, invested capital, &
+        purchase time stamp."""
+        purchase_timestamp = self.get_current_time()  # Obtain currant time that trade was initiated
 
         if self.get_cash() >= invested_capital:  # If we have sufficient cash to initiate the trade
-            # We create a half empty record
-            instance = pd.Series([stock_symbol, invested_capital, purchase_timestamp,
-                                  nan, nan, nan, nan, nan, nan],
-                                 index=['Stock Ticker', 'Buy Invested Amount', 'Buy Submission Time',
-                                        'Buy Completed Time', 'Completed Order Price', 'Shares Holding',
-                                        'Sell Order Time', 'Sell Completed Time', 'Profit'])
-            # Append the new record to the global dataframe
-            self.trading_history = self.trading_history.append(instance, ignore_index=True)
+            # Append a half empty record to the ledger
+            self.ledger.open_trade(stock_symbol, invested_capital, purchase_timestamp)
             self.set_pending_purchase(True)  # Set the pending trade attribute to true
             self.dump_profile_to_pickle()  # Save changes to profile
             return True  # Return true if successful
@@ -270,57 +338,92 @@ class Profile:
             self.dump_profile_to_pickle()  # Save changes to profile
             return False  # Return false
 
+    @instrumentation.timed('profile.complete_trade')
+    @transactional
     def complete_trade(self):
         """Method that completes order for a stock. The trade is not completed instantly to simulate a brokerage
-        execution rate. The method will use the global trading frame & update a record with the buy completed order
-        time, completed order price, & shares holding. Additionally, only one stock can be bought a time, so we
-        will use the the dataframe index strategy to update the rows. We will filter for the opening by the Buy
-        Completed Time, then retrieve that row index & update the values."""
-        # Obtain the row index that the incomplete order exists on
-        pending_trade_index = self.trading_history.index[self.trading_history['Buy Completed Time'].isnull()].tolist()
-        # If there are pending trades & a row exists for completion
-        if self.get_pending_purchase() and pending_trade_index is not None:
-            # Obtain the stock ticker at that row index. Values will return a list, so we use 0 index for the value
-            pending_stock = self.trading_history.iloc[pending_trade_index]['Stock Ticker'].values[0]
-            # Obtain the invested amount at that row index. Values will return a list, so we use 0 index for the value
-            invested_capital = self.trading_history.iloc[pending_trade_index]['Buy Invested Amount'].values[0]
-            current_stock_price = get_stock_price(pending_stock)  # A function that obtains the current stock price
-            # Obtain the buy time at that row index. Values will return a list, so we use 0 index for the value
-            buy_time = self.trading_history.iloc[pending_trade_index]['Buy Submission Time'].values[0]
-            current_time = pd.Timestamp.now()  # Get the current time with the pandas method
+        execution rate. The method will update the ledger record with the buy completed order time, completed order
+        price, & shares holding. Additionally, only one stock can be bought a time, so the ledger's open trades index
+        hands us the trade whose Buy Completed Time is still empty without looking at the history."""
+        # Obtain the open trade that the incomplete order belongs to
+        pending_trade = self.ledger.pending_trade('Buy Completed Time')
+        # If there are pending trades & a record exists for completion
+        if self.get_pending_purchase() and pending_trade is not None:
+            pending_stock = pending_trade['Stock Ticker']  # Obtain the stock ticker of the trade
+            invested_capital = pending_trade['Buy Invested Amount']  # Obtain the invested amount of the trade
+            buy_time = pending_trade['Buy Submission Time']  # Obtain the buy time of the trade
+            current_time = self.get_current_time()  # Get the current time
             elapsed_time = (current_time - buy_time).total_seconds()  # Delta time for elapsed time in seconds
 
             if elapsed_time > 60 * 10:  # If it has been ten minutes since purchase initiation
-                shares_holding = invested_capital / current_stock_price  # Calculate shares holding
-                self.trading_history.at[pending_trade_index, 'Buy Completed Time'] = current_time  # Add completed time
-                # Insert Completed Order Price
-                self.trading_history.at[pending_trade_index, 'Completed Order Price'] = current_stock_price
-                # Shares holding is invested capital divided by current stock price, insert into record
-                self.trading_history.at[pending_trade_index, 'Shares Holding'] = shares_holding
-                self.add_cash(-invested_capital)  # Adjust cash balance for the trade
-                self.set_invested_capital(invested_capital)  # Set the transaction as the attribute
-                self.set_pending_purchase(False)  # Change attribute to close pending trade
-                self.set_current_stock_holding(pending_stock)  # Set the attribute to the current stock
-                self.set_current_stock_purchase_price(current_stock_price)  # Set the attribute as the purchase price
-                self.set_current_number_of_shares(shares_holding)  # Set the current number of shares holding
-                self.dump_profile_to_pickle()  # Save changes to profile
-                return True  # Return true, it was successful
+                # Only now fetch the current stock price, a check that is too early needs no quote
+                current_stock_price = self.get_current_price(pending_stock)
+                # Fill the whole invested amount at the current price
+                return self.fill_buy(current_stock_price, invested_capital / current_stock_price, current_time)
         else:  # No trades pending
             self.dump_profile_to_pickle()  # Save changes to profile
             return False  # Return false
 
+    @transactional
+    def fill_buy(self, price, shares, filled_time, invested_capital=None):
+        """Method that records the fill of the pending buy order, from the simulated wait of complete_trade or from a
+        broker's fill event. The method will update the ledger record with the buy completed time, the fill price, &
+        the shares holding, & make the stock the current holding.
+        :param price: float, average fill price
+        :param shares: float, shares bought
+        :param filled_time: datetime
+        :param invested_capital: optional float, amount actually spent when the order was only partly filled
+        :rtype: bool
+        """
+        pending_trade = self.ledger.pending_trade('Buy Completed Time')  # Obtain the open trade of the order
+        if not self.get_pending_purchase() or pending_trade is None:  # No order to fill
+            return False
+        pending_stock = pending_trade['Stock Ticker']  # Obtain the stock ticker of the trade
+        changes = {'Buy Completed Time': filled_time, 'Completed Order Price': price, 'Shares Holding': shares}
+        if invested_capital is None:
+            invested_capital = pending_trade['Buy Invested Amount']  # Obtain the invested amount of the trade
+        else:
+            changes['Buy Invested Amount'] = invested_capital  # Only part of the order was filled
+        self.ledger.update_trade(pending_trade['Trade ID'], changes)  # Record the fill
+        self.add_cash(-invested_capital)  # Adjust cash balance for the trade
+        self.set_invested_capital(invested_capital)  # Set the transaction as the attribute
+        self.set_pending_purchase(False)  # Change attribute to close pending trade
+        self.set_current_stock_holding(pending_stock)  # Set the attribute to the current stock
+        self.set_current_stock_purchase_price(price)  # Set the attribute as the purchase price
+        self.set_current_number_of_shares(shares)  # Set the current number of shares holding
+        self.dump_profile_to_pickle()  # Save changes to profile
+        return True  # Return true, it was successful
+
+    @transactional
+    def cancel_buy(self, cancelled_time):
+        """Method that drops the pending buy order after the broker cancelled or rejected it without filling any of
+        it. The ledger record is closed with no shares & no profit, the cash was never spent.
+        :param cancelled_time: datetime
+        :rtype: bool
+        """
+        pending_trade = self.ledger.pending_trade('Buy Completed Time')  # Obtain the open trade of the order
+        if not self.get_pending_purchase() or pending_trade is None:  # No order to drop
+            return False
+        self.ledger.update_trade(pending_trade['Trade ID'], {'Buy Completed Time': cancelled_time,
+                                                             'Shares Holding': 0, 'Sell Order Time': cancelled_time,
+                                                             'Sell Completed Time': cancelled_time, 'Profit': 0})
+        self.set_pending_purchase(False)  # Nothing is pending anymore
+        self.dump_profile_to_pickle()  # Save changes to profile
+        return True
+
+    @instrumentation.timed('profile.submit_sell')
+    @transactional
     def submit_sell(self):
         """Method that submits sell order for a stock. The sell is not completed instantly to simulate a brokerage
-        execution rate. The method will use the global trading frame & update a record with the stock symbol,
-        invested capital, & purchase time stamp. Additionally, only one stock can be bought a time, so we will use
-        the dataframe index strategy to update the rows. We will filter for the opening by the Sell Completed Time,
-        then retrieve that row index &  update the values."""
+        execution rate. The method will update the ledger record with the sell order time stamp. Additionally, only
+        one stock can be bought a time, so the ledger's open trades index hands us the trade whose Sell Order Time is
+        still empty."""
         # If there is an active trade, there will be only one, we want to sell that stock
-        pending_trade_index = self.trading_history.index[self.trading_history['Sell Order Time'].isnull()].tolist()
+        pending_trade = self.ledger.pending_trade('Sell Order Time')
         # If we have a completed trade that is not sold
-        if (not self.get_pending_sells()) and (pending_trade_index is not None):
-            current_time = pd.Timestamp.now()  # Obtain the current timestamp with pandas method
-            self.trading_history.at[pending_trade_index, 'Sell Order Time'] = current_time  # Update the record
+        if (not self.get_pending_sells()) and (pending_trade is not None):
+            current_time = self.get_current_time()  # Obtain the current timestamp
+            self.ledger.update_trade(pending_trade['Trade ID'], {'Sell Order Time': current_time})  # Update the record
             self.set_pending_sells(True)  # Set the attribute to true
             self.dump_profile_to_pickle()  # Save changes to profile
             return True  # Return true for success
@@ -328,48 +431,94 @@ class Profile:
             self.dump_profile_to_pickle()  # Save changes to profile
             return False  # Return false
 
+    @instrumentation.timed('profile.complete_sell')
+    @transactional
     def complete_sell(self):
         """Method that completes sell order for a stock. The trade is not completed instantly to simulate a brokerage
-        execution rate. The method will use the global trading frame & update a record with the sell order time &
-        profit. Additionally, only one stock can be bought a time, so we will use the dataframe index strategy to
-        update the rows. We will filter for the opening by the Sell Completed Time, then retrieve that row index &
-        update the values."""
+        execution rate. The method will update the ledger record with the sell completed time & profit, which closes
+        the trade. Additionally, only one stock can be bought a time, so the ledger's open trades index hands us the
+        trade whose Sell Completed Time is still empty."""
 
         # If there is an active trade, there will be only one, we want to sell that stock
-        pending_trade_index = self.trading_history.index[self.trading_history['Sell Completed Time'].isnull()].tolist()
-        print(pending_trade_index)
-        if self.get_pending_sells() and pending_trade_index != []:
-            # Obtain the stock ticker at that row index. Values will return a list, so we use 0 index for the value
-            pending_stock = self.trading_history.iloc[pending_trade_index]['Stock Ticker'].values[0]
-            # Obtain the invested capital at that row index. Values will return a list, so we use 0 index for the value
-            invested_capital = self.trading_history.iloc[pending_trade_index]['Buy Invested Amount'].values[0]
-            # Obtain the shares holding at that row index. Values will return a list, so we use 0 index for the value
-            shares_holding = self.trading_history.iloc[pending_trade_index]['Shares Holding'].values[0]
-            current_stock_price = get_stock_price(pending_stock)  # A function that obtains the current stock price
-            capital_yield = current_stock_price * shares_holding  # Calculates total active capital in stock
-            net_capital_gain = capital_yield - invested_capital  # Calculates delta, which is net capital gain
-            # Obtain the sell order time at that row index. Values will return a list, so we use 0 index for the value
-            sell_time = self.trading_history.iloc[pending_trade_index]['Sell Order Time'].values[0]
-            current_time = pd.Timestamp.now()  # Retrieve current time with pandas method
+        pending_trade = self.ledger.pending_trade('Sell Completed Time')
+        if self.get_pending_sells() and pending_trade is not None:
+            pending_stock = pending_trade['Stock Ticker']  # Obtain the stock ticker of the trade
+            shares_holding = self.get_current_number_of_shares()  # Obtain the shares still held
+            sell_time = pending_trade['Sell Order Time']  # Obtain the sell order time of the trade
+            current_time = self.get_current_time()  # Retrieve current time
             elapsed_time = (current_time - sell_time).total_seconds()  # Calculate elapsed time in seconds
             if elapsed_time > 60 * 10:  # If it has been ten minutes since purchase initiation
-                # Insert Sell Completed Time
-                self.trading_history.at[pending_trade_index, 'Sell Completed Time'] = current_time
-                self.trading_history.at[pending_trade_index, 'Profit'] = net_capital_gain  # Insert Profit
-                self.add_cash(capital_yield)  # Add the capital yield to the cash balance
-                self.set_invested_capital(0)  # Set invested capital to 0
-                self.add_capital_gains(net_capital_gain)  # Add the net capital gains to the existing capital gains
-                self.set_pending_sells(False)  # Set pending sells to false, because we closed this transaction
-                self.set_current_stock_holding(None)  # We are currently holding no stocks
-                self.set_current_stock_purchase_price(None)  # Set the current stock purchase price to none
-                self.set_current_percentage_change(None)  # Set the current stock percentage change to none
-                self.set_current_number_of_shares(None)  # Set the current number of shares holding
-                self.dump_profile_to_pickle()  # Save changes to profile
-                return True  # Return true
+                # Only now fetch the current stock price, a check that is too early needs no quote
+                current_stock_price = self.get_current_price(pending_stock)
+                # Fill every share at the current price
+                return self.fill_sell(current_stock_price, shares_holding, current_time)
         else:  # No pending sells for completion
             self.dump_profile_to_pickle()  # Save changes to profile
             return False  # Return false
 
+    @transactional
+    def fill_sell(self, price, shares, filled_time):
+        """Method that records the fill of the pending sell order, from the simulated wait of complete_sell or from a
+        broker's fill event. When every share is sold the ledger record gets the sell completed time & profit, which
+        closes the trade. When the order was only partly filled, the sold shares' gain is realized into the trade's
+        profit, the rest stays held, as the record's shares holding, & the sell order is cleared so a new one can be
+        submitted.
+        :param price: float, average fill price
+        :param shares: float, shares sold
+        :param filled_time: datetime
+        :rtype: bool
+        """
+        pending_trade = self.ledger.pending_trade('Sell Completed Time')  # Obtain the open trade of the order
+        if not self.get_pending_sells() or pending_trade is None:  # No order to fill
+            return False
+        # The position still held, smaller than the trade's after a partial sell
+        invested_capital = self.get_invested_capital()
+        shares_holding = self.get_current_number_of_shares()
+        realized_profit = pending_trade['Profit'] or 0  # Gain of earlier partial sells of the trade
+        # Share of the position sold, rounding dust of a full sell counts as all of it
+        sold_fraction = shares / shares_holding if shares_holding and shares < shares_holding - 1e-9 else 1.0
+        capital_yield = price * shares_holding * sold_fraction  # Calculates total active capital sold
+        net_capital_gain = capital_yield - invested_capital * sold_fraction  # Calculates delta, net capital gain
+        self.add_cash(capital_yield)  # Add the capital yield to the cash balance
+        self.add_capital_gains(net_capital_gain)  # Add the net capital gains to the existing capital gains
+        self.set_pending_sells(False)  # Set pending sells to false, because we closed this order
+        if sold_fraction < 1.0:  # Part of the position is still held
+            remaining_shares = shares_holding - shares  # Shares still held
+            remaining_capital = invested_capital * (1 - sold_fraction)  # Capital still invested
+            self.ledger.update_trade(pending_trade['Trade ID'], {'Sell Order Time': None,
+                                                                 'Shares Holding': remaining_shares,
+                                                                 'Profit': realized_profit + net_capital_gain})
+            self.set_invested_capital(remaining_capital)  # Set the capital still invested
+            self.set_current_number_of_shares(remaining_shares)  # Set the shares still held
+            self.dump_profile_to_pickle()  # Save changes to profile
+            return True
+        # Insert Sell Completed Time & Profit, the trade leaves the open trades index
+        self.ledger.update_trade(pending_trade['Trade ID'], {'Sell Completed Time': filled_time,
+                                                             'Profit': realized_profit + net_capital_gain})
+        self.set_invested_capital(0)  # Set invested capital to 0
+        self.set_current_stock_holding(None)  # We are currently holding no stocks
+        self.set_current_stock_purchase_price(None)  # Set the current stock purchase price to none
+        self.set_current_percentage_change(None)  # Set the current stock percentage change to none
+        self.set_current_number_of_shares(None)  # Set the current number of shares holding
+        self.dump_profile_to_pickle()  # Save changes to profile
+        return True  # Return true
+
+    @transactional
+    def cancel_sell(self):
+        """Method that drops the pending sell order after the broker cancelled or rejected it without filling any of
+        it. The position stays held & a new sell can be submitted.
+        :rtype: bool
+        """
+        pending_trade = self.ledger.pending_trade('Sell Completed Time')  # Obtain the open trade of the order
+        if not self.get_pending_sells() or pending_trade is None:  # No order to drop
+            return False
+        self.ledger.update_trade(pending_trade['Trade ID'], {'Sell Order Time': None})  # Clear the sell order
+        self.set_pending_sells(False)  # Nothing is pending anymore
+        self.dump_profile_to_pickle()  # Save changes to profile
+        return True
+
+    @instrumentation.timed('profile.calculate_current_percentage')
+    @transactional
     def calculate_current_percentage(self):
         """A method that calculates the current percent change of the stock holding. The method gets the purchase level
         of stock, then retrieves the current price level of the stock; lastly, it calculate percentage change."""
@@ -377,55 +526,98 @@ class Profile:
         percentage_change = None  # Unresolved attribute reference solved
         if current_stock is not None:  # If we are holding a stock
             purchase_stock_level = self.get_current_stock_purchase_price()  # Get initial purchase price of stock
-            current_stock_price = get_stock_price(self.get_current_stock_holding())  # Get current stock price of stock
+            current_stock_price = self.get_current_price(current_stock)  # Get current stock price of stock
             percentage_change = ((current_stock_price - purchase_stock_level)/purchase_stock_level) * 100  # pct change
             self.set_current_percentage_change(percentage_change)
             self.dump_profile_to_pickle()  # Save changes to profile
         return percentage_change
 
+    @contextmanager
+    def transaction(self):
+        """Context manager that batches saves: inside the block every setter only changes memory & the profile is
+        written once, atomically, when the outermost block ends. If the block raises, the profile is rolled back to
+        its state when the block began & nothing is written. Blocks can be nested.
+            with profile.transaction():
+                profile.add_cash(-10)
+                profile.set_invested_capital(10)
+        """
+        if self.transaction_depth == 0:
+            snapshot = self.__getstate__()  # Remember the state to roll back to
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth -= 1
+            if self.transaction_depth == 0:
+                self.__setstate__(snapshot)  # Roll back the memory, the file still holds the last commit
+                self.ledger.rollback()  # Drop the trade events of the block too
+            raise
+        self.transaction_depth -= 1
+        if self.transaction_depth == 0 and self.transaction_dirty:
+            self.transaction_dirty = False
+            self.write_snapshot()  # Commit
+
     def dump_profile_to_pickle(self):
-        """Saves profile to pickle file for recovery"""
-        with open(self.first_name + '.pkl', 'wb') as file:  # Open the pickle file
-            pickle.dump(self, file)  # Dump all the current data into the pickle file
+        """Saves profile to its snapshot file for recovery. Inside a transaction the save is deferred to the commit."""
+        if self.transaction_depth:
+            self.transaction_dirty = True  # Written once when the transaction ends
+            return True
+        return self.write_snapshot()
+
+    @instrumentation.timed('profile.write_snapshot')
+    def write_snapshot(self):
+        """Writes the profile to its snapshot file atomically, so a crash mid write never leaves a truncated file. The
+        ledger's trade events are committed first, the snapshot itself only holds the ledger's path."""
+        self.ledger.commit()  # Make the trade events durable with the state that refers to them
+        profile_snapshot.write_snapshot(self.first_name + profile_snapshot.SNAPSHOT_EXTENSION, self.__getstate__())
         return True  # Return true for success
 
     def reset_trading_dataframe(self):
-        """"Resets the trading data frame pickle file for whatever reason you want"""
-        # All columns of the trading history with no data
-        df = pd.DataFrame({'Stock Ticker': [],
-                           'Buy Invested Amount': [],
-                           'Buy Submission Time': [],
-                           'Buy Completed Time': [],
-                           'Completed Order Price': [],
-                           'Shares Holding': [],
-                           'Sell Order Time': [],
-                           'Sell Completed Time': [],
-                           'Profit': []})
-        self.trading_history = df  # Dump the dataframe into the trading history attribute
+        """"Resets the trading history ledger for whatever reason you want"""
+        self.ledger.reset()  # Delete every trade from the ledger
         return True  # Return true for success
 
     def export_trading_df(self, export_location):
-        """Export the trading dataframe to specified location
+        """Export the trading history to specified location, streamed from the ledger in chunks
         :param export_location: str
         """
-        df = self.get_trading_history()  # Get trading history dataframe
-        if '.xlsx' in export_location:
-            df.to_excel(export_location)
-        else:
-            df.to_excel(export_location + '.xlsx')
+        if '.xlsx' not in export_location:
+            export_location += '.xlsx'
+        with pd.ExcelWriter(export_location) as writer:
+            start_row = 0  # Sheet row the next chunk starts on
+            for chunk in self.ledger.iter_history():
+                # Only the first chunk writes the header, the rest continue below it
+                chunk.to_excel(writer, startrow=start_row, header=start_row == 0)
+                start_row += len(chunk) + (start_row == 0)
+            if start_row == 0:  # No trades yet, write the header alone
+                self.ledger.history_dataframe().to_excel(writer)
 
 
 def load_profile_from_pickle(profile_first_name):
-    """Loads  the data from a profile"""
+    """Loads  the data from a profile. The snapshot is read when there is one; otherwise the old pickle is loaded &
+    migrated, its snapshot is written so the next load skips the pickle."""
+    snapshot_path = profile_first_name + profile_snapshot.SNAPSHOT_EXTENSION
+    if os.path.exists(snapshot_path):
+        state = profile_snapshot.read_snapshot(snapshot_path)
+        state['ledger'] = TradeLedger(state.pop('ledger_path'))
+        profile = Profile.__new__(Profile)
+        profile.__setstate__(state)
+        return profile
     with open(profile_first_name + '.pkl', 'rb') as file:  # Open the pickle file
         profile = pickle.load(file)  # Load the trading_data_frame pickle file
+    profile.write_snapshot()  # Migrate to the snapshot format
     return profile  # Return the trading_data_frame file
 
 
 def get_stock_price(stock_symbol):
-    """Get the last closing price of a stock"""
-    # Obtain 1 day history of the stock, one day is the lowest interval
-    data = yf.Ticker(stock_symbol).history(period='1d')
-    # Look at the last entry, most recent, & retrieve the last one
-    current_stock_price = (data.tail(1)['Close'].iloc[0])
-    return current_stock_price  # Return the value
+    """Get the last closing price of a stock. Quotes are cached for a few seconds, so the trade, sell & percentage
+    checks of one cycle share a single request"""
+    return default_quote_service.get_stock_price(stock_symbol)  # Return the value
+
+
+def get_stock_prices(stock_symbols):
+    """Get the last closing prices of many stocks with one request for every symbol that is not cached
+    :param stock_symbols: list of str
+    :rtype: dict
+    """
+    return default_quote_service.get_stock_prices(stock_symbols)
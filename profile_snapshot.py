@@ -0,0 +1,84 @@
+# Import necessary modules
+import os
+import numpy as np
+
+SNAPSHOT_VERSION = 1  # Version written into every new snapshot
+SNAPSHOT_EXTENSION = '.profile'  # Snapshot file of a profile: <first name>.profile
+# One fixed size record per snapshot, the layout of version 1. Empty floats are NaN & empty strings are ''.
+SNAPSHOT_DTYPE = np.dtype([('version', '<u4'),
+                           ('first_name', '<U256'),
+                           ('ledger_path', '<U512'),
+                           ('cash', '<f8'),
+                           ('invested_capital', '<f8'),
+                           ('capital_gains', '<f8'),
+                           ('pending_purchase', '?'),
+                           ('pending_sells', '?'),
+                           ('current_stock_holding', '<U16'),
+                           ('current_stock_purchase_price', '<f8'),
+                           ('current_percentage_change', '<f8'),
+                           ('current_number_of_shares', '<f8')])
+OPTIONAL_FIELDS = ['current_stock_holding', 'current_stock_purchase_price', 'current_percentage_change',
+                   'current_number_of_shares']  # Fields that are None when the profile holds nothing
+
+
+def state_to_record(state):
+    """Returns a snapshot record of a profile state
+    :param state: dict field -> value, from Profile.__getstate__
+    :rtype: numpy structured array of shape (1,)
+    """
+    record = np.zeros(1, dtype=SNAPSHOT_DTYPE)
+    record['version'] = SNAPSHOT_VERSION
+    state = dict(state, ledger_path=state['ledger'].path)
+    for field in SNAPSHOT_DTYPE.names:
+        if field == 'version':
+            continue
+        value = state[field]
+        if value is None:  # Only the optional fields can be empty
+            value = '' if SNAPSHOT_DTYPE[field].kind == 'U' else np.nan
+        elif SNAPSHOT_DTYPE[field].kind == 'U' and len(value) > SNAPSHOT_DTYPE[field].itemsize // 4:
+            raise ValueError('%s %r does not fit in a profile snapshot' % (field, value))
+        record[field] = value
+    return record
+
+
+def record_to_state(record):
+    """Returns the profile fields of a snapshot record as plain python values, the ledger as its path
+    :param record: numpy structured array of shape (1,) or one of its elements
+    :rtype: dict
+    """
+    record = record.reshape(-1)[0]
+    if int(record['version']) > SNAPSHOT_VERSION:
+        raise ValueError('Profile snapshot version %d is newer than this code reads (%d)'
+                         % (record['version'], SNAPSHOT_VERSION))
+    state = {}
+    for field in record.dtype.names:
+        if field == 'version':
+            continue
+        value = record[field].item()  # Python scalar
+        if field in OPTIONAL_FIELDS and (value == '' or value != value):  # '' or NaN means empty
+            value = None
+        state[field] = value
+    return state
+
+
+def write_snapshot(path, state):
+    """Writes a profile state as a snapshot atomically: the record goes to a temporary file that replaces the old one
+    only when it is complete & on disk
+    :param path: str
+    :param state: dict field -> value, from Profile.__getstate__
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.save(file, state_to_record(state))
+        file.flush()
+        os.fsync(file.fileno())  # Make sure the bytes are on disk before the swap
+    os.replace(temporary_path, path)  # Atomic swap
+
+
+def read_snapshot(path):
+    """Reads a snapshot. The file is memory mapped & the fields are read straight out of the mapping, nothing is
+    unpickled.
+    :param path: str
+    :rtype: dict
+    """
+    return record_to_state(np.load(path, mmap_mode='r'))
@@ -0,0 +1,177 @@
+# Import necessary modules
+import threading
+import time
+from concurrent.futures import Future
+from lazy_import import LazyModule
+
+yf = LazyModule('yfinance')  # Imported by the first quote request
+
+yahoo_download_lock = threading.Lock()  # yf.download keeps its results in a module global, one download at a time
+
+
+def yahoo_quote(stock_symbol):
+    """Get the last closing price of a stock from yahoo finance
+    :param stock_symbol: str
+    :rtype: float
+    """
+    # Obtain 1 day history of the stock, one day is the lowest interval
+    data = yf.Ticker(stock_symbol).history(period='1d')
+    # Look at the last entry, most recent, & retrieve the last one
+    return data.tail(1)['Close'].iloc[0]
+
+
+def yahoo_quotes(stock_symbols):
+    """Get the last closing prices of many stocks from yahoo finance in one request. Symbols yahoo does not return are
+    left out of the result.
+    :param stock_symbols: list of str
+    :rtype: dict
+    """
+    with yahoo_download_lock:
+        data = yf.download(list(stock_symbols), period='1d', progress=False)
+    closes = data['Close']
+    if len(stock_symbols) == 1:  # A single symbol comes back without the ticker column level
+        closes = closes.to_frame(stock_symbols[0]) if closes.ndim == 1 else closes
+    last_closes = closes.ffill().tail(1)  # The most recent close of every symbol
+    return {symbol: float(last_closes[symbol].iloc[0]) for symbol in stock_symbols
+            if symbol in last_closes and last_closes[symbol].notnull().iloc[0]}
+
+
+class QuoteService:
+    """Class that serves stock prices through a per symbol TTL cache. A quote younger than the TTL is served from
+    memory; callers asking for a symbol that is already being fetched wait for that fetch instead of sending their own;
+    get_stock_prices fetches every symbol it is missing in one bulk request. Hit & miss counters show the savings."""
+
+    def __init__(self, ttl=15.0, fetch_quote=yahoo_quote, fetch_quotes=yahoo_quotes, clock=time.monotonic):
+        self.ttl = ttl  # Seconds a quote stays fresh
+        self.fetch_quote = fetch_quote  # Function symbol -> price
+        self.fetch_quotes = fetch_quotes  # Function list of symbols -> {symbol: price}
+        self.clock = clock  # Monotonic seconds
+        self.quotes = {}  # Symbol -> (price, time fetched)
+        self.in_flight = {}  # Symbol -> Future of the fetch that is running for it
+        self.lock = threading.Lock()  # Guards the cache, the in flight fetches & the counters
+        self.hits = 0  # Quotes served from the cache
+        self.misses = 0  # Quotes that needed a fetch
+        self.coalesced = 0  # Quotes that waited on somebody else's fetch
+        self.requests = 0  # Requests sent to the price source
+
+    def get_stock_price(self, stock_symbol):
+        """Returns the last price of a stock, from the cache when it is fresh
+        :param stock_symbol: str
+        :rtype: float
+        """
+        with self.lock:
+            price = self.cached_price(stock_symbol)
+            if price is not None:
+                self.hits += 1
+                return price
+            future = self.in_flight.get(stock_symbol)
+            owner = future is None  # The first caller fetches, everybody after it waits
+            if owner:
+                self.misses += 1
+                self.requests += 1
+                future = self.in_flight[stock_symbol] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:  # Somebody is already fetching it, wait for their answer
+            return future.result()
+        fetched = {}  # Symbol -> price once the fetch answered
+        error = None  # Exception the fetch raised, handed to the waiting callers
+        try:
+            fetched[stock_symbol] = self.fetch_quote(stock_symbol)
+        except Exception as fetch_error:
+            error = fetch_error
+            raise
+        finally:  # Even on an interrupt or a cancellation, or every later caller would wait forever
+            self.finish({stock_symbol: future}, fetched, error)
+        return fetched[stock_symbol]
+
+    def get_stock_prices(self, stock_symbols):
+        """Returns the last price of many stocks. Fresh quotes come from the cache, the rest are fetched in one bulk
+        request. Symbols the source does not return are left out of the result.
+        :param stock_symbols: list of str
+        :rtype: dict
+        """
+        prices = {}  # Symbol -> price
+        waiting = {}  # Symbol -> Future of somebody else's fetch
+        owned = {}  # Symbol -> Future this call has to resolve
+        with self.lock:
+            for symbol in dict.fromkeys(stock_symbols):  # De-duplicate, keep the order
+                price = self.cached_price(symbol)
+                if price is not None:
+                    self.hits += 1
+                    prices[symbol] = price
+                elif symbol in self.in_flight:
+                    self.coalesced += 1
+                    waiting[symbol] = self.in_flight[symbol]
+                else:
+                    self.misses += 1
+                    owned[symbol] = self.in_flight[symbol] = Future()
+            if owned:
+                self.requests += 1
+        if owned:
+            fetched = {}  # Symbol -> price once the fetch answered
+            error = None  # Exception the fetch raised, handed to the waiting callers
+            try:
+                fetched = self.fetch_quotes(list(owned))
+            except Exception as fetch_error:
+                error = fetch_error
+                raise
+            finally:  # Even on an interrupt or a cancellation, or every later caller would wait forever
+                self.finish(owned, fetched, error)
+            prices.update(fetched)
+        for symbol, future in waiting.items():
+            try:
+                prices[symbol] = future.result()
+            except Exception:  # The other caller's fetch failed, leave the symbol out like a missing one
+                continue
+        return prices
+
+    def cached_price(self, stock_symbol):
+        """Returns the cached price of a symbol if it is younger than the TTL, otherwise None. Call with the lock held.
+        :param stock_symbol: str
+        :rtype: float
+        """
+        quote = self.quotes.get(stock_symbol)
+        if quote is not None and self.clock() - quote[1] < self.ttl:
+            return quote[0]
+        return None
+
+    def finish(self, futures, prices, error=None):
+        """Stores fetched prices, releases the in flight entries & wakes up the waiting callers
+        :param futures: dict symbol -> Future
+        :param prices: dict symbol -> price
+        :param error: optional exception the fetch raised, symbols without a price get a KeyError otherwise
+        """
+        fetched_at = self.clock()
+        with self.lock:
+            for symbol, future in futures.items():
+                self.in_flight.pop(symbol, None)
+                if symbol in prices:
+                    self.quotes[symbol] = (prices[symbol], fetched_at)
+        for symbol, future in futures.items():
+            if symbol in prices:
+                future.set_result(prices[symbol])
+            else:
+                future.set_exception(error if error is not None else KeyError(symbol))
+
+    def invalidate(self, stock_symbol=None):
+        """Drops one symbol's quote, or every quote when no symbol is given
+        :param stock_symbol: optional str
+        """
+        with self.lock:
+            if stock_symbol is None:
+                self.quotes.clear()
+            else:
+                self.quotes.pop(stock_symbol, None)
+
+    def get_stats(self):
+        """Returns the cache counters & the hit rate
+        :rtype: dict
+        """
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                    'requests': self.requests, 'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0}
+
+
+default_quote_service = QuoteService()  # Shared by every profile in the process
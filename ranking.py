@@ -0,0 +1,155 @@
+# Import necessary modules
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Composite ranking key, most important first: (column, ascending). Heaviest reputation, then the best fitting model,
+# then the best growth
+RANKING_KEYS = [('Reputation Weight', False), ('R Squared', False), ('Average Growth', False),
+                ('Growth Percentage Coefficient', False)]
+TIE_BREAKERS = ['first', 'ticker']  # Rows tied on every key: earliest row first, or alphabetical ticker first
+
+
+def score_columns(dataframe, keys=RANKING_KEYS):
+    """Returns one float array per key where bigger is better; missing values rank last
+    :param dataframe: pandas dataframe
+    :param keys: list of (column, ascending)
+    :rtype: list of numpy arrays
+    """
+    columns = []
+    for column, ascending in keys:
+        scores = dataframe[column].to_numpy(dtype=float, na_value=np.nan)
+        scores = -scores if ascending else scores.copy()
+        scores[np.isnan(scores)] = -np.inf
+        columns.append(scores)
+    return columns
+
+
+def filter_mask(dataframe, filters=None):
+    """Returns the rows that pass every filter
+    :param dataframe: pandas dataframe
+    :param filters: optional dict column -> (minimum, maximum), either bound may be None; missing values fail
+    :rtype: numpy array of bools
+    """
+    mask = np.ones(len(dataframe), dtype=bool)
+    for column, (minimum, maximum) in (filters or {}).items():
+        values = dataframe[column].to_numpy(dtype=float, na_value=np.nan)
+        mask &= ~np.isnan(values)
+        if minimum is not None:
+            mask &= values >= minimum
+        if maximum is not None:
+            mask &= values <= maximum
+    return mask
+
+
+def tie_order(dataframe, tie_breaker='first'):
+    """Returns an int per row, smaller wins a tie on every key
+    :param dataframe: pandas dataframe
+    :param tie_breaker: str, one of TIE_BREAKERS
+    :rtype: numpy array
+    """
+    if tie_breaker == 'first':
+        return np.arange(len(dataframe))
+    if tie_breaker == 'ticker':
+        return pd.factorize(dataframe['Ticker'], sort=True)[0]
+    raise ValueError('Unknown tie breaker %r, expected one of %s' % (tie_breaker, TIE_BREAKERS))
+
+
+def top_k_positions(scores, k, order, mask=None):
+    """Returns the row positions of the k best rows, best first, in O(n). Each key narrows the candidates with one
+    partial selection: rows above the k-th best value are in, rows below are out, & only the rows tied with it go on to
+    the next key; whatever is still tied after the last key is decided by the tie order. Only the k winners are
+    sorted.
+    :param scores: list of numpy arrays from score_columns, most important first
+    :param k: int
+    :param order: numpy array from tie_order
+    :param mask: optional numpy array of bools, rows allowed to rank
+    :rtype: numpy array
+    """
+    candidates = np.arange(len(order)) if mask is None else np.flatnonzero(mask)
+    winners = []  # Rows known to be in the top k
+    remaining = k  # Places still open
+    for key_scores in scores:
+        if len(candidates) <= remaining or not remaining:
+            break
+        values = key_scores[candidates]
+        kth_best = np.partition(values, len(values) - remaining)[len(values) - remaining]
+        above = values > kth_best
+        winners.append(candidates[above])
+        remaining -= int(above.sum())
+        candidates = candidates[values == kth_best]  # Tied with the k-th best, decided by the next key
+    if len(candidates) > remaining:
+        candidates = candidates[np.argpartition(order[candidates], remaining - 1)[:remaining]] if remaining else \
+            candidates[:0]
+    chosen = np.concatenate(winners + [candidates])
+    # Sort the winners only: lexsort treats its last key as the primary one
+    return chosen[np.lexsort([order[chosen]] + [-key_scores[chosen] for key_scores in reversed(scores)])]
+
+
+def top_k(dataframe, k=1, keys=RANKING_KEYS, tie_breaker='first', filters=None):
+    """Returns the k best rows of a stock performance dataframe by the composite key, best first
+    :param dataframe: pandas dataframe from main.build_ridge_analysis_dataframe
+    :param k: int
+    :param keys: list of (column, ascending), most important first
+    :param tie_breaker: str, one of TIE_BREAKERS
+    :param filters: optional dict column -> (minimum, maximum), e.g. {'R Squared': (0.2, None)}
+    :rtype: pandas dataframe
+    """
+    positions = top_k_positions(score_columns(dataframe, keys), max(int(k), 0), tie_order(dataframe, tie_breaker),
+                                filter_mask(dataframe, filters) if filters else None)
+    return dataframe.iloc[positions]
+
+
+class Leaderboard:
+    """Class that keeps the latest scores of every ticker seen & the top of the ranking over them, saved to a JSON file
+    so it survives restarts. An update only replaces the scores of the tickers it brings, so partial refreshes keep
+    the rest of the board."""
+
+    def __init__(self, path='leaderboard.json', size=10, keys=RANKING_KEYS, tie_breaker='first', filters=None):
+        self.path = path  # JSON file of the board
+        self.size = size  # Entries on the board
+        self.keys = keys  # Composite ranking key
+        self.tie_breaker = tie_breaker  # Rows tied on every key
+        self.filters = filters  # Rows allowed on the board
+        self.scores = pd.DataFrame(columns=['Ticker'] + [column for column, _ascending in keys] + ['Updated'])
+        self.board = []  # Tickers on the board, best first
+        if os.path.exists(path):
+            self.load()
+
+    def update(self, dataframe, timestamp=None):
+        """Replaces the scores of the dataframe's tickers, re-ranks & saves. Returns the board.
+        :param dataframe: pandas dataframe with Ticker & the key columns
+        :param timestamp: optional timestamp of the scores, defaults to now
+        :rtype: pandas dataframe
+        """
+        timestamp = pd.Timestamp.now(tz='UTC') if timestamp is None else pd.Timestamp(timestamp)
+        fresh = dataframe[['Ticker'] + [column for column, _ascending in self.keys]].copy()
+        fresh['Updated'] = timestamp.isoformat()
+        kept = self.scores[~self.scores['Ticker'].isin(fresh['Ticker'])]
+        self.scores = pd.concat([kept, fresh], ignore_index=True) if len(kept) else fresh.reset_index(drop=True)
+        self.board = list(top_k(self.scores, self.size, self.keys, self.tie_breaker, self.filters)['Ticker'])
+        self.save()
+        return self.get_board()
+
+    def get_board(self):
+        """Returns the board, best first, with each ticker's rank & latest scores
+        :rtype: pandas dataframe
+        """
+        board = self.scores.set_index('Ticker').loc[self.board].reset_index()
+        board.insert(0, 'Rank', np.arange(1, len(board) + 1))
+        return board
+
+    def save(self):
+        """Writes the board atomically"""
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'board': self.board, 'scores': self.scores.to_dict(orient='records')}, file)
+        os.replace(temporary_path, self.path)  # Atomic swap
+
+    def load(self):
+        """Reads the board written by save"""
+        with open(self.path) as file:
+            stored = json.load(file)
+        self.scores = pd.DataFrame(stored['scores'], columns=self.scores.columns)
+        self.board = stored['board']
@@ -0,0 +1,48 @@
+# Import necessary modules
+import numpy as np
+import pandas as pd
+
+
+def batched_ridge_analysis(panel_index, x_values, y_values, reputation_weights, alpha=0.5):
+    """Fits a single feature Ridge model for every ticker at once & returns a dataframe: Ticker, Reputation Weight,
+    Average Growth, R Squared, Growth Percentage Coefficient. The numbers match sklearn's Ridge(alpha).fit(x, y) with
+    fit_intercept, but all tickers are solved in one grouped NumPy pass with the closed form sums.
+    :param panel_index: PanelIndex built over the panel rows
+    :param x_values: array like of floats, the regression feature (timestamps as floats)
+    :param y_values: array like of floats, the regression target (open percent change)
+    :param reputation_weights: array like of floats, averaged per ticker
+    :param alpha: float, Ridge regularization strength
+    :rtype: pandas dataframe
+    """
+    codes = panel_index.codes  # Group code per row, tickers in order of first appearance
+    x_values = np.asarray(x_values, dtype=float)  # Timestamps as floats
+    y_values = np.asarray(y_values, dtype=float)  # Percent changes as floats
+    group_count = len(panel_index)  # Number of tickers we are modeling
+
+    x_mean = panel_index.group_mean(x_values)  # Per ticker mean of x
+    y_mean = panel_index.group_mean(y_values)  # Per ticker mean of y
+    # Center before summing; timestamps are ~1e18 so raw sums of x squared would cancel catastrophically
+    x_centered = x_values - x_mean[codes]
+    y_centered = y_values - y_mean[codes]
+    sxx = np.bincount(codes, weights=x_centered * x_centered, minlength=group_count)  # Sum of squares of x
+    sxy = np.bincount(codes, weights=x_centered * y_centered, minlength=group_count)  # Cross product sum
+    syy = np.bincount(codes, weights=y_centered * y_centered, minlength=group_count)  # Total sum of squares
+
+    slope = sxy / (sxx + alpha)  # Ridge penalizes the slope only, the intercept is left free
+    # Residual sum of squares expanded around the means: sum((yc - b * xc) ** 2)
+    residual = np.maximum(syy - 2 * slope * sxy + slope * slope * sxx, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_squared = 1 - residual / syy
+    # Mirror sklearn's r2_score for a constant target: perfect fit scores 1, anything else scores 0
+    constant_target = syy == 0
+    r_squared[constant_target] = np.where(residual[constant_target] == 0, 1.0, 0.0)
+
+    reputation = panel_index.group_mean(reputation_weights)  # Mean reputation
+    median = panel_index.group_median(y_values)  # Median percent change per ticker
+
+    # Same layout as the original per ticker loop
+    return pd.DataFrame({'Ticker': panel_index.tickers,
+                         'Reputation Weight': reputation,
+                         'Average Growth': median,
+                         'R Squared': r_squared,
+                         'Growth Percentage Coefficient': slope})
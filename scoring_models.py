@@ -0,0 +1,265 @@
+"""Scoring models that rank the stocks from the panel, every ticker at once. A model declares the panel columns it reads
+in required_columns, so the fetch keeps only those, & its score returns one row per ticker: Ticker, Reputation Weight,
+Score & the model's own columns, in the layout recommend_top_stock ranks by the model's ranking_keys. The model the
+live cycle uses is picked by name in main.SCORING_MODEL:
+    model = scoring_models.build_scoring_model('ewma_momentum', span=5)
+    analysis = model.score(panel, panel_index)"""
+# Import necessary modules
+import numpy as np
+import pandas as pd
+import ranking
+import regression_engine
+from panel_index import PanelIndex
+
+# Relative spread under which a window counts as flat, far below a one cent move on any traded price
+FLAT_WINDOW_TOLERANCE = 1e-9
+# Composite ranking key of the models that only have a Score: heaviest reputation first, then the best score
+SCORE_RANKING_KEYS = [('Reputation Weight', False), ('Score', False)]
+
+
+class ScoringModel:
+    """Base class of the scoring models. Subclasses set name, ranking_keys & required_columns & implement analyze, which
+    works on whole columns with the PanelIndex groups, never a Python loop per ticker."""
+    name = None  # Name in SCORING_MODELS
+    ranking_keys = SCORE_RANKING_KEYS  # Composite key recommend_top_stock ranks the analysis by
+
+    def __init__(self, column='Open'):
+        """
+        :param column: str, price column the model reads
+        """
+        self.column = column  # Price column the returns are taken from
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % item for item in vars(self).items()))
+
+    @property
+    def required_columns(self):
+        """Returns the panel value columns the model reads, besides Date, Ticker & Reputation Weight
+        :rtype: list of str
+        """
+        return [self.column]
+
+    def score(self, panel, panel_index=None):
+        """Returns the analysis dataframe of the panel, one row per ticker in order of first appearance, carrying the
+        model's ranking keys in its attrs
+        :param panel: pandas dataframe, long panel with Date, Ticker, Reputation Weight & the required columns
+        :param panel_index: PanelIndex over the panel rows, built here if not given
+        :rtype: pandas dataframe
+        """
+        missing = [column for column in self.required_columns + ['Reputation Weight'] if column not in panel]
+        if missing:
+            raise ValueError('%s needs the panel columns %s' % (self.name, ', '.join(missing)))
+        if panel_index is None:
+            panel_index = PanelIndex.from_dataframe(panel)  # Group the rows by ticker once
+        analysis = self.analyze(panel, panel_index)
+        analysis.attrs['ranking_keys'] = self.ranking_keys
+        analysis.attrs['scoring_model'] = self.name
+        return analysis
+
+    def analyze(self, panel, panel_index):
+        """Returns the analysis dataframe
+        :param panel: pandas dataframe
+        :param panel_index: PanelIndex
+        :rtype: pandas dataframe
+        """
+        raise NotImplementedError
+
+    def percent_returns(self, panel, panel_index):
+        """Returns the one bar percent change of the price column in original row order, NaN on each ticker's first row
+        :param panel: pandas dataframe
+        :param panel_index: PanelIndex
+        :rtype: numpy array
+        """
+        return panel_index.group_pct_change(panel[self.column].values) * 100
+
+    def scores_dataframe(self, panel, panel_index, scores, **columns):
+        """Returns the analysis dataframe layout: Ticker, Reputation Weight, Score & any extra columns
+        :param panel: pandas dataframe
+        :param panel_index: PanelIndex
+        :param scores: numpy array, one per ticker
+        :param columns: extra columns, one numpy array per ticker each
+        :rtype: pandas dataframe
+        """
+        data = {'Ticker': panel_index.tickers,
+                'Reputation Weight': panel_index.group_mean(panel['Reputation Weight'].values),
+                'Score': scores}
+        data.update(columns)
+        return pd.DataFrame(data)
+
+
+class RidgeSlopeModel(ScoringModel):
+    """Model the strategy has always ranked by: a single feature Ridge fit of the open percent change on the bar time,
+    solved for every ticker in one grouped pass by regression_engine. Its analysis keeps the Average Growth, R Squared
+    & Growth Percentage Coefficient columns & is ranked by ranking.RANKING_KEYS; the Score is the slope."""
+    name = 'ridge'
+    ranking_keys = ranking.RANKING_KEYS
+
+    def __init__(self, alpha=0.5, column='Open', time_unit='ns'):
+        """
+        :param alpha: float, Ridge regularization strength, 0 is ordinary least squares
+        :param column: str, price column the percent changes are taken from
+        :param time_unit: str, pandas unit of the x values, e.g. 'min'. In nanoseconds a 15 bar window's centered sum
+            of squares is about 1e24, so any alpha of a sensible size changes nothing; in minutes it is 280
+        """
+        super().__init__(column)
+        self.alpha = alpha  # Regularization strength
+        self.time_unit = time_unit  # Unit the bar times are measured in
+
+    def analyze(self, panel, panel_index):
+        percent_change = self.percent_returns(panel, panel_index)
+        percent_change[np.isnan(percent_change)] = 0  # Each ticker's first bar counts as no change
+        # Bar times in time units since the first bar, the Ridge x; the fit has an intercept, so only the unit matters
+        timestamps = panel['Date'].values.astype('datetime64[ns]').astype(np.int64)
+        x_values = (timestamps - timestamps.min()).astype(float) if len(timestamps) else timestamps.astype(float)
+        if self.time_unit != 'ns':
+            x_values /= pd.Timedelta(1, unit=self.time_unit).value
+        analysis = regression_engine.batched_ridge_analysis(
+            panel_index,  # Ticker grouping of the rows
+            x_values,
+            percent_change,  # Percent changes, the Ridge y
+            panel['Reputation Weight'].values,  # Reputation weight, averaged per ticker
+            alpha=self.alpha)
+        analysis['Score'] = analysis['Growth Percentage Coefficient']
+        return analysis
+
+
+class OLSSlopeModel(RidgeSlopeModel):
+    """Ridge slope model without the regularization, the ordinary least squares trend of the percent change"""
+    name = 'ols'
+
+    def __init__(self, column='Open', time_unit='ns'):
+        """
+        :param column: str, price column the percent changes are taken from
+        :param time_unit: str, pandas unit of the x values, the slope is in percent per unit
+        """
+        super().__init__(alpha=0.0, column=column, time_unit=time_unit)
+
+
+class EWMAMomentumModel(ScoringModel):
+    """Model that scores each ticker by the exponentially weighted mean of its one bar percent returns, the latest bars
+    weighing most. Matches groupby(...).ewm(span=span).mean() at each ticker's last row, computed for all tickers with
+    two weighted sums."""
+    name = 'ewma_momentum'
+
+    def __init__(self, span=5, column='Open'):
+        """
+        :param span: float, decay in bars, the weight of a bar shrinks by (span - 1) / (span + 1) per newer bar
+        :param column: str, price column the returns are taken from
+        """
+        super().__init__(column)
+        self.span = span  # Decay span in bars
+
+    def analyze(self, panel, panel_index):
+        returns = panel_index.take(self.percent_returns(panel, panel_index))  # Sorted order, grouped by ticker
+        decay = 1 - 2.0 / (self.span + 1)
+        weights = decay ** sorted_ages(panel_index)  # The latest bar of every ticker weighs 1
+        missing = np.isnan(returns)
+        weights[missing] = 0
+        returns[missing] = 0
+        codes = panel_index.sorted_codes()
+        group_count = len(panel_index)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            momentum = np.bincount(codes, weights=weights * returns, minlength=group_count) / \
+                np.bincount(codes, weights=weights, minlength=group_count)
+        return self.scores_dataframe(panel, panel_index, momentum)
+
+
+class RollingZScoreModel(ScoringModel):
+    """Model that scores each ticker by how far its latest price sits above the mean of its last window prices, in
+    standard deviations of that window. Matches groupby(...).rolling(window, min_periods=2) at each ticker's last
+    row; a window without any spread scores 0."""
+    name = 'rolling_zscore'
+
+    def __init__(self, window=10, column='Open'):
+        """
+        :param window: int, bars in the window, the latest included
+        :param column: str, price column the z score is taken of
+        """
+        super().__init__(column)
+        self.window = window  # Bars per window
+
+    def analyze(self, panel, panel_index):
+        # Sorted order, missing prices carry the ticker's last price forward
+        filled = panel_index.group_forward_fill(panel_index.take(panel[self.column].values).astype(float))
+        latest = filled[panel_index.offsets[1:] - 1]  # Price at each ticker's last row
+        in_window = (sorted_ages(panel_index) < self.window) & ~np.isnan(filled)
+        codes = panel_index.sorted_codes()[in_window]
+        prices = filled[in_window]
+        group_count = len(panel_index)
+        observations = np.bincount(codes, minlength=group_count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.bincount(codes, weights=prices, minlength=group_count) / observations
+            centered = prices - mean[codes]  # Center first, prices are large next to their spread
+            deviation = np.sqrt(np.bincount(codes, weights=centered * centered, minlength=group_count) /
+                                (observations - 1))
+            z_score = (latest - mean) / deviation
+        # A flat window is neither above nor below its mean; its spread is rounding noise, not exactly 0, so compare it
+        # to the price
+        z_score[deviation <= FLAT_WINDOW_TOLERANCE * np.abs(mean)] = 0.0
+        z_score[observations < 2] = np.nan
+        return self.scores_dataframe(panel, panel_index, z_score, **{'Window Mean': mean,
+                                                                     'Window Standard Deviation': deviation})
+
+
+class VolumeWeightedReturnModel(ScoringModel):
+    """Model that scores each ticker by its one bar percent returns averaged with the bar volumes as weights, so moves
+    on heavy trading count for more. Bars without a return or a volume are left out; a ticker with no volume at all
+    has no score & ranks last."""
+    name = 'volume_weighted_return'
+
+    def __init__(self, column='Open', volume_column='Volume'):
+        """
+        :param column: str, price column the returns are taken from
+        :param volume_column: str, column of the bar volumes
+        """
+        super().__init__(column)
+        self.volume_column = volume_column  # Bar volumes, the weights
+
+    @property
+    def required_columns(self):
+        return [self.column, self.volume_column]
+
+    def analyze(self, panel, panel_index):
+        returns = self.percent_returns(panel, panel_index)
+        volumes = panel[self.volume_column].to_numpy(dtype=float, na_value=np.nan)
+        volumes = np.where(np.isnan(returns) | np.isnan(volumes), 0, volumes)
+        returns = np.where(volumes == 0, 0, returns)
+        total_volume = panel_index.group_sum(volumes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weighted = panel_index.group_sum(returns * volumes) / total_volume
+        return self.scores_dataframe(panel, panel_index, weighted, **{'Total Volume': total_volume})
+
+
+# Name -> scoring model class, the names main.SCORING_MODEL & the command lines accept
+SCORING_MODELS = {model.name: model for model in [RidgeSlopeModel, OLSSlopeModel, EWMAMomentumModel,
+                                                  RollingZScoreModel, VolumeWeightedReturnModel]}
+
+
+def build_scoring_model(name, **parameters):
+    """Returns the scoring model registered under name, built with the parameters
+    :param name: str, one of SCORING_MODELS
+    :param parameters: keyword arguments of the model, e.g. span=5
+    :rtype: ScoringModel
+    """
+    if name not in SCORING_MODELS:
+        raise ValueError('Unknown scoring model %r, expected one of %s' % (name, ', '.join(SCORING_MODELS)))
+    return SCORING_MODELS[name](**parameters)
+
+
+def ranking_keys(dataframe):
+    """Returns the ranking keys of an analysis dataframe: the ones its scoring model declared, or the Ridge layout's for
+    dataframes built elsewhere, e.g. by streaming_stats
+    :param dataframe: pandas dataframe
+    :rtype: list of (column, ascending)
+    """
+    return dataframe.attrs.get('ranking_keys', ranking.RANKING_KEYS)
+
+
+def sorted_ages(panel_index):
+    """Returns, for every position of the sorted order, how many newer rows its ticker has: 0 for each ticker's latest
+    row. Rows keep their time order inside a ticker.
+    :param panel_index: PanelIndex
+    :rtype: numpy array
+    """
+    ends = np.repeat(panel_index.offsets[1:], panel_index.counts)  # Sorted position after each ticker's last row
+    return ends - 1 - np.arange(len(ends))
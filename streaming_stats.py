@@ -0,0 +1,301 @@
+# Import necessary modules
+import heapq
+from collections import deque
+import numpy as np
+import pandas as pd
+
+REBASE_EVERY = 1024  # Updates between exact recomputations of a ticker's running sums
+
+
+class RollingMedian:
+    """Class that keeps the median of a sliding window of values. The lower half lives in a max heap & the upper half
+    in a min heap; removed values are deleted lazily when they surface at the top of a heap, so adding & removing are
+    O(log n) and the median is O(1)."""
+
+    def __init__(self):
+        self.lower = []  # Max heap of the lower half, values negated
+        self.upper = []  # Min heap of the upper half
+        self.lower_size = 0  # Live values in the lower half
+        self.upper_size = 0  # Live values in the upper half
+        self.delayed = {}  # Value -> number of pending lazy deletions
+
+    def __len__(self):
+        return self.lower_size + self.upper_size
+
+    def add(self, value):
+        """Adds a value to the window
+        :param value: float
+        """
+        if not self.lower or value <= -self.lower[0]:
+            heapq.heappush(self.lower, -value)
+            self.lower_size += 1
+        else:
+            heapq.heappush(self.upper, value)
+            self.upper_size += 1
+        self.rebalance()
+
+    def remove(self, value):
+        """Removes a value that is in the window
+        :param value: float
+        """
+        self.delayed[value] = self.delayed.get(value, 0) + 1
+        if self.lower and value <= -self.lower[0]:
+            self.lower_size -= 1
+            if value == -self.lower[0]:
+                self.prune(self.lower, -1)
+        else:
+            self.upper_size -= 1
+            if self.upper and value == self.upper[0]:
+                self.prune(self.upper, 1)
+        self.rebalance()
+
+    def median(self):
+        """Returns the median of the window, NaN when it is empty
+        :rtype: float
+        """
+        if not len(self):
+            return np.nan
+        if self.lower_size > self.upper_size:
+            return -self.lower[0]
+        return (-self.lower[0] + self.upper[0]) / 2
+
+    def prune(self, heap, sign):
+        """Pops lazily deleted values off the top of a heap
+        :param heap: list
+        :param sign: -1 for the negated lower heap, 1 for the upper heap
+        """
+        while heap:
+            value = sign * heap[0]
+            if not self.delayed.get(value):
+                break
+            self.delayed[value] -= 1
+            if not self.delayed[value]:
+                del self.delayed[value]
+            heapq.heappop(heap)
+
+    def rebalance(self):
+        """Keeps the lower half equal to or one bigger than the upper half"""
+        if self.lower_size > self.upper_size + 1:
+            heapq.heappush(self.upper, -heapq.heappop(self.lower))
+            self.lower_size -= 1
+            self.upper_size += 1
+            self.prune(self.lower, -1)
+        elif self.lower_size < self.upper_size:
+            heapq.heappush(self.lower, -heapq.heappop(self.upper))
+            self.upper_size -= 1
+            self.lower_size += 1
+            self.prune(self.upper, 1)
+
+
+class TickerWindow:
+    """Class that keeps one ticker's sliding window of (timestamp, percent change) bars with the running sums of the
+    Ridge closed form & a rolling median. Timestamps are kept relative to an origin inside the window so the sums of
+    squares stay small; the origin moves up & the sums are recomputed exactly every REBASE_EVERY updates."""
+
+    def __init__(self, reputation=np.nan):
+        self.bars = deque()  # (timestamp in ns, percent change, has open) of every bar in the window, oldest first
+        self.median = RollingMedian()  # Median of the percent changes in the window
+        self.reputation = reputation  # Reputation weight of the ticker
+        self.last_open = np.nan  # Last valid open, the base of the next percent change
+        self.origin = None  # Timestamp the x values are measured from
+        self.updates = 0  # Updates since the last exact recomputation
+        self.count = 0
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_xy = self.sum_yy = 0.0
+
+    def add_to_sums(self, timestamp, percent_change, sign):
+        """Adds (sign 1) or removes (sign -1) one bar's terms from the running sums
+        :param timestamp: int, ns
+        :param percent_change: float
+        :param sign: int
+        """
+        x = float(timestamp - self.origin)
+        self.count += sign
+        self.sum_x += sign * x
+        self.sum_y += sign * percent_change
+        self.sum_xx += sign * x * x
+        self.sum_xy += sign * x * percent_change
+        self.sum_yy += sign * percent_change * percent_change
+
+    def append(self, timestamp, open_price, window_start):
+        """Adds a new bar & drops the bars that fell out of the window
+        :param timestamp: int, ns, newer than every bar in the window
+        :param open_price: float, NaN when the bar has no open
+        :param window_start: int, ns, bars older than it expire
+        """
+        # Percent change against the last valid open, like the forward filled pct_change of the batch path
+        if np.isnan(open_price) or np.isnan(self.last_open) or not self.bars:
+            percent_change = 0.0  # No base to compare against, the batch path fills this with 0
+        else:
+            percent_change = (open_price / self.last_open - 1) * 100
+        if not np.isnan(open_price):
+            self.last_open = open_price
+        if self.origin is None:
+            self.origin = timestamp
+        self.bars.append((timestamp, percent_change, not np.isnan(open_price)))
+        self.add_to_sums(timestamp, percent_change, 1)
+        self.median.add(percent_change)
+        self.expire(window_start)
+
+        self.updates += 1
+        if self.updates >= REBASE_EVERY:
+            self.rebase()
+
+    def expire(self, window_start):
+        """Drops the bars older than the window start
+        :param window_start: int, ns
+        :rtype: bool, True if any bar expired
+        """
+        expired = False
+        while self.bars and self.bars[0][0] < window_start:
+            old_timestamp, old_change, _has_open = self.bars.popleft()
+            self.add_to_sums(old_timestamp, old_change, -1)
+            self.median.remove(old_change)
+            expired = True
+        if expired:
+            self.zero_first_change()
+        return expired
+
+    def zero_first_change(self):
+        """Zeroes the change of the first bar with an open in the window. Its base open just expired, & the batch path,
+        which only sees the window, has no base for it either & fills its change with 0. Bars before it have no open
+        & already carry a 0 change."""
+        for position, (timestamp, percent_change, has_open) in enumerate(self.bars):
+            if not has_open:
+                continue
+            if percent_change != 0.0:
+                self.add_to_sums(timestamp, percent_change, -1)
+                self.add_to_sums(timestamp, 0.0, 1)
+                self.median.remove(percent_change)
+                self.median.add(0.0)
+                self.bars[position] = (timestamp, 0.0, has_open)
+            break
+
+    def rebase(self):
+        """Moves the origin to the oldest bar & recomputes the sums exactly, clearing any accumulated rounding"""
+        self.origin = self.bars[0][0] if self.bars else None
+        self.count = 0
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_xy = self.sum_yy = 0.0
+        for timestamp, percent_change, _has_open in self.bars:
+            self.add_to_sums(timestamp, percent_change, 1)
+        self.updates = 0
+
+    def statistics(self, alpha=0.5):
+        """Returns the window's (median, R squared, Ridge slope), the same numbers as the batch Ridge analysis
+        :param alpha: float, Ridge regularization strength
+        :rtype: tuple
+        """
+        if not self.count:
+            return np.nan, np.nan, np.nan
+        sxx = max(self.sum_xx - self.sum_x * self.sum_x / self.count, 0.0)  # Centered sum of squares of x
+        sxy = self.sum_xy - self.sum_x * self.sum_y / self.count  # Centered cross product
+        syy = max(self.sum_yy - self.sum_y * self.sum_y / self.count, 0.0)  # Centered total sum of squares
+        slope = sxy / (sxx + alpha)
+        residual = max(syy - 2 * slope * sxy + slope * slope * sxx, 0.0)
+        if syy == 0:  # Constant target, sklearn scores a perfect fit 1 & anything else 0
+            r_squared = 1.0 if residual == 0 else 0.0
+        else:
+            r_squared = 1 - residual / syy
+        return self.median.median(), r_squared, slope
+
+
+class StreamingRegressionEngine:
+    """Class that keeps the Ridge analysis of every ticker up to date one bar at a time. Adding a bar updates its
+    ticker's running sums & rolling median in O(log n), so the ranking is available right after each bar instead of
+    after a full recompute of the window. A ticker that stops receiving bars has its window expired against the newest
+    bar of any ticker, & leaves the analysis once nothing of it is left. The backtester's streaming option & the
+    daemon's --streaming rank through it."""
+
+    def __init__(self, window=pd.Timedelta(minutes=15), alpha=0.5):
+        self.window = pd.Timedelta(window).value  # Window length in ns
+        self.alpha = alpha  # Ridge regularization strength
+        self.windows = {}  # Ticker -> TickerWindow, in order of first appearance
+        self.latest = None  # Newest bar timestamp of any ticker, in ns
+
+    def update(self, ticker, timestamp, open_price, reputation=None):
+        """Adds one bar of a ticker. Bars at or before the ticker's newest bar are ignored.
+        :param ticker: str
+        :param timestamp: int ns or datetime like
+        :param open_price: float
+        :param reputation: optional float, sets the ticker's reputation weight
+        :rtype: bool, True if the bar was added
+        """
+        timestamp = timestamp if isinstance(timestamp, (int, np.integer)) else pd.Timestamp(timestamp).value
+        ticker_window = self.windows.get(ticker)
+        if ticker_window is None:
+            ticker_window = self.windows[ticker] = TickerWindow()
+        if reputation is not None:
+            ticker_window.reputation = reputation
+        if ticker_window.bars and timestamp <= ticker_window.bars[-1][0]:
+            return False  # Already seen
+        ticker_window.append(int(timestamp), float(open_price), int(timestamp) - self.window)
+        self.latest = int(timestamp) if self.latest is None else max(self.latest, int(timestamp))
+        return True
+
+    def expire(self, now=None):
+        """Drops every ticker's bars that are older than the window ending at now, & the tickers left without bars
+        :param now: optional int ns or datetime like, the newest bar seen by default
+        :rtype: int, the number of tickers dropped
+        """
+        if now is None:
+            now = self.latest
+        if now is None:
+            return 0
+        now = now if isinstance(now, (int, np.integer)) else pd.Timestamp(now).value
+        window_start = int(now) - self.window
+        dropped = 0
+        for ticker in list(self.windows):
+            ticker_window = self.windows[ticker]
+            if not ticker_window.expire(window_start):
+                continue
+            if not ticker_window.bars:
+                del self.windows[ticker]
+                dropped += 1
+            else:
+                # Only stale tickers expire here; with no bars coming to rebase them, remove the rounding the expired
+                # bars left in the sums of the few that remain
+                ticker_window.rebase()
+        return dropped
+
+    def ingest_panel(self, panel):
+        """Adds every bar of a long panel dataframe that is newer than what the engine has seen, in time order
+        :param panel: pandas dataframe with Date, Ticker, Open & optionally Reputation Weight
+        :rtype: int, the number of bars added
+        """
+        panel = panel.sort_values('Date', kind='stable')
+        timestamps = pd.to_datetime(panel['Date']).values.astype('datetime64[ns]').astype(np.int64)
+        reputations = panel['Reputation Weight'].values if 'Reputation Weight' in panel else [None] * len(panel)
+        added = 0
+        for ticker, timestamp, open_price, reputation in zip(panel['Ticker'].values, timestamps,
+                                                            panel['Open'].values, reputations):
+            added += self.update(ticker, timestamp, open_price, reputation)
+        return added
+
+    def statistics(self, ticker):
+        """Returns one ticker's (median, R squared, Ridge slope)
+        :param ticker: str
+        :rtype: tuple
+        """
+        return self.windows[ticker].statistics(self.alpha)
+
+    def snapshot(self, now=None, order=None):
+        """Returns the current analysis in the layout of main.build_ridge_analysis_dataframe: Ticker, Reputation Weight,
+        Average Growth, R Squared, Growth Percentage Coefficient. Windows are expired first; rows are ordered by each
+        ticker's oldest bar in the window, like the first appearances in a time ordered panel, so ranking ties break
+        the same way.
+        :param now: optional int ns or datetime like, end of the window, the newest bar seen by default
+        :param order: optional dict ticker -> int, breaks ties between windows starting at the same bar, e.g. the
+            column order of a panel; the order of first appearance by default
+        :rtype: pandas dataframe
+        """
+        self.expire(now)
+        if order is None:
+            tickers = sorted(self.windows, key=lambda ticker: self.windows[ticker].bars[0][0])  # Stable sort
+        else:
+            tickers = sorted(self.windows, key=lambda ticker: (self.windows[ticker].bars[0][0], order[ticker]))
+        statistics = np.array([self.windows[ticker].statistics(self.alpha) for ticker in tickers],
+                              dtype=float).reshape(-1, 3)
+        return pd.DataFrame({'Ticker': tickers,
+                             'Reputation Weight': [self.windows[ticker].reputation for ticker in tickers],
+                             'Average Growth': statistics[:, 0],
+                             'R Squared': statistics[:, 1],
+                             'Growth Percentage Coefficient': statistics[:, 2]})
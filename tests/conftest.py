@@ -0,0 +1,15 @@
+"""Shared setup of the tests: the repo modules are importable & every test runs in its own temporary directory, so the
+profile snapshots & ledgers it writes never land in the repository"""
+# Import necessary modules
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Make the repo modules importable
+
+
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    """Runs the test inside a fresh temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
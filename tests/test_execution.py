@@ -0,0 +1,63 @@
+"""Checks the SimulatedBroker's partial fills & how the ExecutionManager applies them to a profile"""
+# Import necessary modules
+import asyncio
+import pytest
+import execution
+import profile_class
+
+PRICES = {'AAA': 100.0}
+
+
+def run(coroutine):
+    """Runs a coroutine on a fresh event loop & returns its result"""
+    return asyncio.run(coroutine)
+
+
+def test_order_fills_in_pieces():
+    async def scenario():
+        broker = execution.SimulatedBroker(PRICES.get, latency=0, slippage=0.001, partial_fills=3, fill_interval=0)
+        events = []
+        broker.add_listener(events.append)
+        order = await broker.submit(execution.Order('AAA', 'buy', amount=900.0))
+        await broker.wait(order.order_id, timeout=5)
+        return order, events
+    order, events = run(scenario())
+    assert [event.state for event in events] == ['submitted', 'partially_filled', 'partially_filled', 'filled']
+    assert [event.fill_price for event in events[1:]] == [pytest.approx(100.1)] * 3
+    assert sum(event.fill_quantity for event in events) == pytest.approx(order.filled_quantity)
+    assert order.filled_amount == pytest.approx(900.0)
+    assert order.get_average_price() == pytest.approx(100.1)
+
+
+def test_cancel_part_way_keeps_the_filled_pieces():
+    async def scenario():
+        profile = profile_class.Profile('tester')
+        profile.set_price_source(PRICES.get)
+        profile.set_cash(1000.0)
+        # An awaitable price source, the way the daemon prices fills off the event loop
+        broker = execution.SimulatedBroker(execution.threaded_price_source(profile.get_current_price), latency=0,
+                                           slippage=0, partial_fills=4, fill_interval=0.2)
+        manager = execution.ExecutionManager(broker)
+        order = await manager.buy(profile, 'AAA', 1000.0)
+        while not order.filled_quantity:
+            await asyncio.sleep(0.01)
+        await broker.cancel(order.order_id)
+        await broker.wait(order.order_id, timeout=5)
+        await broker.close()
+        return profile, order, manager
+    profile, order, manager = run(scenario())
+    assert order.state == 'cancelled'
+    assert order.filled_quantity == pytest.approx(2.5)  # One piece of four
+    assert not manager.has_working_order(profile)
+    assert not profile.get_pending_purchase()
+    assert profile.get_current_stock_holding() == 'AAA'
+    assert profile.get_current_number_of_shares() == pytest.approx(2.5)
+    assert profile.get_cash() == pytest.approx(750.0)  # Only what was bought is spent
+
+
+def test_symbol_without_a_price_is_rejected():
+    async def scenario():
+        broker = execution.SimulatedBroker(PRICES.get, latency=0)
+        order = await broker.submit(execution.Order('ZZZ', 'sell', quantity=1.0))
+        return await broker.wait(order.order_id, timeout=5)
+    assert run(scenario()).state == 'rejected'
@@ -0,0 +1,57 @@
+"""Checks the sharded fetcher's retries & re-splitting on the offline stub source"""
+# Import necessary modules
+from market_data_fetcher import ShardedFetcher, StubDataSource
+
+TICKERS = ['T%03d' % number for number in range(40)]
+
+
+class PoisonedSource(StubDataSource):
+    """Stub source whose whole request raises when it holds the poisoned ticker, like a symbol that breaks a batch"""
+
+    def __init__(self, poisoned, **parameters):
+        super().__init__(**parameters)
+        self.poisoned = poisoned  # Ticker that makes a request raise
+        self.chunks = []  # Every chunk asked for
+
+    def fetch(self, tickers, start=None):
+        self.chunks.append(list(tickers))
+        if self.poisoned in tickers:
+            raise ValueError('Bad symbol %s' % self.poisoned)
+        return super().fetch(tickers, start)
+
+
+class MissingSource(StubDataSource):
+    """Stub source that answers without the given tickers, like yahoo does for a symbol it does not know"""
+
+    def __init__(self, missing, **parameters):
+        super().__init__(**parameters)
+        self.missing = set(missing)  # Tickers never returned
+
+    def fetch(self, tickers, start=None):
+        return super().fetch([ticker for ticker in tickers if ticker not in self.missing], start)
+
+
+def test_partly_failed_shard_is_resplit():
+    source = PoisonedSource('T005')
+    result = ShardedFetcher(source, shard_size=20, max_attempts=6, backoff_seconds=0).fetch(TICKERS)
+    assert result.get_failed_tickers() == ['T005']
+    assert set(result.panel['Ticker'].unique()) == set(TICKERS) - {'T005'}
+    assert ['T005'] in source.chunks  # Halved down to the bad symbol alone
+    assert max(stats.attempts for stats in result.shard_stats) == 6
+    assert min(stats.attempts for stats in result.shard_stats) == 1  # The clean shard needed one request
+
+
+def test_missing_tickers_fail_without_retry():
+    source = MissingSource(['T003', 'T031'])
+    result = ShardedFetcher(source, shard_size=20, backoff_seconds=60).fetch(TICKERS)
+    assert sorted(result.get_failed_tickers()) == ['T003', 'T031']
+    assert source.requests == 2  # One per shard, no backoff & no second request
+    assert len(result.panel) == (len(TICKERS) - 2) * source.bars
+
+
+def test_failed_requests_are_retried():
+    source = StubDataSource(failure_rate=0.5, seed=3)
+    result = ShardedFetcher(source, shard_size=10, max_attempts=10, backoff_seconds=0).fetch(TICKERS)
+    assert result.get_failed_tickers() == []
+    assert set(result.panel['Ticker'].unique()) == set(TICKERS)
+    assert source.requests > len(result.shard_stats)  # Some requests failed & were sent again
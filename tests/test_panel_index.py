@@ -0,0 +1,38 @@
+"""Checks the PanelIndex grouped operations against their pandas groupby equivalents"""
+# Import necessary modules
+import numpy as np
+import pandas as pd
+from panel_index import PanelIndex
+
+
+def gappy_panel(ticker_count=20, bars=15, seed=0):
+    """Returns an interleaved panel of random walk opens with missing values, some of them on a ticker's first bars
+    :param ticker_count: int
+    :param bars: int
+    :param seed: int
+    :rtype: pandas dataframe
+    """
+    random_state = np.random.RandomState(seed)
+    opens = 100 + np.cumsum(random_state.normal(0, 0.5, (bars, ticker_count)), axis=0)
+    opens[random_state.random_sample(opens.shape) < 0.15] = np.nan
+    opens[:3, 0] = np.nan  # A ticker that starts without a price
+    return pd.DataFrame({'Ticker': np.tile(['T%02d' % number for number in range(ticker_count)], bars),
+                         'Open': opens.ravel()})
+
+
+def test_group_pct_change_matches_groupby():
+    panel = gappy_panel()
+    # pct_change over the forward filled prices, which pandas before 2.1 did by default
+    filled = panel.groupby('Ticker', sort=False)['Open'].ffill()
+    expected = filled.groupby(panel['Ticker'], sort=False).pct_change()
+    actual = PanelIndex.from_dataframe(panel).group_pct_change(panel['Open'].values)
+    np.testing.assert_allclose(actual, expected.values, rtol=1e-12, equal_nan=True)
+
+
+def test_group_mean_and_median_match_groupby():
+    panel = gappy_panel().dropna()
+    panel_index = PanelIndex.from_dataframe(panel)
+    grouped = panel.groupby('Ticker', sort=False)['Open']
+    assert list(panel_index.tickers) == list(grouped.mean().index)
+    np.testing.assert_allclose(panel_index.group_mean(panel['Open'].values), grouped.mean().values, rtol=1e-12)
+    np.testing.assert_allclose(panel_index.group_median(panel['Open'].values), grouped.median().values, rtol=1e-12)
@@ -0,0 +1,57 @@
+"""Checks the Profile transactions: one write per block & a full roll back when the block raises"""
+# Import necessary modules
+from datetime import datetime, timedelta
+import pytest
+import profile_class
+
+
+def new_profile(cash=100.0):
+    """Returns a saved profile with some cash
+    :param cash: float
+    :rtype: Profile
+    """
+    profile = profile_class.Profile('tester')
+    profile.set_cash(cash)
+    return profile
+
+
+def test_transaction_rolls_back_memory_file_and_ledger():
+    profile = new_profile()
+    with pytest.raises(RuntimeError):
+        with profile.transaction():
+            profile.add_cash(-40)
+            profile.set_pending_purchase(True)
+            profile.ledger.open_trade('AAA', 40, profile.get_current_time())
+            raise RuntimeError('failed half way')
+    assert profile.get_cash() == 100.0
+    assert not profile.get_pending_purchase()
+    assert profile.ledger.trade_count() == 0
+    reloaded = profile_class.load_profile_from_pickle('tester')
+    assert reloaded.get_cash() == 100.0
+    assert reloaded.ledger.trade_count() == 0
+
+
+def test_nested_transactions_write_once(monkeypatch):
+    profile = new_profile()
+    writes = []
+    monkeypatch.setattr(profile_class.Profile, 'write_snapshot', lambda self: writes.append(self.get_cash()))
+    with profile.transaction():
+        profile.add_cash(-10)
+        with profile.transaction():
+            profile.add_cash(-10)
+        profile.add_cash(-10)
+    assert writes == [70.0]
+
+
+def test_failed_order_method_keeps_the_last_commit():
+    profile = new_profile()
+    now = [datetime(2021, 8, 2, 10, 0)]
+    profile.set_clock(lambda: now[0])
+    assert profile.submit_order('AAA', 60)
+    now[0] += timedelta(minutes=11)  # Past the simulated ten minute wait
+    profile.set_price_source(lambda stock_symbol: None)  # A quote that can not be priced breaks the fill
+    with pytest.raises(TypeError):
+        profile.complete_trade()
+    reloaded = profile_class.load_profile_from_pickle('tester')
+    assert reloaded.get_pending_purchase() and reloaded.get_cash() == 100.0
+    assert reloaded.get_trading_history()['Buy Completed Time'].isna().all()
@@ -0,0 +1,53 @@
+"""Checks the O(n) composite key top_k against a full stable sort"""
+# Import necessary modules
+import numpy as np
+import pandas as pd
+import pytest
+import ranking
+
+
+def tied_analysis(rows=300, seed=0):
+    """Returns an analysis dataframe with coarse values, so rows tie on one key or on all of them, & some NaN
+    :param rows: int
+    :param seed: int
+    :rtype: pandas dataframe
+    """
+    random_state = np.random.RandomState(seed)
+    analysis = pd.DataFrame({'Ticker': ['T%03d' % number for number in random_state.permutation(rows)],
+                             'Reputation Weight': random_state.choice([1.0, 2.0, 3.0], rows),
+                             'R Squared': random_state.choice([0.1, 0.5, 0.9], rows),
+                             'Average Growth': random_state.choice([-0.1, 0.0, 0.1], rows),
+                             'Growth Percentage Coefficient': random_state.choice([-1.0, 1.0], rows)})
+    analysis.loc[random_state.random_sample(rows) < 0.05, 'R Squared'] = np.nan
+    return analysis
+
+
+def sorted_reference(analysis, keys, tie_breaker):
+    """Returns the analysis fully sorted by the keys, the way the ranking used to be done
+    :param analysis: pandas dataframe
+    :param keys: list of (column, ascending)
+    :param tie_breaker: str
+    :rtype: pandas dataframe
+    """
+    columns = [column for column, _ascending in keys] + (['Ticker'] if tie_breaker == 'ticker' else [])
+    ascending = [ascending for _column, ascending in keys] + ([True] if tie_breaker == 'ticker' else [])
+    return analysis.sort_values(columns, ascending=ascending, kind='mergesort', na_position='last')
+
+
+@pytest.mark.parametrize('k', [0, 1, 5, 60, 300, 400])
+@pytest.mark.parametrize('tie_breaker', ranking.TIE_BREAKERS)
+def test_top_k_matches_full_sort(k, tie_breaker):
+    analysis = tied_analysis()
+    expected = sorted_reference(analysis, ranking.RANKING_KEYS, tie_breaker).head(k)
+    actual = ranking.top_k(analysis, k, tie_breaker=tie_breaker)
+    assert list(actual.index) == list(expected.index)
+
+
+def test_top_k_with_ascending_key_and_filter():
+    analysis = tied_analysis(seed=1)
+    keys = [('Reputation Weight', False), ('Average Growth', True)]
+    filters = {'R Squared': (0.5, None)}
+    passed = analysis[analysis['R Squared'] >= 0.5]
+    expected = sorted_reference(passed, keys, 'first').head(20)
+    actual = ranking.top_k(analysis, 20, keys=keys, filters=filters)
+    assert list(actual.index) == list(expected.index)
@@ -0,0 +1,51 @@
+"""Checks the batched closed form Ridge engine against one sklearn Ridge fit per ticker"""
+# Import necessary modules
+import numpy as np
+import pandas as pd
+import pytest
+import regression_engine
+from panel_index import PanelIndex
+
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+
+def random_panel(ticker_count=40, bars=15, seed=0):
+    """Returns a shuffled panel of random percent changes, one minute bars & three reputation tiers
+    :param ticker_count: int
+    :param bars: int
+    :param seed: int
+    :rtype: pandas dataframe
+    """
+    random_state = np.random.RandomState(seed)
+    panel = pd.DataFrame({'Minute': np.tile(np.arange(bars, dtype=float), ticker_count),
+                          'Ticker': np.repeat(['T%03d' % number for number in range(ticker_count)], bars),
+                          'Open Percent Change': random_state.normal(0, 0.1, ticker_count * bars),
+                          'Reputation Weight': np.repeat(3 - np.arange(ticker_count) % 3, bars).astype(float)})
+    return panel.sample(frac=1, random_state=seed).reset_index(drop=True)  # Tickers interleaved like the real panel
+
+
+@pytest.mark.parametrize('alpha', [0.0, 0.5, 30.0])
+def test_batched_ridge_matches_sklearn(alpha):
+    panel = random_panel()
+    actual = regression_engine.batched_ridge_analysis(PanelIndex.from_dataframe(panel), panel['Minute'].values,
+                                                      panel['Open Percent Change'].values,
+                                                      panel['Reputation Weight'].values, alpha=alpha)
+    for row, ticker in zip(actual.itertuples(index=False), actual['Ticker']):
+        rows = panel[panel['Ticker'] == ticker]
+        x_values, y_values = rows[['Minute']].values, rows['Open Percent Change'].values
+        model = linear_model.Ridge(alpha=alpha).fit(x_values, y_values)
+        assert row[4] == pytest.approx(model.coef_[0], rel=1e-9, abs=1e-12)  # Growth Percentage Coefficient
+        assert row[3] == pytest.approx(model.score(x_values, y_values), rel=1e-9, abs=1e-12)  # R Squared
+        assert row[2] == pytest.approx(np.median(y_values))  # Average Growth
+        assert row[1] == rows['Reputation Weight'].mean()
+
+
+def test_constant_target_scores_like_sklearn():
+    panel = random_panel(ticker_count=2)
+    panel.loc[panel['Ticker'] == 'T000', 'Open Percent Change'] = 0.0
+    actual = regression_engine.batched_ridge_analysis(PanelIndex.from_dataframe(panel), panel['Minute'].values,
+                                                      panel['Open Percent Change'].values,
+                                                      panel['Reputation Weight'].values)
+    flat = actual[actual['Ticker'] == 'T000'].iloc[0]
+    assert flat['Growth Percentage Coefficient'] == 0.0
+    assert flat['R Squared'] == 1.0  # sklearn's r2_score of a perfect fit to a constant
@@ -0,0 +1,28 @@
+"""Checks the streaming RollingMedian against numpy over a sliding window"""
+# Import necessary modules
+import numpy as np
+import pytest
+from streaming_stats import RollingMedian
+
+
+@pytest.mark.parametrize('window', [1, 2, 5, 16])
+def test_rolling_median_matches_numpy(window):
+    random_state = np.random.RandomState(window)
+    values = np.round(random_state.normal(0, 1, 500), 1)  # Rounded, so the window holds duplicates
+    rolling = RollingMedian()
+    for position, value in enumerate(values):
+        rolling.add(value)
+        if position >= window:
+            rolling.remove(values[position - window])
+        assert len(rolling) == min(position + 1, window)
+        assert rolling.median() == np.median(values[max(position + 1 - window, 0):position + 1])
+
+
+def test_rolling_median_empties():
+    rolling = RollingMedian()
+    assert np.isnan(rolling.median())
+    for value in (3.0, 1.0, 2.0):
+        rolling.add(value)
+    for value in (1.0, 3.0, 2.0):
+        rolling.remove(value)
+    assert len(rolling) == 0 and np.isnan(rolling.median())
@@ -0,0 +1,52 @@
+"""Checks how the TradeLedger journal folds a trade's events into its record"""
+# Import necessary modules
+import sqlite3
+from datetime import datetime
+import pandas as pd
+import trade_ledger
+from trade_ledger import TradeLedger
+
+BOUGHT = datetime(2021, 8, 2, 10, 0)
+
+
+def test_latest_event_wins_even_when_it_clears():
+    ledger = TradeLedger('ledger.sqlite')
+    trade_id = ledger.open_trade('AAA', 100.0, BOUGHT)
+    ledger.update_trade(trade_id, {'Buy Completed Time': BOUGHT, 'Shares Holding': 10.0})
+    ledger.update_trade(trade_id, {'Sell Order Time': datetime(2021, 8, 2, 10, 30)})
+    ledger.update_trade(trade_id, {'Sell Order Time': None, 'Shares Holding': 4.0})  # Partly sold, order cleared
+    ledger.commit()
+    record = TradeLedger('ledger.sqlite').history_dataframe().iloc[0]  # Folded by the database, not the cache
+    assert pd.isnull(record['Sell Order Time'])
+    assert record['Shares Holding'] == 4.0
+    assert record['Buy Completed Time'] == pd.Timestamp(BOUGHT)
+    assert ledger.pending_trade('Sell Order Time')['Trade ID'] == trade_id
+
+
+def test_closed_trade_leaves_the_open_trades():
+    ledger = TradeLedger('ledger.sqlite')
+    first = ledger.open_trade('AAA', 100.0, BOUGHT)
+    ledger.update_trade(first, {'Buy Completed Time': BOUGHT, 'Sell Order Time': BOUGHT,
+                                'Sell Completed Time': BOUGHT, 'Profit': 1.5})
+    second = ledger.open_trade('BBB', 50.0, BOUGHT)
+    assert ledger.pending_trade('Buy Completed Time')['Trade ID'] == second
+    history = ledger.history_dataframe()
+    assert list(history['Stock Ticker']) == ['AAA', 'BBB']
+    assert history['Profit'].iloc[0] == 1.5 and pd.isnull(history['Profit'].iloc[1])
+
+
+def test_events_from_before_the_mask_keep_their_values():
+    connection = sqlite3.connect('old.sqlite')
+    fields = ', '.join('%s %s' % (field, trade_ledger.FIELD_TYPES[field])
+                       for field in trade_ledger.TRADE_COLUMNS.values())
+    connection.execute('CREATE TABLE trade_events (sequence INTEGER PRIMARY KEY, trade_id INTEGER NOT NULL, %s)'
+                       % fields)
+    connection.execute("INSERT INTO trade_events (trade_id, stock_ticker, profit) VALUES (1, 'OLD', 2.5)")
+    connection.execute('INSERT INTO trade_events (trade_id, shares_holding) VALUES (1, 3.0)')  # Profit not carried
+    connection.commit()
+    connection.close()
+    ledger = TradeLedger('old.sqlite')
+    record = ledger.history_dataframe().iloc[0]
+    assert record['Stock Ticker'] == 'OLD' and record['Profit'] == 2.5 and record['Shares Holding'] == 3.0
+    ledger.append_event(1, {'Profit': None})  # A new event clears it
+    assert pd.isnull(ledger.history_dataframe()['Profit'].iloc[0])
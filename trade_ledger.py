@@ -0,0 +1,275 @@
+# Import necessary modules
+import os
+import sqlite3
+from datetime import datetime
+from lazy_import import LazyModule
+
+pd = LazyModule('pandas')  # Only the history dataframes need it, finding the pending trade does not
+
+# Trading history columns & the ledger field that stores each one
+TRADE_COLUMNS = {'Stock Ticker': 'stock_ticker',
+                 'Buy Invested Amount': 'buy_invested_amount',
+                 'Buy Submission Time': 'buy_submission_time',
+                 'Buy Completed Time': 'buy_completed_time',
+                 'Completed Order Price': 'completed_order_price',
+                 'Shares Holding': 'shares_holding',
+                 'Sell Order Time': 'sell_order_time',
+                 'Sell Completed Time': 'sell_completed_time',
+                 'Profit': 'profit'}
+# Trading history column -> its bit in an event's set_columns mask, which tells a column set to NULL from one the event
+# does not carry
+COLUMN_BITS = {column: 1 << position for position, column in enumerate(TRADE_COLUMNS)}
+TIME_COLUMNS = ['Buy Submission Time', 'Buy Completed Time', 'Sell Order Time', 'Sell Completed Time']
+FIELD_TYPES = {'stock_ticker': 'TEXT', 'buy_invested_amount': 'REAL', 'buy_submission_time': 'TEXT',
+               'buy_completed_time': 'TEXT', 'completed_order_price': 'REAL', 'shares_holding': 'REAL',
+               'sell_order_time': 'TEXT', 'sell_completed_time': 'TEXT', 'profit': 'REAL'}
+
+
+class TradeLedger:
+    """Class that records trades in an append only SQLite journal. Every change to a trade is a new event row that
+    carries only the columns it sets, flagged in its set_columns mask so a column cleared to NULL counts as set, so
+    nothing is ever rewritten; a trade's record is the fold of its events. Trades
+    that are not sold yet are also kept in a small open trades table, loaded into memory, so finding the pending trade
+    never touches the history. History is read lazily, in chunks, only when it is asked for.
+    Writes are not committed until commit is called, so a Profile transaction commits its trades with its state."""
+
+    def __init__(self, path):
+        self.path = path  # SQLite file of the ledger
+        self.connection = None  # Opened on first use
+        self.open_trades = None  # Trade id -> record of every unsold trade, loaded on first use
+
+    def __getstate__(self):
+        """Pickles the ledger as its path, the connection & the cache are reopened on first use"""
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def connect(self):
+        """Returns the connection, opening the ledger & creating its tables on first use
+        :rtype: sqlite3 connection
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            fields = ', '.join('%s %s' % (field, FIELD_TYPES[field]) for field in TRADE_COLUMNS.values())
+            self.connection.execute('CREATE TABLE IF NOT EXISTS trade_events (sequence INTEGER PRIMARY KEY, '
+                                    'trade_id INTEGER NOT NULL, set_columns INTEGER, %s)' % fields)
+            event_fields = [row[1] for row in self.connection.execute('PRAGMA table_info(trade_events)')]
+            if 'set_columns' not in event_fields:  # A ledger from before the mask, its events keep a NULL mask
+                self.connection.execute('ALTER TABLE trade_events ADD COLUMN set_columns INTEGER')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS trade_events_by_trade ON trade_events (trade_id)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS open_trades (trade_id INTEGER PRIMARY KEY, %s)'
+                                    % fields)
+            self.connection.commit()
+        return self.connection
+
+    def load_open_trades(self):
+        """Returns the in memory index of unsold trades, loading it from the open trades table on first use
+        :rtype: dict
+        """
+        if self.open_trades is None:
+            cursor = self.connect().execute('SELECT trade_id, %s FROM open_trades ORDER BY trade_id'
+                                            % ', '.join(TRADE_COLUMNS.values()))
+            self.open_trades = {row[0]: row_to_record(row[1:]) for row in cursor}
+        return self.open_trades
+
+    def open_trade(self, stock_ticker, invested_amount, submission_time):
+        """Appends a new trade with its buy order & returns its trade id
+        :param stock_ticker: str
+        :param invested_amount: float
+        :param submission_time: datetime
+        :rtype: int
+        """
+        open_trades = self.load_open_trades()
+        # The next id follows the newest trade in the journal
+        last_trade_id = self.connect().execute('SELECT MAX(trade_id) FROM trade_events').fetchone()[0]
+        trade_id = 1 if last_trade_id is None else last_trade_id + 1
+        record = dict.fromkeys(TRADE_COLUMNS)
+        record.update({'Stock Ticker': stock_ticker, 'Buy Invested Amount': invested_amount,
+                       'Buy Submission Time': submission_time})
+        self.append_event(trade_id, record)
+        self.connection.execute('INSERT INTO open_trades (trade_id, %s) VALUES (?, %s)'
+                                % (', '.join(TRADE_COLUMNS.values()), ', '.join('?' * len(TRADE_COLUMNS))),
+                                [trade_id] + record_to_row(record))
+        open_trades[trade_id] = record
+        return trade_id
+
+    def update_trade(self, trade_id, changes):
+        """Appends an event that sets some columns of an open trade. A trade whose sell completes leaves the open
+        trades index.
+        :param trade_id: int
+        :param changes: dict column -> value
+        """
+        open_trades = self.load_open_trades()
+        self.append_event(trade_id, changes)
+        if changes.get('Sell Completed Time') is not None:  # The trade is closed
+            self.connection.execute('DELETE FROM open_trades WHERE trade_id = ?', (trade_id,))
+            open_trades.pop(trade_id, None)
+        else:
+            assignments = ', '.join('%s = ?' % TRADE_COLUMNS[column] for column in changes)
+            self.connection.execute('UPDATE open_trades SET %s WHERE trade_id = ?' % assignments,
+                                    record_to_row(changes, list(changes)) + [trade_id])
+            open_trades[trade_id].update(changes)
+
+    def append_event(self, trade_id, changes):
+        """Appends one event row to the journal, its mask flags every column it sets, to NULL too
+        :param trade_id: int
+        :param changes: dict column -> value
+        """
+        columns = list(changes)
+        self.connect().execute('INSERT INTO trade_events (trade_id, set_columns, %s) VALUES (?, ?, %s)'
+                               % (', '.join(TRADE_COLUMNS[column] for column in columns),
+                                  ', '.join('?' * len(columns))),
+                               [trade_id, sum(COLUMN_BITS[column] for column in columns)] +
+                               record_to_row(changes, columns))
+
+    def pending_trade(self, column):
+        """Returns the oldest open trade whose column is still empty, with its id under 'Trade ID', or None. Only the
+        open trades are looked at, so the cost does not grow with the history.
+        :param column: str, e.g. 'Buy Completed Time'
+        :rtype: dict
+        """
+        for trade_id, record in self.load_open_trades().items():
+            if record[column] is None:
+                return dict(record, **{'Trade ID': trade_id})
+        return None
+
+    def commit(self):
+        """Makes every event appended since the last commit durable"""
+        if self.connection is not None:
+            self.connection.commit()
+
+    def rollback(self):
+        """Discards every event appended since the last commit"""
+        if self.connection is not None:
+            self.connection.rollback()
+        self.open_trades = None  # Reloaded from the table on next use
+
+    def iter_history(self, chunk_size=10000):
+        """Yields the trading history as dataframes of at most chunk_size trades, oldest first. Each trade is folded
+        from its events by the database, nothing but the current chunk is held in memory.
+        :param chunk_size: int
+        :rtype: generator of pandas dataframes
+        """
+        # A column can be set again, by a partial fill, or cleared, by a cancelled sell, so the latest event that set
+        # it wins, even to NULL; events from before the mask only count where they hold a value. The trade id index
+        # keeps each lookup to the trade's few events.
+        latest = ', '.join('(SELECT %s FROM trade_events AS event WHERE event.trade_id = trade.trade_id AND '
+                           '(event.set_columns & %d OR (event.set_columns IS NULL AND %s IS NOT NULL)) '
+                           'ORDER BY event.sequence DESC LIMIT 1)' % (field, COLUMN_BITS[column], field)
+                           for column, field in TRADE_COLUMNS.items())
+        cursor = self.connect().execute('SELECT %s FROM (SELECT DISTINCT trade_id FROM trade_events) AS trade '
+                                        'ORDER BY trade.trade_id' % latest)
+        position = 0  # Row number of the first trade in the chunk
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pd.DataFrame(rows, columns=list(TRADE_COLUMNS),
+                                 index=pd.RangeIndex(position, position + len(rows)))
+            for column in TIME_COLUMNS:
+                chunk[column] = pd.to_datetime(chunk[column])
+            position += len(rows)
+            yield chunk
+
+    def history_dataframe(self):
+        """Returns the whole trading history as one dataframe
+        :rtype: pandas dataframe
+        """
+        chunks = list(self.iter_history())
+        if not chunks:
+            return pd.DataFrame({column: [] for column in TRADE_COLUMNS})
+        return pd.concat(chunks)
+
+    def trade_count(self):
+        """Returns the number of trades in the ledger
+        :rtype: int
+        """
+        return self.connect().execute('SELECT COUNT(DISTINCT trade_id) FROM trade_events').fetchone()[0]
+
+    def import_dataframe(self, trading_history):
+        """Appends the rows of an old trading history dataframe as trades, used to migrate pickled profiles
+        :param trading_history: pandas dataframe with the trading history columns
+        """
+        for _index, row in trading_history.iterrows():
+            record = {column: (None if pd.isnull(row[column]) else row[column]) for column in TRADE_COLUMNS}
+            trade_id = self.open_trade(record['Stock Ticker'], record['Buy Invested Amount'],
+                                       record['Buy Submission Time'])
+            changes = {column: value for column, value in record.items()
+                       if column not in ('Stock Ticker', 'Buy Invested Amount', 'Buy Submission Time')
+                       and value is not None}
+            if changes:
+                self.update_trade(trade_id, changes)
+        self.commit()
+
+    def reset(self):
+        """Deletes every trade, the one operation that does not append"""
+        connection = self.connect()
+        connection.execute('DELETE FROM trade_events')
+        connection.execute('DELETE FROM open_trades')
+        connection.commit()
+        self.open_trades = {}
+
+    def close(self):
+        """Commits & closes the connection"""
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def delete(self):
+        """Closes the ledger & removes its file"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def record_to_row(record, columns=None):
+    """Returns the values of a record in ledger storage form, timestamps as ISO text
+    :param record: dict column -> value
+    :param columns: optional list of columns, defaults to every trading history column
+    :rtype: list
+    """
+    columns = list(TRADE_COLUMNS) if columns is None else columns
+    row = []
+    for column in columns:
+        value = record.get(column)
+        if value is not None and column in TIME_COLUMNS:
+            value = time_to_text(value)
+        elif value is not None and column != 'Stock Ticker':
+            value = float(value)
+        row.append(value)
+    return row
+
+
+def row_to_record(row):
+    """Returns a record from ledger storage form, timestamps as datetimes
+    :param row: sequence of values in trading history column order
+    :rtype: dict
+    """
+    record = dict(zip(TRADE_COLUMNS, row))
+    for column in TIME_COLUMNS:
+        if record[column] is not None:
+            record[column] = text_to_time(record[column])
+    return record
+
+
+def time_to_text(value):
+    """Returns a timestamp as ISO text
+    :param value: datetime, pandas timestamp, numpy datetime64 or str
+    :rtype: str
+    """
+    if isinstance(value, datetime):  # pandas timestamps are datetimes too & keep their nanoseconds
+        return value.isoformat()
+    return pd.Timestamp(value).isoformat()
+
+
+def text_to_time(text):
+    """Returns a timestamp from ISO text, without importing pandas for the common forms
+    :param text: str
+    :rtype: datetime
+    """
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:  # Nanoseconds, which datetime reads only from Python 3.11 on
+        return pd.Timestamp(text)
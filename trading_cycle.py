@@ -0,0 +1,92 @@
+# Import necessary modules
+from lazy_import import LazyModule
+
+main = LazyModule('main')  # Market data & ranking, only imported when the cycle buys
+
+TAKE_PROFIT_PERCENTAGE = 0.3  # Sell once the holding is up more than 0.3%
+STOP_LOSS_PERCENTAGE = -0.2  # Sell once the holding is down more than 0.2%
+
+
+def complete_pending_orders(profile):
+    """Attempts to complete the profile's pending purchase & pending sell
+    :param profile: Profile
+    """
+    if profile.get_pending_purchase():  # If I have a pending purchase
+        profile.complete_trade()  # Attempt to complete the purchase
+
+    if profile.get_pending_sells():  # If I have a pending sell
+        profile.complete_sell()  # Attempt to complete the sell
+
+
+def exit_signal(profile, take_profit=TAKE_PROFIT_PERCENTAGE, stop_loss=STOP_LOSS_PERCENTAGE):
+    """Updates the held stock's percentage change & returns true when it crossed either threshold & no sell is pending
+    :param profile: Profile
+    :param take_profit: float, percent
+    :param stop_loss: float, percent
+    :rtype: bool
+    """
+    # If we are holding a stock & not currently selling the stock
+    if profile.get_current_stock_holding() is None or profile.get_pending_sells():
+        return False
+    profile.calculate_current_percentage()  # Update current percentage change
+    # The percentage change crossed a threshold, sell the stock
+    return (profile.get_current_percentage_change() > take_profit or
+            profile.get_current_percentage_change() < stop_loss)
+
+
+def check_exit(profile, take_profit=TAKE_PROFIT_PERCENTAGE, stop_loss=STOP_LOSS_PERCENTAGE):
+    """Updates the held stock's percentage change & submits a sell when it crossed either threshold
+    :param profile: Profile
+    :param take_profit: float, percent
+    :param stop_loss: float, percent
+    :rtype: bool, True if a sell was submitted
+    """
+    if exit_signal(profile, take_profit, stop_loss):
+        return profile.submit_sell()  # Initiates sell
+    return False
+
+
+def needs_new_position(profile):
+    """Returns true when the profile is not holding a stock & there are no pending purchases
+    :param profile: Profile
+    :rtype: bool
+    """
+    return profile.get_current_stock_holding() is None and not profile.get_pending_purchase()
+
+
+def may_need_new_position(profile):
+    """Returns true when the profile could be looking for a new stock by the end of this cycle: it is already free, or
+    its pending sell may complete
+    :param profile: Profile
+    :rtype: bool
+    """
+    return needs_new_position(profile) or profile.get_pending_sells()
+
+
+def open_position(profile, stock_performance_dataframe):
+    """Buys the top recommended stock with the whole cash balance
+    :param profile: Profile
+    :param stock_performance_dataframe: pandas dataframe from main.build_complete_stock_data
+    :rtype: bool
+    """
+    # Receive sorted solution
+    top_performing_ticker = main.recommend_top_stock(stock_performance_dataframe)
+    cash_balance = profile.get_cash()  # Get current cash balance
+    return profile.submit_order(top_performing_ticker, cash_balance)  # Initiates purchase
+
+
+def run_cycle(profile, stock_data_provider=None, take_profit=TAKE_PROFIT_PERCENTAGE, stop_loss=STOP_LOSS_PERCENTAGE):
+    """Runs one pass of the buy/sell state machine: complete pending orders, sell on a threshold crossing & buy the
+    top ranked stock when the profile is free
+    :param profile: Profile
+    :param stock_data_provider: function returning the ranked stock performance dataframe, defaults to
+        main.build_complete_stock_data
+    :param take_profit: float, percent
+    :param stop_loss: float, percent
+    """
+    complete_pending_orders(profile)
+    check_exit(profile, take_profit, stop_loss)
+    if needs_new_position(profile):
+        if stock_data_provider is None:
+            stock_data_provider = main.build_complete_stock_data
+        open_position(profile, stock_data_provider())  # Get Ridged first derivative stock data & buy
@@ -0,0 +1,231 @@
+"""Long running trading daemon. Run: python trading_daemon.py --profile Derek --tick 60"""
+# Import necessary modules
+import argparse
+import asyncio
+import functools
+import os
+import signal
+import threading
+import time
+import traceback
+import execution
+import instrumentation
+import main
+import position_monitor
+import profile_class
+import trading_cycle
+import universe
+from streaming_stats import StreamingRegressionEngine
+
+
+class TradingDaemon:
+    """Class that keeps a profile loaded & runs the buy/sell state machine on a fixed tick. Imports, the profile, the
+    bar cache & the quote cache stay warm between ticks. When the profile may be buying this tick, the market data
+    fetch & ranking start in a worker thread while the pending orders are being checked, so the two waits overlap.
+    Given an ExecutionManager, orders go to its broker & are completed by the broker's events, even between ticks,
+    instead of by the ten minute wait the ticks check; orders an earlier run left pending are unknown to the broker &
+    still complete on the ten minute wait. Given a price feed, a PositionMonitor watches the holding between ticks &
+    sells on the tick that crosses a threshold; the profile lock keeps it apart from the worker threads."""
+
+    def __init__(self, profile, tick_seconds=60.0, stock_data_provider=main.build_complete_stock_data,
+                 take_profit=trading_cycle.TAKE_PROFIT_PERCENTAGE, stop_loss=trading_cycle.STOP_LOSS_PERCENTAGE,
+                 metrics_path=None, execution_manager=None, monitor_feed=None):
+        self.profile = profile  # The profile being traded
+        self.tick_seconds = tick_seconds  # Seconds between the starts of two ticks
+        self.stock_data_provider = stock_data_provider  # Function returning the ranked stock performance dataframe
+        self.take_profit = take_profit  # Percent gain that triggers a sell
+        self.stop_loss = stop_loss  # Percent loss that triggers a sell
+        self.running = False  # Cleared by stop
+        self.ticks = 0  # Ticks completed
+        self.last_tick_seconds = None  # Wall time of the last tick
+        self.metrics_path = metrics_path  # File the instrumentation is written to after every tick, .prom or JSON
+        self.execution_manager = execution_manager  # Sends the orders to a broker, None for the simulated wait
+        self.profile_lock = threading.Lock()  # Held by whoever changes the profile
+        if execution_manager is not None:  # Done orders are applied in worker threads, under the same lock
+            execution_manager.profile_lock = self.profile_lock
+        self.monitor = None if monitor_feed is None else position_monitor.PositionMonitor(
+            profile, monitor_feed, take_profit, stop_loss, execution_manager, self.profile_lock)  # Exits between ticks
+
+    async def tick(self):
+        """Runs one pass of the state machine, overlapping the market data fetch with the order checks"""
+        loop = asyncio.get_running_loop()
+        tick_start = time.perf_counter()
+        stock_data = None  # Future of the ranked stock data, only started when it may be needed
+        if trading_cycle.may_need_new_position(self.profile):
+            stock_data = loop.run_in_executor(None, self.stock_data_provider)
+        if self.execution_manager is None:
+            await loop.run_in_executor(None, self.check_orders)  # Complete pending orders & check the exit thresholds
+        else:
+            if self.has_orphaned_order():  # Sent by an earlier run, no broker event will ever complete it
+                await loop.run_in_executor(None, self.complete_orphaned_orders)
+            await self.check_exit_with_broker()
+        if trading_cycle.needs_new_position(self.profile):
+            if stock_data is None:  # The sell completed after all, fetch now
+                stock_data = loop.run_in_executor(None, self.stock_data_provider)
+            stock_performance_dataframe = await stock_data
+            if self.execution_manager is None:
+                await loop.run_in_executor(None, self.open_position, stock_performance_dataframe)
+            else:
+                await self.execution_manager.buy(self.profile, main.recommend_top_stock(stock_performance_dataframe),
+                                                 self.profile.get_cash())
+        elif stock_data is not None:
+            await stock_data  # Not buying after all, the fetch still warmed the bar cache
+        self.ticks += 1
+        self.last_tick_seconds = time.perf_counter() - tick_start
+
+    def check_orders(self):
+        """Completes pending orders & submits a sell when a threshold was crossed"""
+        with self.profile_lock:
+            trading_cycle.complete_pending_orders(self.profile)
+            trading_cycle.check_exit(self.profile, self.take_profit, self.stop_loss)
+
+    def has_orphaned_order(self):
+        """Returns true when the profile has a pending order the execution manager is not working on
+        :rtype: bool
+        """
+        return ((self.profile.get_pending_purchase() or self.profile.get_pending_sells()) and
+                not self.execution_manager.has_working_order(self.profile))
+
+    def complete_orphaned_orders(self):
+        """Completes the pending orders of an earlier run with the ten minute wait, as if there were no broker"""
+        with self.profile_lock:
+            trading_cycle.complete_pending_orders(self.profile)
+
+    def open_position(self, stock_performance_dataframe):
+        """Buys the top recommended stock
+        :param stock_performance_dataframe: pandas dataframe from main.build_complete_stock_data
+        """
+        with self.profile_lock:
+            trading_cycle.open_position(self.profile, stock_performance_dataframe)
+
+    async def check_exit_with_broker(self):
+        """Sends a sell to the broker when a threshold was crossed. The quote is fetched in a worker thread & the
+        check is computed from it & the purchase price, like PositionMonitor.on_tick does, so the event loop only
+        writes the profile when a sell is sent; a check that finds the profile busy waits for the next tick."""
+        profile = self.profile
+        holding = profile.get_current_stock_holding()
+        if holding is None or profile.get_pending_sells():
+            return
+        price = await asyncio.get_running_loop().run_in_executor(None, profile.get_current_price, holding)
+        purchase_price = profile.get_current_stock_purchase_price()
+        if not purchase_price:
+            return
+        percentage_change = (price - purchase_price) / purchase_price * 100
+        if self.stop_loss <= percentage_change <= self.take_profit:
+            return
+        if not self.profile_lock.acquire(blocking=False):  # A done order is being applied
+            return
+        try:
+            # The holding may have been sold while the quote was fetched
+            if holding != profile.get_current_stock_holding() or profile.get_pending_sells():
+                return
+            with profile.transaction():
+                profile.set_current_percentage_change(percentage_change)  # Saved with the sell, not every tick
+            await self.execution_manager.sell(profile)
+        finally:
+            self.profile_lock.release()
+
+    async def run(self, max_ticks=None):
+        """Runs ticks on a fixed schedule until stopped. A failing tick is reported & the schedule carries on; a tick
+        that overruns the schedule starts the next one right away instead of piling up.
+        :param max_ticks: optional int, stop after this many ticks
+        """
+        self.running = True
+        monitor_task = None if self.monitor is None else asyncio.ensure_future(self.monitor.run())
+        next_tick = time.monotonic()
+        try:
+            while self.running and (max_ticks is None or self.ticks < max_ticks):
+                try:
+                    with instrumentation.stage('daemon.tick'):
+                        await self.tick()
+                except Exception:
+                    traceback.print_exc()  # Report & keep the daemon alive, the next tick retries
+                    self.ticks += 1
+                if self.metrics_path is not None:
+                    instrumentation.default_registry.write(self.metrics_path)
+                next_tick = max(next_tick + self.tick_seconds, time.monotonic())
+                if self.running and (max_ticks is None or self.ticks < max_ticks):
+                    await asyncio.sleep(next_tick - time.monotonic())
+        finally:
+            if monitor_task is not None:
+                monitor_task.cancel()
+                await asyncio.gather(monitor_task, return_exceptions=True)
+            if self.execution_manager is not None:
+                await self.execution_manager.wait_for_updates()  # Let the done orders reach the profile
+
+    def stop(self):
+        """Stops the daemon after the tick in progress"""
+        self.running = False
+
+
+def build_execution_manager(broker_name, profile, latency=0.5, slippage=0.0005, partial_fills=1):
+    """Returns an ExecutionManager over the named broker, or None for the simulated ten minute wait. Robinhood reads
+    its credentials from ROBINHOOD_USERNAME & ROBINHOOD_PASSWORD.
+    :param broker_name: str, none, simulated or robinhood
+    :param profile: Profile, its price source prices the simulated fills, fetched in a worker thread
+    :param latency: float, seconds, simulated broker only
+    :param slippage: float, fraction, simulated broker only
+    :param partial_fills: int, simulated broker only
+    :rtype: ExecutionManager
+    """
+    if broker_name == 'none':
+        return None
+    if broker_name == 'simulated':
+        broker = execution.SimulatedBroker(execution.threaded_price_source(profile.get_current_price), latency=latency,
+                                           slippage=slippage, partial_fills=partial_fills)
+    else:
+        broker = execution.RobinhoodBroker(os.environ.get('ROBINHOOD_USERNAME'), os.environ.get('ROBINHOOD_PASSWORD'))
+    return execution.ExecutionManager(broker)
+
+
+def parse_arguments():
+    """Returns the command line arguments"""
+    parser = argparse.ArgumentParser(description='Run the trading state machine continuously for one profile.')
+    parser.add_argument('--profile', default='Derek', help='first name of the pickled profile to trade')
+    parser.add_argument('--tick', type=float, default=60.0, help='seconds between ticks')
+    parser.add_argument('--max-ticks', type=int, default=None, help='stop after this many ticks')
+    parser.add_argument('--take-profit', type=float, default=trading_cycle.TAKE_PROFIT_PERCENTAGE)
+    parser.add_argument('--stop-loss', type=float, default=trading_cycle.STOP_LOSS_PERCENTAGE)
+    parser.add_argument('--metrics', default=None,
+                        help='record stage timings & write them here after every tick, .prom for Prometheus text')
+    parser.add_argument('--broker', choices=['none', 'simulated', 'robinhood'], default='none',
+                        help='send orders to a broker instead of the ten minute simulated wait')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds to the first fill, simulated broker')
+    parser.add_argument('--slippage', type=float, default=0.0005, help='fraction of the price, simulated broker')
+    parser.add_argument('--partial-fills', type=int, default=1, help='pieces each order fills in, simulated broker')
+    parser.add_argument('--monitor-interval', type=float, default=None,
+                        help='watch the holding between ticks, polling its quote this often in seconds')
+    parser.add_argument('--universe', default=main.UNIVERSE,
+                        help='universe to rank: sp500, nasdaq100 or any name given to --tickers')
+    parser.add_argument('--tickers', default=None,
+                        help='comma separated custom universe in rank order, stored under the --universe name')
+    parser.add_argument('--streaming', action='store_true',
+                        help='keep the Ridge ranking in a streaming engine, adding only the new bars every tick')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    if arguments.metrics is not None:
+        instrumentation.enable()
+    # kill -USR1 <pid> starts the profiler, a second one stops it & prints the hottest functions
+    signal.signal(signal.SIGUSR1, lambda signal_number, frame: instrumentation.default_registry.toggle_profiling())
+    trading_profile = profile_class.load_profile_from_pickle(arguments.profile)
+    if arguments.tickers is not None:  # A custom list, stored like the index universes
+        universe.default_universe_manager.register_custom(arguments.universe, arguments.tickers.split(','))
+    stock_data = functools.partial(main.build_complete_stock_data, universe_name=arguments.universe)
+    if arguments.streaming:  # The engine lives as long as the daemon, each tick adds the bars that arrived since
+        stock_data = functools.partial(main.build_streaming_stock_data, StreamingRegressionEngine(
+            alpha=getattr(main.scoring_model, 'alpha', 0.5)), universe_name=arguments.universe)
+    daemon = TradingDaemon(trading_profile, tick_seconds=arguments.tick, stock_data_provider=stock_data,
+                           take_profit=arguments.take_profit, stop_loss=arguments.stop_loss,
+                           metrics_path=arguments.metrics,
+                           execution_manager=build_execution_manager(arguments.broker, trading_profile,
+                                                                     arguments.latency, arguments.slippage,
+                                                                     arguments.partial_fills),
+                           monitor_feed=None if arguments.monitor_interval is None else
+                           position_monitor.PollingFeed(interval=arguments.monitor_interval))
+    try:
+        asyncio.run(daemon.run(arguments.max_ticks))
+    except KeyboardInterrupt:
+        daemon.stop()
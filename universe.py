@@ -0,0 +1,229 @@
+# Import necessary modules
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import pandas as pd
+from lazy_import import LazyModule
+
+requests = LazyModule('requests')  # Imported by the first constituent download
+
+# Mimic a search engine
+BROWSER_HEADER = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                                'Chrome/75.0.3770.100 Safari/537.36'}
+REFRESH_INTERVAL = 24 * 60 * 60.0  # Seconds a stored constituent list is served before it is checked again
+REQUEST_TIMEOUT = 30.0  # Seconds to wait for a constituent page
+
+
+class Universe:
+    """Class for a list of tickers in rank order, optionally with index weights, & the validators of the response it
+    came from so a refresh can ask the server whether anything changed"""
+
+    def __init__(self, name, tickers, weights=None, fetched_at=None, etag=None, last_modified=None,
+                 content_hash=None):
+        self.name = name  # Name of the universe, e.g. sp500
+        self.tickers = list(tickers)  # Ticker symbols, heaviest first for an index
+        self.weights = None if weights is None else [float(weight) for weight in weights]  # Percent of the index
+        self.fetched_at = fetched_at  # Epoch seconds of the last successful check, None for a custom list
+        self.etag = etag  # ETag header of the last response
+        self.last_modified = last_modified  # Last-Modified header of the last response
+        self.content_hash = content_hash  # sha256 of the last page, catches unchanged pages without validators
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def get_weights(self):
+        """Returns ticker -> weight, empty when the universe has no weights
+        :rtype: dict
+        """
+        return dict(zip(self.tickers, self.weights)) if self.weights is not None else {}
+
+    def to_dict(self):
+        """Returns the universe as a JSON ready dict
+        :rtype: dict
+        """
+        return {'name': self.name, 'tickers': self.tickers, 'weights': self.weights, 'fetched_at': self.fetched_at,
+                'etag': self.etag, 'last_modified': self.last_modified, 'content_hash': self.content_hash}
+
+    @classmethod
+    def from_dict(cls, dictionary):
+        """Builds a universe from to_dict output
+        :param dictionary: dict
+        :rtype: Universe
+        """
+        return cls(**dictionary)
+
+
+class SlickchartsSource:
+    """Class that reads an index's constituents & weights from a slickcharts page. Requests carry the stored ETag &
+    Last-Modified validators; when the server answers 304, or the page is byte for byte the one already parsed, the
+    HTML is not parsed again."""
+
+    def __init__(self, url):
+        self.url = url  # Page with the constituent table
+
+    def fetch(self, name, previous=None):
+        """Returns the universe, or None when it has not changed since previous
+        :param name: str
+        :param previous: optional Universe from an earlier fetch
+        :rtype: Universe
+        """
+        header = dict(BROWSER_HEADER)
+        if previous is not None and previous.etag:
+            header['If-None-Match'] = previous.etag
+        if previous is not None and previous.last_modified:
+            header['If-Modified-Since'] = previous.last_modified
+        content = requests.get(self.url, headers=header, timeout=REQUEST_TIMEOUT)  # Retrieve data from website
+        if content.status_code == 304:  # Not modified
+            return None
+        content.raise_for_status()
+        content_hash = hashlib.sha256(content.content).hexdigest()
+        if previous is not None and previous.content_hash == content_hash:  # Same page, skip the parse
+            return None
+        table = pd.read_html(io.StringIO(content.text))[0]  # Parse the data to pandas dataframe
+        weights = None
+        for weight_column in ('Weight', 'Portfolio%'):
+            if weight_column in table:
+                weights = pd.to_numeric(table[weight_column].astype(str).str.rstrip('%'), errors='coerce').tolist()
+                break
+        # Slickcharts writes share classes with a dot, BRK.B, yahoo with a dash, BRK-B
+        tickers = [str(symbol).replace('.', '-') for symbol in table['Symbol']]
+        return Universe(name, tickers, weights, etag=content.headers.get('ETag'),
+                        last_modified=content.headers.get('Last-Modified'), content_hash=content_hash)
+
+
+class StaticSource:
+    """Class for a fixed, custom ticker list; it never needs the network"""
+
+    def __init__(self, tickers, weights=None):
+        self.tickers = list(tickers)  # Ticker symbols in rank order
+        self.weights = weights  # Optional weights, one per ticker
+
+    def fetch(self, name, previous=None):
+        """Returns the list, or None when it is the one already stored
+        :param name: str
+        :param previous: optional Universe
+        :rtype: Universe
+        """
+        universe = Universe(name, self.tickers, self.weights)
+        if previous is not None and previous.tickers == universe.tickers and previous.weights == universe.weights:
+            return None
+        return universe
+
+
+class UniverseManager:
+    """Class that serves ticker universes from memory. Each universe is stored on disk as JSON with its weights & the
+    time it was last checked; a universe older than the refresh interval is checked with a conditional request, &
+    when the check fails the stored list keeps being served. Lookups after the first are a dict access."""
+
+    def __init__(self, directory='universe_cache', refresh_interval=REFRESH_INTERVAL, clock=time.time):
+        self.directory = directory  # Folder of the stored universes
+        self.refresh_interval = refresh_interval  # Seconds between checks of a universe's source
+        self.clock = clock  # Epoch seconds
+        self.sources = {}  # Name -> source with a fetch(name, previous) method
+        self.universes = {}  # Name -> Universe loaded in memory
+        self.lock = threading.Lock()  # One refresh at a time
+
+    def register(self, name, source):
+        """Adds a universe & where it comes from
+        :param name: str
+        :param source: SlickchartsSource, StaticSource or any object with fetch(name, previous)
+        """
+        self.sources[name] = source
+
+    def register_custom(self, name, tickers, weights=None):
+        """Adds a custom ticker list, stored like any other universe
+        :param name: str
+        :param tickers: list of str
+        :param weights: optional list of floats
+        """
+        self.register(name, StaticSource(tickers, weights))
+        self.refresh(name, force=True)
+
+    def path(self, name):
+        """Returns the file of a stored universe
+        :param name: str
+        :rtype: str
+        """
+        return os.path.join(self.directory, name + '.json')
+
+    def load(self, name):
+        """Returns the stored universe, or None when there is none
+        :param name: str
+        :rtype: Universe
+        """
+        if not os.path.exists(self.path(name)):
+            return None
+        with open(self.path(name)) as file:
+            return Universe.from_dict(json.load(file))
+
+    def save(self, universe):
+        """Stores a universe atomically
+        :param universe: Universe
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = self.path(universe.name) + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(universe.to_dict(), file)
+        os.replace(temporary_path, self.path(universe.name))  # Atomic swap
+
+    def is_stale(self, universe):
+        """Returns true when a universe is due for a check
+        :param universe: Universe
+        :rtype: bool
+        """
+        if universe.fetched_at is None:  # Custom lists only change when they are registered again
+            return False
+        return self.clock() - universe.fetched_at >= self.refresh_interval
+
+    def refresh(self, name, force=False):
+        """Checks a universe's source & stores what changed. A failed check is reported & the stored universe, if
+        any, is kept.
+        :param name: str
+        :param force: bool, check even when the universe is fresh
+        :rtype: Universe
+        """
+        with self.lock:
+            universe = self.universes.get(name) or self.load(name)
+            if universe is not None and not force and not self.is_stale(universe):
+                self.universes[name] = universe
+                return universe
+            try:
+                fetched = self.sources[name].fetch(name, universe)
+            except Exception as error:
+                if universe is None:
+                    raise
+                print('Could not refresh the %s universe, serving the stored list: %s' % (name, error))
+                self.universes[name] = universe
+                return universe
+            if fetched is not None:  # Changed, replace the stored universe
+                universe = fetched
+            if not isinstance(self.sources[name], StaticSource):
+                universe.fetched_at = self.clock()
+            self.save(universe)
+            self.universes[name] = universe
+            return universe
+
+    def get(self, name):
+        """Returns a universe, from memory when it is fresh
+        :param name: str
+        :rtype: Universe
+        """
+        universe = self.universes.get(name)
+        if universe is None or self.is_stale(universe):
+            universe = self.refresh(name)
+        return universe
+
+    def get_tickers(self, name):
+        """Returns the tickers of a universe in rank order
+        :param name: str
+        :rtype: list of str
+        """
+        return list(self.get(name).tickers)
+
+
+default_universe_manager = UniverseManager()  # Shared by every caller in the process
+default_universe_manager.register('sp500', SlickchartsSource('https://www.slickcharts.com/sp500'))
+default_universe_manager.register('nasdaq100', SlickchartsSource('https://www.slickcharts.com/nasdaq100'))